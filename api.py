@@ -0,0 +1,185 @@
+"""
+HTTP API around backend.core.
+
+One process-wide chain (and with it the OpenAI/Pinecone HTTP connection
+pools) is built at startup and shared by every request. Requests beyond
+MEDOM_API_CONCURRENCY wait up to MEDOM_API_QUEUE_TIMEOUT_SECONDS for a slot
+and then get 503; a request running longer than MEDOM_API_TIMEOUT_SECONDS
+gets 504. Run one or more workers behind a load balancer:
+
+    uvicorn api:app --host 0.0.0.0 --port 8000 --workers 4
+"""
+
+import asyncio
+import json
+import os
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from fastapi import FastAPI, HTTPException, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from pydantic import BaseModel, Field
+
+from backend import core
+from backend.tracing import metrics
+from logger import log_error, log_info, log_success
+
+API_CONCURRENCY = int(os.getenv("MEDOM_API_CONCURRENCY", "16"))
+API_TIMEOUT = float(os.getenv("MEDOM_API_TIMEOUT_SECONDS", "60"))
+API_QUEUE_TIMEOUT = float(os.getenv("MEDOM_API_QUEUE_TIMEOUT_SECONDS", "5"))
+
+
+class ChatRequest(BaseModel):
+    query: str = Field(min_length=1, max_length=2000)
+    chat_history: List[Tuple[str, str]] = Field(default_factory=list)
+    # Keys the cached history summary. Clients that send none get only the
+    # most recent turns, with no summary of the older ones.
+    session_id: Optional[str] = Field(default=None, min_length=1, max_length=128)
+
+
+class SourceDocument(BaseModel):
+    page_content: str
+    metadata: Dict[str, Any]
+
+
+class SearchResponse(BaseModel):
+    query: str
+    source_documents: List[SourceDocument]
+
+
+class ChatResponse(BaseModel):
+    query: str
+    result: str
+    source_documents: List[SourceDocument]
+
+
+def _sources(docs) -> List[Dict[str, Any]]:
+    return [{"page_content": doc.page_content, "metadata": doc.metadata} for doc in docs]
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.slots = asyncio.Semaphore(API_CONCURRENCY)
+    log_info(f"API: Warming up the chain (concurrency {API_CONCURRENCY}, timeout {API_TIMEOUT:.0f}s)")
+    try:
+        await core.awarm_up()
+        log_success("API: Chain ready")
+    except Exception as e:
+        # Stay up so /readyz reports the failure; requests retry the build.
+        log_error(f"API: Warm-up failed - {e}")
+    yield
+
+
+app = FastAPI(title="MeDom Nekretnine API", lifespan=lifespan)
+
+
+@asynccontextmanager
+async def _slot() -> AsyncIterator[None]:
+    slots: asyncio.Semaphore = app.state.slots
+    try:
+        await asyncio.wait_for(slots.acquire(), timeout=API_QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        metrics.inc("medom_api_rejected_total")
+        raise HTTPException(status_code=503, detail="Server busy, retry later")
+    try:
+        yield
+    finally:
+        slots.release()
+
+
+async def _run(coro):
+    async with _slot():
+        try:
+            return await asyncio.wait_for(coro, timeout=API_TIMEOUT)
+        except asyncio.TimeoutError:
+            metrics.inc("medom_api_timeouts_total")
+            raise HTTPException(status_code=504, detail="Request timed out")
+
+
+@app.post("/search", response_model=SearchResponse)
+async def search(request: ChatRequest):
+    docs = await _run(core.asearch(request.query, request.chat_history, request.session_id))
+    return {"query": request.query, "source_documents": _sources(docs)}
+
+
+@app.post("/chat", response_model=ChatResponse)
+async def chat(request: ChatRequest):
+    result = await _run(core.arun_llm(request.query, request.chat_history, request.session_id))
+    return {
+        "query": result["query"],
+        "result": result["result"],
+        "source_documents": _sources(result["source_documents"]),
+    }
+
+
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """
+    Newline-delimited JSON events: {"type": "sources", "source_documents": [...]},
+    then {"type": "token", "content": ...} as the answer is generated, and a
+    final {"type": "done"} (or {"type": "error", "detail": ...}).
+    """
+    slots: asyncio.Semaphore = app.state.slots
+    try:
+        await asyncio.wait_for(slots.acquire(), timeout=API_QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        metrics.inc("medom_api_rejected_total")
+        raise HTTPException(status_code=503, detail="Server busy, retry later")
+
+    released = False
+
+    def release():
+        nonlocal released
+        if not released:
+            released = True
+            slots.release()
+
+    async def events() -> AsyncIterator[bytes]:
+        # The slot is held until the stream finishes or the client disconnects.
+        try:
+            async with asyncio.timeout(API_TIMEOUT):
+                async for event in core.astream_llm(
+                    request.query, request.chat_history, request.session_id
+                ):
+                    if event["type"] == "sources":
+                        event = {"type": "sources", "source_documents": _sources(event["source_documents"])}
+                    yield (json.dumps(event, ensure_ascii=False) + "\n").encode("utf-8")
+            yield b'{"type": "done"}\n'
+        except TimeoutError:
+            metrics.inc("medom_api_timeouts_total")
+            yield b'{"type": "error", "detail": "Request timed out"}\n'
+        except Exception as e:
+            # Headers are already sent; report the failure in-band.
+            log_error(f"API: Stream failed - {e!r}")
+            yield b'{"type": "error", "detail": "Internal error"}\n'
+        finally:
+            release()
+
+    # The background task covers a stream that is never started (the client
+    # went away before the first byte), where the generator's finally never runs.
+    return StreamingResponse(
+        events(), media_type="application/x-ndjson", background=BackgroundTask(release)
+    )
+
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the process is up and serving."""
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+async def readyz(response: Response):
+    """Readiness: the shared chain is built, so the first query pays no warm-up."""
+    if not core.registry.is_warm:
+        response.status_code = 503
+        return {"status": "warming_up"}
+    return {"status": "ready"}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    return PlainTextResponse(
+        metrics.render_prometheus(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
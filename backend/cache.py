@@ -0,0 +1,228 @@
+import contextvars
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from backend.text import normalize
+
+INDEX_VERSION_PATH = os.getenv("MEDOM_INDEX_VERSION_PATH", ".index_version")
+
+
+def bump_index_version(path: str = INDEX_VERSION_PATH):
+    """Mark the indexes as changed; every SemanticCache watching `path` drops its entries."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        f.write(str(time.time_ns()))
+    os.replace(tmp_path, path)
+
+
+def index_version(path: str = INDEX_VERSION_PATH) -> Optional[int]:
+    """Changes whenever bump_index_version runs; None before the first ingestion."""
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def cache_key(query: str, chat_history: Sequence[Any] = ()) -> str:
+    """Normalised query text, plus a digest of the history for follow-up questions."""
+    key = re.sub(r"[^\w\s]", "", normalize(query)).strip()
+    if chat_history:
+        digest = hashlib.sha1(repr(list(chat_history)).encode("utf-8")).hexdigest()
+        key = f"{key}#{digest}"
+    return key
+
+
+# (query, embedding) of the standalone question the cache lookup just
+# embedded, so retrieval for the same question doesn't embed it again.
+_query_embedding: contextvars.ContextVar = contextvars.ContextVar("query_embedding", default=None)
+
+
+def remember_query_embedding(query: str, embedding: Sequence[float]):
+    """Share `query`'s embedding with the rest of this request (thread or task)."""
+    _query_embedding.set((query, embedding))
+
+
+def recall_query_embedding(query: str) -> Optional[Sequence[float]]:
+    """The embedding remember_query_embedding stored for exactly `query`, if any."""
+    remembered = _query_embedding.get()
+    if remembered is not None and remembered[0] == query:
+        return remembered[1]
+    return None
+
+
+_MISS = object()
+
+
+@dataclass
+class _Entry:
+    value: Any
+    expires_at: float
+    embedding: Optional[np.ndarray] = None
+
+
+class SemanticCache:
+    """
+    LRU + TTL answer cache. Looks up by exact normalised key first, then by
+    cosine similarity of query embeddings above `similarity_threshold`.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 512,
+        ttl_seconds: float = 3600.0,
+        similarity_threshold: float = 0.95,
+        version_path: str = INDEX_VERSION_PATH,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.version_path = version_path
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = self._read_version()
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_keys: List[str] = []
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _read_version(self) -> Optional[int]:
+        return index_version(self.version_path)
+
+    def _check_version(self):
+        version = self._read_version()
+        if version != self._version:
+            self._version = version
+            self._clear()
+
+    def _clear(self):
+        if self._entries:
+            self.invalidations += 1
+        self._entries.clear()
+        self._matrix = None
+
+    def invalidate(self):
+        with self._lock:
+            self._clear()
+
+    def _expire(self, key: str):
+        del self._entries[key]
+        self._matrix = None
+
+    def _nearest(self, embedding: np.ndarray, now: float) -> Optional[str]:
+        # Expired entries must not outrank a live paraphrase.
+        for key in [k for k, e in self._entries.items() if e.expires_at < now]:
+            self._expire(key)
+        if self._matrix is None:
+            self._matrix_keys = [k for k, e in self._entries.items() if e.embedding is not None]
+            self._matrix = (
+                np.stack([self._entries[k].embedding for k in self._matrix_keys])
+                if self._matrix_keys
+                else np.empty((0, embedding.shape[0]), dtype=np.float32)
+            )
+        if not self._matrix_keys:
+            return None
+        scores = self._matrix @ embedding
+        best = int(np.argmax(scores))
+        key = self._matrix_keys[best]
+        if scores[best] < self.similarity_threshold:
+            return None
+        return key
+
+    def get(
+        self, key: str, embed: Optional[Callable[[], Sequence[float]]] = None
+    ) -> Optional[Any]:
+        """
+        Exact lookup by key; on a miss, `embed` (if given) is called outside the
+        lock to compute the query embedding for the paraphrase lookup.
+        """
+        now = time.monotonic()
+        value = self._get_exact(key, now, last_chance=embed is None)
+        if value is not _MISS:
+            return value
+        if embed is None:
+            return None
+        return self._get_nearest(embed(), now)
+
+    async def aget(
+        self, key: str, aembed: Optional[Callable[[], Awaitable[Sequence[float]]]] = None
+    ) -> Optional[Any]:
+        """Async `get`: the query embedding is awaited instead of computed inline."""
+        now = time.monotonic()
+        value = self._get_exact(key, now, last_chance=aembed is None)
+        if value is not _MISS:
+            return value
+        if aembed is None:
+            return None
+        return self._get_nearest(await aembed(), now)
+
+    def _get_exact(self, key: str, now: float, last_chance: bool) -> Any:
+        with self._lock:
+            self._check_version()
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at < now:
+                self._expire(key)
+                entry = None
+            if entry is not None:
+                return self._hit(key, entry)
+            if last_chance:
+                self.misses += 1
+            return _MISS
+
+    def _get_nearest(self, embedding: Sequence[float], now: float) -> Optional[Any]:
+        embedding = _unit(embedding)
+        with self._lock:
+            nearest = self._nearest(embedding, now)
+            if nearest is None:
+                self.misses += 1
+                return None
+            self.semantic_hits += 1
+            return self._hit(nearest, self._entries[nearest])
+
+    def _hit(self, key: str, entry: _Entry) -> Any:
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry.value
+
+    def put(self, key: str, value: Any, embedding: Optional[Sequence[float]] = None):
+        with self._lock:
+            self._check_version()
+            self._entries[key] = _Entry(
+                value=value,
+                expires_at=time.monotonic() + self.ttl_seconds,
+                embedding=_unit(embedding) if embedding is not None else None,
+            )
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            self._matrix = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+def _unit(vector: Sequence[float]) -> np.ndarray:
+    array = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(array)
+    return array / norm if norm else array
@@ -0,0 +1,92 @@
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from backend.tracing import current_trace_id, metrics, sink
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """
+    Times every LangChain run (chains, retrievers, chat models) by run name and
+    records token usage, so the steps inside create_retrieval_chain show up as
+    separate spans.
+    """
+
+    def __init__(self):
+        self._runs: Dict[UUID, Tuple[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def _start(self, run_id: UUID, name: str):
+        with self._lock:
+            self._runs[run_id] = (name, time.perf_counter())
+
+    def _end(self, run_id: UUID, status: str = "ok", **attributes):
+        with self._lock:
+            started = self._runs.pop(run_id, None)
+        if started is None:
+            return
+        name, start = started
+        duration = time.perf_counter() - start
+        metrics.observe("medom_span_duration_seconds", duration, span=name, status=status)
+        sink.write(
+            {
+                "ts": time.time(),
+                "trace_id": current_trace_id(),
+                "run_id": str(run_id),
+                "span": name,
+                "duration_ms": round(duration * 1000, 3),
+                "status": status,
+                **attributes,
+            }
+        )
+
+    @staticmethod
+    def _name(serialized: Optional[Dict[str, Any]], kwargs: Dict[str, Any], default: str) -> str:
+        if kwargs.get("name"):
+            return kwargs["name"]
+        if serialized:
+            return serialized.get("name") or (serialized.get("id") or [default])[-1]
+        return default
+
+    def on_chain_start(self, serialized, inputs, *, run_id, **kwargs):
+        self._start(run_id, self._name(serialized, kwargs, "chain"))
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, status="error")
+
+    def on_retriever_start(self, serialized, query, *, run_id, **kwargs):
+        self._start(run_id, self._name(serialized, kwargs, "retriever"))
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs):
+        self._end(
+            run_id,
+            documents=len(documents),
+            bytes=sum(len(d.page_content.encode("utf-8")) for d in documents),
+        )
+
+    def on_retriever_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, status="error")
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._start(run_id, self._name(serialized, kwargs, "chat_model"))
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._start(run_id, self._name(serialized, kwargs, "llm"))
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        with self._lock:
+            name = self._runs.get(run_id, ("llm", 0))[0]
+        for kind in ("prompt_tokens", "completion_tokens"):
+            if usage.get(kind):
+                metrics.inc("medom_tokens_total", usage[kind], span=name, kind=kind)
+        self._end(run_id, **{k: v for k, v in usage.items() if isinstance(v, int)})
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, status="error")
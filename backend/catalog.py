@@ -0,0 +1,248 @@
+import os
+import re
+import sqlite3
+from contextlib import contextmanager
+from dataclasses import dataclass, fields
+from typing import Any, Dict, Iterable, List, Optional
+from urllib.parse import urlparse
+
+from backend.locations import CITY_COUNTIES, find_city
+from backend.text import format_eur, normalize, parse_number
+
+CATALOG_PATH = os.getenv("MEDOM_CATALOG_PATH", "listing_catalog.sqlite3")
+
+# Canonical property type -> pattern over normalised URL path / listing text
+PROPERTY_TYPES = {
+    "zemljiste": re.compile(r"\bzemljist\w*"),
+    "poslovni_prostor": re.compile(r"\bposlovn\w*[ -]prostor\w*"),
+    "kuca": re.compile(r"\b(?:kuc(?:a|e|i|u|om)|vil(?:a|e|i|u))\b"),
+    "stan": re.compile(r"\b(?:stan(?:a|u|om|ovi|ova)?|apartman\w*)\b"),
+}
+
+PROPERTY_LABELS = {
+    "stan": "Stan",
+    "kuca": "Kuća",
+    "zemljiste": "Zemljište",
+    "poslovni_prostor": "Poslovni prostor",
+}
+
+LAND_USES = {
+    "gradevinsko": re.compile(r"\bgradevin\w*"),
+    "poljoprivredno": re.compile(r"\bpoljoprivredn\w*"),
+}
+
+LAND_USE_LABELS = {"gradevinsko": "građevinsko", "poljoprivredno": "poljoprivredno"}
+
+_NUMBER = r"(\d[\d.,\s\xa0]*\d|\d)"
+_LOCATION_RE = re.compile(r"Lokacija:\s*\**\s*([^\n|*]+)")
+_PRICE_LABELLED_RE = re.compile(r"Cijena[^:\n]*:\s*\**\s*" + _NUMBER + r"\s*(?:€|EUR|eur)", re.IGNORECASE)
+_PRICE_RE = re.compile(_NUMBER + r"\s*(?:€|EUR\b|eura?\b)", re.IGNORECASE)
+_AREA_LABELLED_RE = re.compile(r"Površina[^:\n]*:\s*\**\s*" + _NUMBER + r"\s*m(?:²|2)", re.IGNORECASE)
+_AREA_RE = re.compile(_NUMBER + r"\s*m(?:²|2)(?![\w/])", re.IGNORECASE)
+
+
+@dataclass
+class Listing:
+    url: str
+    property_type: Optional[str] = None
+    land_use: Optional[str] = None
+    location: Optional[str] = None
+    price_eur: Optional[float] = None
+    area_m2: Optional[float] = None
+    price_per_m2: Optional[float] = None
+
+    def describe(self) -> str:
+        kind = PROPERTY_LABELS.get(self.property_type, "Nekretnina")
+        if self.land_use:
+            kind += f" ({LAND_USE_LABELS[self.land_use]})"
+        parts = [kind]
+        if self.location:
+            parts.append(self.location)
+        parts.append(format_eur(self.price_eur))
+        if self.area_m2:
+            parts.append(f"{self.area_m2:,.0f} m²".replace(",", "."))
+        if self.price_per_m2:
+            parts.append(f"{format_eur(self.price_per_m2)}/m²")
+        parts.append(self.url)
+        return ", ".join(parts)
+
+
+def _first_number(patterns, text: str) -> Optional[float]:
+    for pattern in patterns:
+        match = pattern.search(text)
+        if match:
+            value = parse_number(match.group(1))
+            if value:
+                return value
+    return None
+
+
+def _classify(table: dict, *haystacks: str) -> Optional[str]:
+    for haystack in haystacks:
+        for value, pattern in table.items():
+            if pattern.search(haystack):
+                return value
+    return None
+
+
+def parse_listing(text: str, url: str) -> Listing:
+    """
+    Parse the typed fields of one listing out of its 'Lokacija:' section.
+    """
+    path = normalize(urlparse(url).path)
+    body = normalize(text)
+
+    location_match = _LOCATION_RE.search(text)
+    location = location_match.group(1).strip(" ,-") if location_match else None
+
+    price = _first_number([_PRICE_LABELLED_RE, _PRICE_RE], text)
+    area = _first_number([_AREA_LABELLED_RE, _AREA_RE], text)
+    price_per_m2 = round(price / area, 2) if price and area else None
+
+    return Listing(
+        url=url,
+        property_type=_classify(PROPERTY_TYPES, path, body),
+        land_use=_classify(LAND_USES, path, body),
+        location=location or None,
+        price_eur=price,
+        area_m2=area,
+        price_per_m2=price_per_m2,
+    )
+
+
+def chunk_metadata(listing: Listing, text: str = "") -> Dict[str, Any]:
+    """
+    Filterable fields stored on every chunk of a listing. Missing values are
+    left out: Pinecone and Chroma reject null metadata.
+    """
+    city = find_city(listing.location or "") or find_city(text[:500])
+    metadata = {
+        "property_type": listing.property_type,
+        "land_use": listing.land_use,
+        "city": city,
+        "county": CITY_COUNTIES.get(city),
+        "price_eur": listing.price_eur,
+        "area_m2": listing.area_m2,
+        "price_per_m2": listing.price_per_m2,
+    }
+    return {key: value for key, value in metadata.items() if value is not None}
+
+
+SORT_COLUMNS = ("price_eur", "area_m2", "price_per_m2")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS listings (
+    url TEXT PRIMARY KEY,
+    property_type TEXT,
+    land_use TEXT,
+    location TEXT,
+    location_norm TEXT,
+    price_eur REAL,
+    area_m2 REAL,
+    price_per_m2 REAL
+);
+CREATE INDEX IF NOT EXISTS ix_listings_price ON listings (property_type, price_eur);
+CREATE INDEX IF NOT EXISTS ix_listings_area ON listings (property_type, area_m2);
+CREATE INDEX IF NOT EXISTS ix_listings_ppm2 ON listings (property_type, price_per_m2);
+"""
+
+_COLUMNS = [f.name for f in fields(Listing)]
+
+
+class ListingCatalog:
+    """SQLite-backed catalog of parsed listings with per-type sorted indexes."""
+
+    def __init__(self, path: str = CATALOG_PATH):
+        self.path = path
+        self._schema_ready = False
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path)
+        try:
+            if not self._schema_ready:
+                conn.executescript(_SCHEMA)
+                self._schema_ready = True
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def covers(self, property_type: str) -> bool:
+        """True when some ingest has catalogued listings of `property_type`."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT 1 FROM listings WHERE property_type = ? LIMIT 1", (property_type,)
+            ).fetchone()
+        return row is not None
+
+    def upsert(self, listings: Iterable[Listing]) -> int:
+        rows = [
+            (*(getattr(listing, c) for c in _COLUMNS), normalize(listing.location or ""))
+            for listing in listings
+        ]
+        placeholders = ", ".join("?" for _ in range(len(_COLUMNS) + 1))
+        with self._connect() as conn:
+            conn.executemany(
+                f"INSERT OR REPLACE INTO listings ({', '.join(_COLUMNS)}, location_norm) "
+                f"VALUES ({placeholders})",
+                rows,
+            )
+        return len(rows)
+
+    def delete(self, urls: Iterable[str]) -> None:
+        with self._connect() as conn:
+            conn.executemany("DELETE FROM listings WHERE url = ?", [(u,) for u in urls])
+
+    def search(
+        self,
+        property_type: Optional[str] = None,
+        land_use: Optional[str] = None,
+        location: Optional[str] = None,
+        price_min: Optional[float] = None,
+        price_max: Optional[float] = None,
+        area_min: Optional[float] = None,
+        area_max: Optional[float] = None,
+        sort_by: Optional[str] = None,
+        descending: bool = False,
+        limit: int = 5,
+    ) -> List[Listing]:
+        clauses, params = [], []
+        for column, op, value in (
+            ("property_type", "=", property_type),
+            ("land_use", "=", land_use),
+            ("price_eur", ">=", price_min),
+            ("price_eur", "<=", price_max),
+            ("area_m2", ">=", area_min),
+            ("area_m2", "<=", area_max),
+        ):
+            if value is not None:
+                clauses.append(f"{column} {op} ?")
+                params.append(value)
+        if location:
+            clauses.append("location_norm LIKE ?")
+            params.append(f"%{normalize(location)}%")
+
+        sql = f"SELECT {', '.join(_COLUMNS)} FROM listings"
+        if sort_by is not None:
+            if sort_by not in SORT_COLUMNS:
+                raise ValueError(f"Cannot sort listings by {sort_by!r}")
+            clauses.append(f"{sort_by} IS NOT NULL")
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        if sort_by is not None:
+            sql += f" ORDER BY {sort_by} {'DESC' if descending else 'ASC'}"
+        sql += " LIMIT ?"
+        params.append(limit)
+
+        with self._connect() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        return [Listing(**dict(zip(_COLUMNS, row))) for row in rows]
+
+    def __len__(self) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM listings").fetchone()[0]
+
@@ -0,0 +1,43 @@
+import json
+from typing import Any, Dict, Iterator, List, Optional
+
+import httpx
+from langchain_core.documents import Document
+
+_clients: Dict[str, httpx.Client] = {}
+
+
+def _client(api_url: str, timeout: float) -> httpx.Client:
+    # One keep-alive pool per API URL, shared across Streamlit sessions.
+    if api_url not in _clients:
+        _clients[api_url] = httpx.Client(base_url=api_url.rstrip("/"), timeout=timeout)
+    return _clients[api_url]
+
+
+def stream_llm_remote(
+    api_url: str,
+    query: str,
+    chat_history: List[Any] = [],
+    session_id: Optional[str] = None,
+    timeout: float = 90.0,
+) -> Iterator[Dict[str, Any]]:
+    """
+    backend.core.stream_llm over the HTTP API (api.py /chat/stream): yields the
+    same {"type": "sources" | "token", ...} events.
+    """
+    payload = {"query": query, "chat_history": [list(m) for m in chat_history], "session_id": session_id}
+    with _client(api_url, timeout).stream("POST", "/chat/stream", json=payload) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if not line:
+                continue
+            event = json.loads(line)
+            if event["type"] == "sources":
+                yield {
+                    "type": "sources",
+                    "source_documents": [Document(**doc) for doc in event["source_documents"]],
+                }
+            elif event["type"] == "token":
+                yield event
+            elif event["type"] == "error":
+                raise RuntimeError(f"API error: {event.get('detail')}")
@@ -1,78 +1,473 @@
-from typing import List, Dict, Any
+import asyncio
+import logging
+import os
+import threading
+from typing import List, Dict, Any, AsyncIterator, Iterator, Optional, Sequence, Tuple
 
 from dotenv import load_dotenv
-from langchain.chains.history_aware_retriever import create_history_aware_retriever
-from langchain.chains.retrieval import create_retrieval_chain
-from langchain_community.llms.ollama import Ollama
-from langchain_core.prompts import PromptTemplate, SystemMessagePromptTemplate, ChatPromptTemplate
-from langdetect import detect, DetectorFactory
 
 load_dotenv()
 
-from langchain import hub
-from langchain.chains.combine_documents import create_stuff_documents_chain
-from langchain_pinecone import PineconeVectorStore
+# LangChain, the OpenAI/Pinecone clients and the retrieval modules are
+# imported inside ChainRegistry._build, so importing this module (and the
+# first Streamlit render) stays cheap; benchmarks/import_time.py checks it.
+from backend.cache import SemanticCache, cache_key, index_version, remember_query_embedding
+from backend.catalog import ListingCatalog
+from backend.history import SUMMARY_MAX_WORDS, HistoryWindow, format_messages
+from backend.locations import CITIES
+from backend.query import parse_query
+from backend.tracing import profiled, span, start_metrics_server
 
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+logger = logging.getLogger(__name__)
 
-INDEX_NAME = "langchain-doc-index"
+METRICS_PORT = os.getenv("MEDOM_METRICS_PORT")
 
-DetectorFactory.seed = 0
 
+class ChainRegistry:
+    """
+    Builds the retrieval chain once per process and shares it across threads.
+    `embeddings`, `vectorstore` and `chat` override the OpenAI/Pinecone defaults
+    (used by the offline benchmarks); `index_name` and `backend` default to
+    the backend.vectorstores settings. Indexes loaded from disk (BM25, the
+    local vector store) are reloaded when an ingestion run bumps the index
+    version.
+    """
 
-def run_llm(query: str, chat_history: List[Dict[str, Any]] = []):
-    embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
-    docsearch = PineconeVectorStore(index_name=INDEX_NAME, embedding=embeddings)
-    chat = ChatOpenAI(verbose=True, temperature=0, model="gpt-3.5-turbo")
+    def __init__(
+        self,
+        index_name: Optional[str] = None,
+        backend: Optional[str] = None,
+        embeddings=None,
+        vectorstore=None,
+        chat=None,
+    ):
+        self.index_name = index_name
+        self.backend = backend
+        self._lock = threading.Lock()
+        self._built = False
+        self._index_version = None
+        self.embeddings = embeddings
+        self.docsearch = vectorstore
+        self._owns_vectorstore = vectorstore is None
+        self.lexical_index = None
+        self.chat = chat
+        self.hybrid_retriever = None
+        self.retriever = None
+        self.combine_docs_chain = None
+        self.qa = None
+        self.summarizer = None
+        self.callbacks = []
 
-    system = """
-                    Guidelines:
+    @property
+    def is_warm(self) -> bool:
+        return self._built
 
-                    1. You are a senior real estate agent. Always give clear answer. You will return a list of estates which are result of search.
+    @property
+    def is_current(self) -> bool:
+        """Built and holding the indexes of the latest ingestion run."""
+        return self._built and self._index_version == index_version()
 
-                    2. Structure:
-                       - real estate 1, price, source url then new line
-                       - real estate 2, price, source url then new line
-                       - real estate 3, price, source url then new line
-                       
-                    """
+    def _build(self):
+        from langchain.chains.combine_documents import create_stuff_documents_chain
+        from langchain.chains.history_aware_retriever import create_history_aware_retriever
+        from langchain.chains.retrieval import create_retrieval_chain
+        from langchain_core.output_parsers import StrOutputParser
 
-    # Your system message
-    system_message = SystemMessagePromptTemplate.from_template(system)
+        from backend.callbacks import TracingCallbackHandler
+        from backend.lexical import LexicalIndex
+        from backend.packing import ContextPacker
+        from backend.prompts import rephrase_prompt, retrieval_qa_chat_prompt, summary_prompt
+        from backend.retrievers import HybridRetriever
+        from backend.vectorstores import INDEX_NAME, VECTOR_BACKEND, make_vectorstore
 
-    lang = detect(query)
-    # query = query + ", answer in " + lang
+        # Times every step of the retrieval chain (rephrase, retrieval,
+        # context stuffing, generation) by run name.
+        self.callbacks = [TracingCallbackHandler()]
 
-    rephrase_prompt = hub.pull("langchain-ai/chat-langchain-rephrase")
-    retrieval_qa_chat_prompt = hub.pull("langchain-ai/retrieval-qa-chat")
+        self.lexical_index = LexicalIndex.load_all()
 
-    retrieval_qa_chat_prompt = ChatPromptTemplate.from_messages([
-        system_message,
-        *retrieval_qa_chat_prompt.messages
-    ])
-    
-    stuff_documents_chain = create_stuff_documents_chain(chat, retrieval_qa_chat_prompt)
+        vectorstore = None
+        try:
+            if self.embeddings is None:
+                from langchain_openai import OpenAIEmbeddings
 
-    history_aware_retriever = create_history_aware_retriever(
-        llm=chat, retriever=docsearch.as_retriever(), prompt=rephrase_prompt
-    )
-    qa = create_retrieval_chain(
-        retriever=history_aware_retriever, combine_docs_chain=stuff_documents_chain
+                from backend.embeddings import BatchingEmbeddings
+
+                # Concurrent queries share one embedding request.
+                self.embeddings = BatchingEmbeddings(
+                    OpenAIEmbeddings(model="text-embedding-3-small")
+                )
+            if self.docsearch is None:
+                self.docsearch = make_vectorstore(
+                    self.embeddings,
+                    backend=self.backend or VECTOR_BACKEND,
+                    index_name=self.index_name or INDEX_NAME,
+                )
+            vectorstore = self.docsearch
+        except Exception as e:
+            if self.lexical_index is None:
+                raise
+            logger.warning("Vector store unavailable, serving lexical retrieval only: %r", e)
+
+        if self.chat is None:
+            from langchain_openai import ChatOpenAI
+
+            self.chat = ChatOpenAI(verbose=True, temperature=0, model="gpt-3.5-turbo")
+
+        # Run names tell the two LLM calls apart in traces.
+        self.combine_docs_chain = create_stuff_documents_chain(
+            self.chat.with_config(run_name="generate"), retrieval_qa_chat_prompt()
+        )
+        # Fuse more candidates than before; the packer keeps what fits the
+        # context token budget.
+        self.hybrid_retriever = HybridRetriever(
+            vectorstore=vectorstore,
+            lexical_index=self.lexical_index,
+            k=8,
+            packer=ContextPacker(),
+            use_filters=True,
+        )
+        self.retriever = create_history_aware_retriever(
+            llm=self.chat.with_config(run_name="rephrase"),
+            retriever=self.hybrid_retriever,
+            prompt=rephrase_prompt(),
+        )
+        self.qa = create_retrieval_chain(
+            retriever=self.retriever, combine_docs_chain=self.combine_docs_chain
+        )
+        self.summarizer = (
+            summary_prompt().partial(max_words=str(SUMMARY_MAX_WORDS))
+            | self.chat.with_config(run_name="summarize")
+            | StrOutputParser()
+        )
+
+    def _reload_indexes(self):
+        from backend.lexical import LexicalIndex
+        from backend.vectorstores import LOCAL_INDEX_PATH, LocalVectorStore
+
+        lexical_index = LexicalIndex.load_all()
+        if lexical_index is not None:
+            self.lexical_index = lexical_index
+            self.hybrid_retriever.lexical_index = lexical_index
+        # Pinecone and Chroma serve writes from other processes on their own.
+        if self._owns_vectorstore and isinstance(self.docsearch, LocalVectorStore):
+            self.docsearch = LocalVectorStore.load(self.embeddings, LOCAL_INDEX_PATH)
+            self.hybrid_retriever.vectorstore = self.docsearch
+        logger.info("Reloaded indexes after ingestion (index version %s)", self._index_version)
+
+    def ensure_built(self) -> "ChainRegistry":
+        # Double-checked so the hot path never takes the lock once built; a
+        # stat of the version file is all it costs.
+        if not self.is_current:
+            with self._lock:
+                version = index_version()
+                if not self._built:
+                    self._index_version = version
+                    self._build()
+                    self._built = True
+                elif version != self._index_version:
+                    self._index_version = version
+                    self._reload_indexes()
+        return self
+
+    def get_chain(self):
+        return self.ensure_built().qa
+
+
+registry = ChainRegistry()
+
+
+def warm_up() -> ChainRegistry:
+    """Build the shared chain ahead of the first query (call at app startup)."""
+    if METRICS_PORT:
+        start_metrics_server(int(METRICS_PORT))
+    with span("warm_up"):
+        return registry.ensure_built()
+
+
+async def awarm_up() -> ChainRegistry:
+    """warm_up without blocking the event loop."""
+    if registry.is_current:
+        return registry
+    return await asyncio.to_thread(warm_up)
+
+
+catalog = ListingCatalog()
+
+answer_cache = SemanticCache(
+    max_entries=int(os.getenv("MEDOM_CACHE_SIZE", "512")),
+    ttl_seconds=float(os.getenv("MEDOM_CACHE_TTL_SECONDS", "3600")),
+    similarity_threshold=float(os.getenv("MEDOM_CACHE_SIMILARITY", "0.95")),
+)
+
+
+history_window = HistoryWindow()
+
+
+def _summarize(summary: str, new_messages) -> str:
+    return registry.summarizer.invoke(
+        {"summary": summary or "-", "new_lines": format_messages(new_messages)},
+        config={"callbacks": registry.callbacks},
     )
 
 
+def windowed_history(chat_history: List[Any], session_id: Optional[str] = None) -> List[Tuple[str, str]]:
+    """The chat history as sent to the prompts: a rolling summary plus the recent turns."""
+    registry.ensure_built()
+    with span("history_window", messages=len(chat_history)) as current:
+        history = history_window.window(chat_history, _summarize, session_id=session_id)
+        current.set(kept=len(history))
+    return history
+
 
-    result = qa.invoke(input={"input": query, "chat_history": chat_history})
-    new_result = {
-        "query": result["input"],
-        "result": result["answer"],
-        "source_documents": result["context"],
+def answer_from_catalog(query: str, chat_history: Sequence[Any] = ()) -> Optional[Dict[str, Any]]:
+    """
+    Answer top-N / sort queries straight from the listing catalog. Returns
+    None when the query is open-ended, a follow-up (it may lean on
+    `chat_history`) or the catalog has no match.
+    """
+    if chat_history:
+        return None
+    parsed = parse_query(query)
+    if not parsed.is_structured or not catalog.exists():
+        return None
+    # A type no ingest has catalogued is answered by the retriever rather
+    # than with an empty (or another type's) list.
+    if not catalog.covers(parsed.property_type):
+        return None
+    # The catalog filters by location text only; a region ("Dalmacija") is
+    # left to the retriever's county filter rather than answered nationwide.
+    if parsed.counties:
+        return None
+
+    listings = catalog.search(
+        property_type=parsed.property_type,
+        land_use=parsed.land_use,
+        location=CITIES[parsed.city][0] if parsed.city else None,
+        price_min=parsed.price_min,
+        price_max=parsed.price_max,
+        area_min=parsed.area_min,
+        area_max=parsed.area_max,
+        sort_by=parsed.sort_by,
+        descending=parsed.descending,
+        limit=parsed.limit,
+    )
+    if not listings:
+        return None
+
+    from langchain_core.documents import Document
+
+    lines = [f"{i}. {listing.describe()}" for i, listing in enumerate(listings, 1)]
+    return {
+        "query": query,
+        "result": "\n".join(lines),
+        "source_documents": [
+            Document(page_content=line, metadata={"source": listing.url})
+            for line, listing in zip(lines, listings)
+        ],
     }
 
-    return new_result
+
+def _share_query_embedding(query: str, embedding: List[float]):
+    # A standalone question reaches the retriever unrephrased; hand it the
+    # embedding unless the vector store embeds with a different model.
+    if getattr(registry.docsearch, "embeddings", None) is registry.embeddings:
+        remember_query_embedding(query, embedding)
+
+
+def _cache_lookup(
+    query: str, chat_history: List[Dict[str, Any]]
+) -> Tuple[str, Optional[List[float]], Optional[Dict[str, Any]]]:
+    """Returns (cache key, query embedding if one was computed, cached result)."""
+    registry.ensure_built()
+    key = cache_key(query, chat_history)
+    query_embedding = None
+
+    def embed_query():
+        nonlocal query_embedding
+        query_embedding = registry.embeddings.embed_query(query)
+        _share_query_embedding(query, query_embedding)
+        return query_embedding
+
+    # Paraphrase matching only makes sense for standalone questions.
+    semantic = not chat_history and registry.embeddings is not None
+    cached = answer_cache.get(key, embed=embed_query if semantic else None)
+    if cached is not None:
+        cached = {**cached, "query": query}
+    return key, query_embedding, cached
+
+
+def run_llm(
+    query: str, chat_history: List[Dict[str, Any]] = [], session_id: Optional[str] = None
+):
+    with profiled("run_llm"), span("run_llm", bytes=len(query.encode("utf-8"))) as current:
+        with span("catalog"):
+            fast_result = answer_from_catalog(query, chat_history)
+        if fast_result is not None:
+            current.set(path="catalog")
+            return fast_result
+
+        with span("answer_cache"):
+            key, query_embedding, cached = _cache_lookup(query, chat_history)
+        if cached is not None:
+            current.set(path="cache")
+            return cached
+
+        qa = registry.qa
+
+        history = windowed_history(chat_history, session_id)
+        result = qa.invoke(
+            input={"input": query, "chat_history": history},
+            config={"callbacks": registry.callbacks},
+        )
+        new_result = {
+            "query": result["input"],
+            "result": result["answer"],
+            "source_documents": result["context"],
+        }
+        answer_cache.put(key, new_result, embedding=query_embedding)
+        current.set(path="rag", documents=len(result["context"]))
+
+        return new_result
+
+
+def stream_llm(
+    query: str, chat_history: List[Dict[str, Any]] = [], session_id: Optional[str] = None
+) -> Iterator[Dict[str, Any]]:
+    """
+    Streaming variant of run_llm. Yields {"type": "sources", "source_documents": [...]}
+    as soon as retrieval is done, then {"type": "token", "content": str} events
+    as the answer is generated.
+    """
+    with span("catalog"):
+        ready = answer_from_catalog(query, chat_history)
+    key = query_embedding = None
+    if ready is None:
+        with span("answer_cache"):
+            key, query_embedding, ready = _cache_lookup(query, chat_history)
+    if ready is not None:
+        yield {"type": "sources", "source_documents": ready["source_documents"]}
+        yield {"type": "token", "content": ready["result"]}
+        return
+
+    inputs = {"input": query, "chat_history": windowed_history(chat_history, session_id)}
+    config = {"callbacks": registry.callbacks}
+    # Spans are not held open across yields: a generator can be suspended
+    # (or abandoned) by the consumer at any point.
+    docs = registry.retriever.invoke(inputs, config=config)
+    yield {"type": "sources", "source_documents": docs}
+
+    answer = []
+    for token in registry.combine_docs_chain.stream({**inputs, "context": docs}, config=config):
+        answer.append(token)
+        yield {"type": "token", "content": token}
+
+    answer_cache.put(
+        key,
+        {"query": query, "result": "".join(answer), "source_documents": docs},
+        embedding=query_embedding,
+    )
+
+
+async def _acache_lookup(
+    query: str, chat_history: List[Dict[str, Any]]
+) -> Tuple[str, Optional[List[float]], Optional[Dict[str, Any]]]:
+    """Async _cache_lookup: the paraphrase lookup awaits the query embedding."""
+    await awarm_up()
+    key = cache_key(query, chat_history)
+    query_embedding = None
+
+    async def aembed_query():
+        nonlocal query_embedding
+        query_embedding = await registry.embeddings.aembed_query(query)
+        _share_query_embedding(query, query_embedding)
+        return query_embedding
+
+    semantic = not chat_history and registry.embeddings is not None
+    cached = await answer_cache.aget(key, aembed=aembed_query if semantic else None)
+    if cached is not None:
+        cached = {**cached, "query": query}
+    return key, query_embedding, cached
+
+
+async def asearch(
+    query: str, chat_history: List[Dict[str, Any]] = [], session_id: Optional[str] = None
+) -> List[Any]:
+    """Retrieval only: the listings (or chunks) an answer to `query` would be based on."""
+    with span("search", bytes=len(query.encode("utf-8"))):
+        # SQLite and the history summary are blocking; keep them off the event loop.
+        fast_result = await asyncio.to_thread(answer_from_catalog, query, chat_history)
+        if fast_result is not None:
+            return fast_result["source_documents"]
+        await awarm_up()
+        history = await asyncio.to_thread(windowed_history, chat_history, session_id)
+        return await registry.retriever.ainvoke(
+            {"input": query, "chat_history": history}, config={"callbacks": registry.callbacks}
+        )
+
+
+async def arun_llm(
+    query: str, chat_history: List[Dict[str, Any]] = [], session_id: Optional[str] = None
+) -> Dict[str, Any]:
+    """Async run_llm for the API: same fast path, cache and chain, via ainvoke."""
+    with span("run_llm", bytes=len(query.encode("utf-8"))) as current:
+        fast_result = await asyncio.to_thread(answer_from_catalog, query, chat_history)
+        if fast_result is not None:
+            current.set(path="catalog")
+            return fast_result
+
+        key, query_embedding, cached = await _acache_lookup(query, chat_history)
+        if cached is not None:
+            current.set(path="cache")
+            return cached
+
+        history = await asyncio.to_thread(windowed_history, chat_history, session_id)
+        result = await registry.qa.ainvoke(
+            input={"input": query, "chat_history": history},
+            config={"callbacks": registry.callbacks},
+        )
+        new_result = {
+            "query": result["input"],
+            "result": result["answer"],
+            "source_documents": result["context"],
+        }
+        answer_cache.put(key, new_result, embedding=query_embedding)
+        current.set(path="rag", documents=len(result["context"]))
+        return new_result
+
+
+async def astream_llm(
+    query: str, chat_history: List[Dict[str, Any]] = [], session_id: Optional[str] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """Async stream_llm: the same sources/token events, via ainvoke/astream."""
+    ready = await asyncio.to_thread(answer_from_catalog, query, chat_history)
+    key = query_embedding = None
+    if ready is None:
+        key, query_embedding, ready = await _acache_lookup(query, chat_history)
+    if ready is not None:
+        yield {"type": "sources", "source_documents": ready["source_documents"]}
+        yield {"type": "token", "content": ready["result"]}
+        return
+
+    history = await asyncio.to_thread(windowed_history, chat_history, session_id)
+    inputs = {"input": query, "chat_history": history}
+    config = {"callbacks": registry.callbacks}
+    docs = await registry.retriever.ainvoke(inputs, config=config)
+    yield {"type": "sources", "source_documents": docs}
+
+    answer = []
+    async for token in registry.combine_docs_chain.astream({**inputs, "context": docs}, config=config):
+        answer.append(token)
+        yield {"type": "token", "content": token}
+
+    answer_cache.put(
+        key,
+        {"query": query, "result": "".join(answer), "source_documents": docs},
+        embedding=query_embedding,
+    )
 
 
 if __name__ == "__main__":
     res = run_llm(query="Trebao bih 5 najskupljih građevinkih zemljišta, sve opcije")
 
-    print(res["result"])
\ No newline at end of file
+    print(res["result"])
@@ -0,0 +1,230 @@
+import asyncio
+import hashlib
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+EMBEDDING_CACHE_PATH = os.getenv("MEDOM_EMBEDDING_CACHE_PATH", "embedding_cache.sqlite3")
+# Query micro-batching: how long the first query in a batch waits for
+# company, the largest batch sent in one request, and how many batch
+# requests may be in flight at once. A window of 0 disables batching.
+EMBED_BATCH_WINDOW_MS = float(os.getenv("MEDOM_EMBED_BATCH_WINDOW_MS", "5"))
+EMBED_BATCH_MAX_SIZE = int(os.getenv("MEDOM_EMBED_BATCH_MAX_SIZE", "64"))
+EMBED_BATCH_CONCURRENCY = int(os.getenv("MEDOM_EMBED_BATCH_CONCURRENCY", "4"))
+# Longest a sync caller waits for its batch before giving up.
+EMBED_BATCH_TIMEOUT = float(os.getenv("MEDOM_EMBED_BATCH_TIMEOUT_SECONDS", "60"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    key BLOB PRIMARY KEY,
+    vector BLOB NOT NULL
+) WITHOUT ROWID;
+"""
+# Keep well under SQLite's bound-parameter limit.
+_LOOKUP_CHUNK = 500
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an Embeddings model with an on-disk, content-addressed cache: vectors
+    are stored as float32 blobs keyed by sha256(model name, chunk text), so an
+    unchanged chunk is never sent to the embedding API twice.
+    """
+
+    def __init__(self, underlying: Embeddings, model: str, path: str = EMBEDDING_CACHE_PATH):
+        self.underlying = underlying
+        self.model = model
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _key(self, text: str) -> bytes:
+        return hashlib.sha256(f"{self.model}\x00{text}".encode("utf-8")).digest()
+
+    def _lookup(self, keys: Sequence[bytes]) -> Dict[bytes, List[float]]:
+        found = {}
+        with self._connect() as conn:
+            for i in range(0, len(keys), _LOOKUP_CHUNK):
+                chunk = keys[i : i + _LOOKUP_CHUNK]
+                rows = conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                )
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return found
+
+    def _store(self, items: Dict[bytes, List[float]]):
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(k, np.asarray(v, dtype=np.float32).tobytes()) for k, v in items.items()],
+            )
+
+    def _plan(self, texts: List[str]):
+        keys = [self._key(t) for t in texts]
+        cached = self._lookup(list(dict.fromkeys(keys)))
+        # One API input per distinct missing text, even if it repeats in the batch.
+        missing: Dict[bytes, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        self.hits += len(texts) - sum(1 for k in keys if k in missing)
+        self.misses += len(missing)
+        return keys, cached, missing
+
+    def _merge(self, keys, cached, missing, vectors) -> List[List[float]]:
+        fresh = dict(zip(missing.keys(), vectors))
+        if fresh:
+            self._store(fresh)
+        cached.update(fresh)
+        return [cached[k] for k in keys]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, cached, missing = self._plan(texts)
+        vectors = self.underlying.embed_documents(list(missing.values())) if missing else []
+        return self._merge(keys, cached, missing, vectors)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, cached, missing = await asyncio.to_thread(self._plan, texts)
+        vectors = (
+            await self.underlying.aembed_documents(list(missing.values())) if missing else []
+        )
+        return await asyncio.to_thread(self._merge, keys, cached, missing, vectors)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.underlying.embed_query(text)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await self.underlying.aembed_query(text)
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
+
+
+class BatchingEmbeddings(Embeddings):
+    """
+    Coalesces concurrent embed_query calls into one embed_documents request.
+    The first query starts a batch that closes after `window_ms` or at
+    `max_batch_size` texts; the vectors are handed back to the waiting
+    callers. Sync (thread) and async callers share the same batches.
+    Document embedding passes straight through.
+    """
+
+    def __init__(
+        self,
+        underlying: Embeddings,
+        window_ms: float = EMBED_BATCH_WINDOW_MS,
+        max_batch_size: int = EMBED_BATCH_MAX_SIZE,
+        max_in_flight: int = EMBED_BATCH_CONCURRENCY,
+    ):
+        self.underlying = underlying
+        self.window = window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self._queue: "queue.SimpleQueue[Tuple[str, Future]]" = queue.SimpleQueue()
+        self._executor = ThreadPoolExecutor(max_in_flight, thread_name_prefix="embed-batch")
+        self._collector = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.queries = 0
+
+    def _ensure_collector(self):
+        if self._collector is None:
+            with self._lock:
+                if self._collector is None:
+                    self._collector = threading.Thread(
+                        target=self._collect, name="embed-batch-collector", daemon=True
+                    )
+                    self._collector.start()
+
+    def _collect(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            # Keep collecting the next batch while this one is in flight.
+            self._executor.submit(self._send, batch)
+
+    def _send(self, batch: List[Tuple[str, Future]]):
+        from backend.tracing import metrics, span
+
+        # Callers that gave up (a cancelled aembed_query) are dropped; the
+        # rest are marked running so a later cancel can't touch them.
+        batch = [(text, future) for text, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        # One API input per distinct text; identical queries share a vector.
+        texts = list(dict.fromkeys(text for text, _ in batch))
+        self.batches += 1
+        self.queries += len(batch)
+        metrics.inc("medom_embed_batches_total")
+        metrics.inc("medom_embed_batched_queries_total", len(batch))
+        try:
+            with span("embed.batch", size=len(batch), distinct=len(texts)):
+                vectors = dict(zip(texts, self.underlying.embed_documents(texts)))
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for text, future in batch:
+            try:
+                future.set_result(vectors[text])
+            except Exception as e:
+                # One bad result (e.g. fewer vectors than texts) fails only its caller.
+                future.set_exception(e)
+
+    def _submit(self, text: str) -> Future:
+        self._ensure_collector()
+        future: Future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def embed_query(self, text: str) -> List[float]:
+        if self.window <= 0:
+            return self.underlying.embed_query(text)
+        return self._submit(text).result(timeout=EMBED_BATCH_TIMEOUT)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        if self.window <= 0:
+            return await self.underlying.aembed_query(text)
+        return await asyncio.wrap_future(self._submit(text))
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.underlying.embed_documents(texts)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.underlying.aembed_documents(texts)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "batches": self.batches,
+            "queries": self.queries,
+            "mean_batch_size": self.queries / self.batches if self.batches else 0.0,
+        }
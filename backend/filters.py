@@ -0,0 +1,49 @@
+from typing import Any, Dict, List, Optional
+
+# Metadata filters use the Mongo-style operator syntax that Pinecone and
+# Chroma share: {"field": {"$eq": v}}, "$in", "$gte", "$lte", "$and".
+Filter = Dict[str, Any]
+
+_OPERATORS = {
+    "$eq": lambda value, arg: value == arg,
+    "$ne": lambda value, arg: value != arg,
+    "$in": lambda value, arg: value in arg,
+    "$nin": lambda value, arg: value not in arg,
+    "$gt": lambda value, arg: value is not None and value > arg,
+    "$gte": lambda value, arg: value is not None and value >= arg,
+    "$lt": lambda value, arg: value is not None and value < arg,
+    "$lte": lambda value, arg: value is not None and value <= arg,
+}
+
+
+def combine(clauses: List[Filter]) -> Optional[Filter]:
+    """AND the clauses together; Chroma rejects an "$and" with fewer than two."""
+    if not clauses:
+        return None
+    if len(clauses) == 1:
+        return clauses[0]
+    return {"$and": clauses}
+
+
+def matches(metadata: Dict[str, Any], where: Optional[Filter]) -> bool:
+    """Evaluate a Pinecone/Chroma-style filter against one document's metadata."""
+    if not where:
+        return True
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(matches(metadata, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            for op, arg in condition.items():
+                try:
+                    if not _OPERATORS[op](value, arg):
+                        return False
+                except TypeError:
+                    return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
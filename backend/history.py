@@ -0,0 +1,163 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+from backend.text import count_tokens, truncate_tokens
+
+HISTORY_TOKEN_BUDGET = int(os.getenv("MEDOM_HISTORY_TOKENS", "1200"))
+HISTORY_KEEP_TURNS = int(os.getenv("MEDOM_HISTORY_TURNS", "3"))
+SUMMARY_MAX_WORDS = int(os.getenv("MEDOM_HISTORY_SUMMARY_WORDS", "120"))
+MAX_SESSIONS = int(os.getenv("MEDOM_HISTORY_SESSIONS", "1024"))
+
+Message = Tuple[str, str]
+# (previous summary, newly folded messages) -> new summary
+Summarizer = Callable[[str, List[Message]], str]
+
+SUMMARY_LABEL = "Summary of the earlier conversation"
+
+
+def _as_message(message: Any) -> Message:
+    if isinstance(message, (tuple, list)):
+        return str(message[0]), str(message[1])
+    # LangChain BaseMessage
+    return message.type, str(message.content)
+
+
+def _digest(message: Message) -> str:
+    return hashlib.sha1(f"{message[0]}\x00{message[1]}".encode("utf-8")).hexdigest()
+
+
+def _prefix_digest(messages: Sequence[Message]) -> str:
+    digest = hashlib.sha1()
+    for message in messages:
+        digest.update(_digest(message).encode("ascii"))
+    return digest.hexdigest()
+
+
+def message_tokens(message: Message) -> int:
+    # ~4 tokens of per-message overhead in the chat format.
+    return count_tokens(message[1]) + 4
+
+
+def format_messages(messages: Sequence[Message]) -> str:
+    return "\n".join(f"{role}: {text}" for role, text in messages)
+
+
+@dataclass
+class _SessionSummary:
+    folded: int = 0  # how many leading messages the summary covers
+    folded_digest: str = ""  # digest of all folded messages, to detect edited or different histories
+    summary: str = ""
+
+
+class HistoryWindow:
+    """
+    Keeps the prompt's chat history under a token budget. The last
+    `keep_turns` human/AI turns are kept verbatim (fewer if they alone exceed
+    the budget, and the latest one cut short if even it does); everything
+    older is folded into a rolling summary. The
+    summary is cached per session id and extended only with the messages that
+    fell out of the window since the previous call, so each turn pays for at
+    most one small summarisation.
+    """
+
+    def __init__(
+        self,
+        token_budget: int = HISTORY_TOKEN_BUDGET,
+        keep_turns: int = HISTORY_KEEP_TURNS,
+        max_sessions: int = MAX_SESSIONS,
+    ):
+        self.token_budget = token_budget
+        self.keep_turns = keep_turns
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, _SessionSummary]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def recent_budget(self) -> int:
+        """Tokens left for the verbatim turns; the summary gets roughly 2 per word of its own."""
+        return self.token_budget - SUMMARY_MAX_WORDS * 2
+
+    def _split(self, messages: List[Message]) -> int:
+        """Index of the first message kept verbatim."""
+        budget = self.recent_budget
+        start = max(0, len(messages) - 2 * self.keep_turns)
+        used = sum(message_tokens(m) for m in messages[start:])
+        # Drop whole turns from the front, but always keep the latest turn.
+        while used > budget and start < len(messages) - 2:
+            used -= message_tokens(messages[start]) + message_tokens(messages[start + 1])
+            start += 2
+        return start
+
+    def _fit(self, messages: List[Message]) -> List[Message]:
+        """Cut the longest of `messages` (the latest turn) short until they fit recent_budget."""
+        if sum(message_tokens(m) for m in messages) <= self.recent_budget:
+            return messages
+        # Short messages keep their full length; the rest share what is left equally.
+        allowed = {}
+        remaining = self.recent_budget
+        by_length = sorted(range(len(messages)), key=lambda i: message_tokens(messages[i]))
+        for n, i in enumerate(by_length):
+            allowed[i] = min(message_tokens(messages[i]), remaining // (len(messages) - n))
+            remaining -= allowed[i]
+        fitted = []
+        for i, (role, text) in enumerate(messages):
+            if allowed[i] < message_tokens((role, text)):
+                # The marker costs a token or two of the per-message overhead.
+                text = truncate_tokens(text, max(0, allowed[i] - 6)) + " …"
+            fitted.append((role, text))
+        return fitted
+
+    def _summary(
+        self, key: str, older: List[Message], summarize: Summarizer
+    ) -> str:
+        with self._lock:
+            state = self._sessions.get(key)
+            if state is not None:
+                self._sessions.move_to_end(key)
+        if (
+            state is None
+            or state.folded > len(older)
+            or _prefix_digest(older[: state.folded]) != state.folded_digest
+        ):
+            state = _SessionSummary()
+        if state.folded < len(older):
+            summary = summarize(state.summary, older[state.folded :])
+            state = _SessionSummary(len(older), _prefix_digest(older), summary)
+            with self._lock:
+                self._sessions[key] = state
+                self._sessions.move_to_end(key)
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+        return state.summary
+
+    def window(
+        self,
+        chat_history: Sequence[Any],
+        summarize: Summarizer,
+        session_id: Optional[str] = None,
+    ) -> List[Message]:
+        """
+        The history to put in the prompt: optional summary message + recent
+        turns. Without a `session_id` there is nothing to key the cached
+        summary on, so older turns are dropped instead of summarised.
+        """
+        messages = [_as_message(m) for m in chat_history]
+        if not messages:
+            return []
+        start = self._split(messages)
+        recent = self._fit(messages[start:])
+        if start == 0 or not session_id:
+            return recent
+        summary = self._summary(session_id, messages[:start], summarize)
+        return [("system", f"{SUMMARY_LABEL}: {summary}")] + recent
+
+    def forget(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
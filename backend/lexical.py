@@ -0,0 +1,175 @@
+import glob
+import hashlib
+import heapq
+import json
+import math
+import os
+import re
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from backend.filters import Filter, matches
+from backend.text import normalize
+
+# One index file per crawl scope; each ingest script rewrites only its own
+# and the server merges them all at load time.
+LEXICAL_INDEX_DIR = os.getenv("MEDOM_LEXICAL_INDEX_DIR", "lexical_index")
+
+# Parcel numbers ("1234/5"), decimals and plain words, over diacritic-folded text.
+_TOKEN_RE = re.compile(r"\d+(?:[/.,-]\d+)*|[a-z]+")
+
+_STOPWORDS = frozenset(
+    """a ali bi da do i ili iz je jer k ka kao li na ne nego ni o od pa po pod
+    s sa se su ta te to u uz za zbog sve svi koji koja koje sam smo ste the and
+    of in for with to is are""".split()
+)
+
+# Light Croatian suffix stripper (longest match first) in the spirit of the
+# Ljubešić/Pandžić rule-based stemmer; enough to conflate case and number.
+_SUFFIXES = sorted(
+    """ovima evima ijama ijima anjem enjem skih skim skog skoj skom skoga
+    ijeg ijem ijoj ama ima ova eva ovi evi ove eve oga ega omu emu ome iji ija
+    ije iju ska ske ski sko sku ih im om em og eg oj ej a e i o u""".split(),
+    key=len,
+    reverse=True,
+)
+_MIN_STEM = 3
+
+
+def lexical_index_path(scope: str, root: str = LEXICAL_INDEX_DIR) -> str:
+    readable = re.sub(r"[^a-z0-9]+", "-", scope.lower()).strip("-")[-60:]
+    return os.path.join(root, f"{readable}-{hashlib.sha1(scope.encode('utf-8')).hexdigest()[:8]}.json")
+
+
+def stem(token: str) -> str:
+    for suffix in _SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= _MIN_STEM:
+            return token[: -len(suffix)]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """Normalise diacritics, drop stopwords and stem Croatian words."""
+    tokens = []
+    for token in _TOKEN_RE.findall(normalize(text)):
+        if token[0].isdigit():
+            tokens.append(token)
+        elif len(token) > 1 and token not in _STOPWORDS:
+            tokens.append(stem(token))
+    return tokens
+
+
+class LexicalIndex:
+    """In-memory BM25 inverted index over chunk documents."""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.documents: List[Document] = []
+        self.doc_lengths: List[int] = []
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}
+        self.avg_length = 0.0
+
+    @classmethod
+    def build(cls, documents: Iterable[Document], **kwargs) -> "LexicalIndex":
+        index = cls(**kwargs)
+        postings = defaultdict(list)
+        for doc_id, doc in enumerate(documents):
+            counts = Counter(tokenize(doc.page_content))
+            for term, tf in counts.items():
+                postings[term].append((doc_id, tf))
+            index.documents.append(doc)
+            index.doc_lengths.append(sum(counts.values()))
+        index.postings = dict(postings)
+        index._finalize()
+        return index
+
+    def _finalize(self):
+        n = len(self.doc_lengths)
+        self.avg_length = sum(self.doc_lengths) / n if n else 0.0
+        norms = [
+            self.k1 * (1 - self.b + self.b * length / (self.avg_length or 1))
+            for length in self.doc_lengths
+        ]
+        # Precompute the full BM25 contribution of every posting so a query
+        # is only dictionary lookups and additions.
+        self._weights = {}
+        for term, plist in self.postings.items():
+            idf = math.log(1 + (n - len(plist) + 0.5) / (len(plist) + 0.5))
+            self._weights[term] = [
+                (doc_id, idf * tf * (self.k1 + 1) / (tf + norms[doc_id])) for doc_id, tf in plist
+            ]
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def search(
+        self, query: str, k: int = 4, filter: Optional[Filter] = None
+    ) -> List[Tuple[Document, float]]:
+        scores: Dict[int, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            for doc_id, weight in self._weights.get(term, ()):
+                scores[doc_id] += weight
+        if filter:
+            scores = {
+                doc_id: score
+                for doc_id, score in scores.items()
+                if matches(self.documents[doc_id].metadata, filter)
+            }
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [(self.documents[doc_id], score) for doc_id, score in best]
+
+    @classmethod
+    def merge(cls, indexes: Iterable["LexicalIndex"]) -> "LexicalIndex":
+        """One index over the documents of `indexes`, with collection statistics recomputed."""
+        indexes = list(indexes)
+        merged = cls(k1=indexes[0].k1, b=indexes[0].b) if indexes else cls()
+        postings = defaultdict(list)
+        for index in indexes:
+            offset = len(merged.documents)
+            for term, plist in index.postings.items():
+                postings[term].extend((doc_id + offset, tf) for doc_id, tf in plist)
+            merged.documents.extend(index.documents)
+            merged.doc_lengths.extend(index.doc_lengths)
+        merged.postings = dict(postings)
+        merged._finalize()
+        return merged
+
+    def save(self, path: str):
+        payload = {
+            "k1": self.k1,
+            "b": self.b,
+            "documents": [
+                {"page_content": d.page_content, "metadata": d.metadata} for d in self.documents
+            ],
+            "doc_lengths": self.doc_lengths,
+            "postings": self.postings,
+        }
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "LexicalIndex":
+        with open(path, encoding="utf-8") as f:
+            payload = json.load(f)
+        index = cls(k1=payload["k1"], b=payload["b"])
+        index.documents = [Document(**d) for d in payload["documents"]]
+        index.doc_lengths = payload["doc_lengths"]
+        index.postings = {
+            term: [tuple(p) for p in plist] for term, plist in payload["postings"].items()
+        }
+        index._finalize()
+        return index
+
+    @classmethod
+    def load_all(cls, root: str = LEXICAL_INDEX_DIR) -> Optional["LexicalIndex"]:
+        """Merge every scope's index under `root`; None when nothing has been ingested."""
+        paths = sorted(glob.glob(os.path.join(root, "*.json")))
+        if not paths:
+            return None
+        return cls.merge(cls.load(path) for path in paths)
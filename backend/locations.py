@@ -0,0 +1,84 @@
+import re
+from typing import Dict, List, Optional, Tuple
+
+from backend.text import normalize
+
+# Canonical city -> (display name, county, pattern over normalised text).
+# Patterns cover the common case forms ("u Splitu", "kod Zadra", "na Braču").
+CITIES: Dict[str, Tuple[str, str, re.Pattern]] = {
+    key: (label, county, re.compile(rf"\b(?:{forms})\b"))
+    for key, label, county, forms in [
+        ("zagreb", "Zagreb", "grad_zagreb", r"zagreb(?:a|u|om)?"),
+        ("split", "Split", "splitsko_dalmatinska", r"split(?:a|u|om)?"),
+        ("rijeka", "Rijeka", "primorsko_goranska", r"rijek(?:a|e|u|om)|rijeci"),
+        ("osijek", "Osijek", "osjecko_baranjska", r"osijek(?:a|u|om)?"),
+        ("zadar", "Zadar", "zadarska", r"zadar|zadr(?:a|u|om)"),
+        ("pula", "Pula", "istarska", r"pul(?:a|e|i|u|om)"),
+        ("sibenik", "Šibenik", "sibensko_kninska", r"sibenik(?:a|u|om)?"),
+        ("dubrovnik", "Dubrovnik", "dubrovacko_neretvanska", r"dubrovnik(?:a|u|om)?"),
+        ("trogir", "Trogir", "splitsko_dalmatinska", r"trogir(?:a|u|om)?"),
+        ("kastela", "Kaštela", "splitsko_dalmatinska", r"kastel(?:a|ima)|kastel \w+"),
+        ("solin", "Solin", "splitsko_dalmatinska", r"solin(?:a|u|om)?"),
+        ("podstrana", "Podstrana", "splitsko_dalmatinska", r"podstran(?:a|e|i|u|om)"),
+        ("omis", "Omiš", "splitsko_dalmatinska", r"omis(?:a|u|em)?"),
+        ("makarska", "Makarska", "splitsko_dalmatinska", r"makarsk(?:a|e|oj|u|om)"),
+        ("sinj", "Sinj", "splitsko_dalmatinska", r"sinj(?:a|u|em)?"),
+        ("ciovo", "Čiovo", "splitsko_dalmatinska", r"ciov(?:o|a|u)"),
+        ("brac", "Brač", "splitsko_dalmatinska", r"brac(?:a|u|em)?"),
+        ("hvar", "Hvar", "splitsko_dalmatinska", r"hvar(?:a|u|om)?"),
+        ("seget", "Seget", "splitsko_dalmatinska", r"seget(?:a|u|om)?"),
+        ("dugopolje", "Dugopolje", "splitsko_dalmatinska", r"dugopolj(?:e|a|u)"),
+        ("klis", "Klis", "splitsko_dalmatinska", r"klis(?:a|u|om)?"),
+        ("vodice", "Vodice", "sibensko_kninska", r"vodic(?:e|ama)"),
+        ("opatija", "Opatija", "primorsko_goranska", r"opatij(?:a|e|i|u|om)"),
+        ("rovinj", "Rovinj", "istarska", r"rovinj(?:a|u|em)?"),
+        ("porec", "Poreč", "istarska", r"porec(?:a|u|om)?"),
+        ("varazdin", "Varaždin", "varazdinska", r"varazdin(?:a|u|om)?"),
+        ("velika_gorica", "Velika Gorica", "zagrebacka", r"velik(?:a|oj|u) goric(?:a|i|u)"),
+        ("samobor", "Samobor", "zagrebacka", r"samobor(?:a|u|om)?"),
+    ]
+}
+
+# Counties and the informal regions people search by -> county keys.
+REGIONS: Dict[str, Tuple[re.Pattern, Tuple[str, ...]]] = {
+    key: (re.compile(rf"\b(?:{forms})"), counties)
+    for key, forms, counties in [
+        ("splitsko_dalmatinska", r"splitsko[ -]dalmatinsk\w*", ("splitsko_dalmatinska",)),
+        ("zadarska", r"zadarsk\w* zupanij\w*", ("zadarska",)),
+        ("istarska", r"istr(?:a|e|i|u|om)\b|istarsk\w*|istria", ("istarska",)),
+        ("primorsko_goranska", r"primorsko[ -]goransk\w*|kvarner\w*", ("primorsko_goranska",)),
+        ("zagrebacka", r"zagrebac\w* zupanij\w*|okolic\w* zagreb\w*", ("zagrebacka",)),
+        (
+            "dalmacija",
+            r"dalmacij\w*|dalmatia",
+            (
+                "splitsko_dalmatinska",
+                "zadarska",
+                "sibensko_kninska",
+                "dubrovacko_neretvanska",
+            ),
+        ),
+    ]
+}
+
+CITY_COUNTIES = {key: county for key, (_, county, _) in CITIES.items()}
+
+
+def find_city(text: str) -> Optional[str]:
+    """Canonical key of the first known city mentioned in `text`."""
+    text = normalize(text)
+    best = None
+    for key, (_, _, pattern) in CITIES.items():
+        match = pattern.search(text)
+        if match and (best is None or match.start() < best[0]):
+            best = (match.start(), key)
+    return best[1] if best else None
+
+
+def find_counties(text: str) -> List[str]:
+    """Counties covered by a region named in `text` ("Dalmacija", "Istra", ...)."""
+    text = normalize(text)
+    for pattern, counties in REGIONS.values():
+        if pattern.search(text):
+            return list(counties)
+    return []
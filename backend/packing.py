@@ -0,0 +1,161 @@
+import hashlib
+import math
+import os
+from collections import Counter
+from typing import Dict, List, Optional
+
+from langchain_core.documents import Document
+
+from backend.lexical import tokenize
+from backend.text import count_tokens, normalize
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("MEDOM_CONTEXT_TOKENS", "3000"))
+MMR_LAMBDA = float(os.getenv("MEDOM_MMR_LAMBDA", "0.7"))
+
+# Shortest suffix/prefix match treated as splitter overlap rather than coincidence.
+_MIN_TEXT_OVERLAP = 40
+
+
+def doc_tokens(doc: Document) -> int:
+    """Token count stored at ingestion time, counted on the fly for older chunks."""
+    tokens = doc.metadata.get("token_count")
+    return tokens if isinstance(tokens, int) else count_tokens(doc.page_content)
+
+
+def _text_overlap(first: str, second: str, max_overlap: int = 2000) -> int:
+    """Length of the longest suffix of `first` that is a prefix of `second`."""
+    tail = first[-max_overlap:]
+    probe = second[:_MIN_TEXT_OVERLAP]
+    if len(probe) < _MIN_TEXT_OVERLAP:
+        return 0
+    start = tail.find(probe)
+    while start != -1:
+        if second.startswith(tail[start:]):
+            return len(tail) - start
+        start = tail.find(probe, start + 1)
+    return 0
+
+
+def _trimmed(doc: Document, chars: int) -> Document:
+    text = doc.page_content[chars:].lstrip()
+    metadata = {**doc.metadata, "token_count": count_tokens(text)}
+    if isinstance(metadata.get("start_index"), int):
+        metadata["start_index"] += len(doc.page_content) - len(text)
+    return Document(page_content=text, metadata=metadata)
+
+
+def drop_overlaps(docs: List[Document]) -> List[Document]:
+    """
+    Remove exact duplicates and chunks contained in another chunk of the same
+    source, and cut the splitter overlap off the later of two adjacent chunks.
+    Uses the `start_index` metadata when present, text matching otherwise.
+    Order is preserved.
+    """
+    seen = set()
+    unique = []
+    for doc in docs:
+        digest = hashlib.sha1(normalize(doc.page_content).encode("utf-8")).digest()
+        if digest not in seen:
+            seen.add(digest)
+            unique.append(doc)
+
+    result: Dict[int, Optional[Document]] = dict(enumerate(unique))
+    by_source: Dict[str, List[int]] = {}
+    for i, doc in enumerate(unique):
+        by_source.setdefault(doc.metadata.get("source", ""), []).append(i)
+
+    for positions in by_source.values():
+        if len(positions) < 2:
+            continue
+        spans = all(isinstance(unique[i].metadata.get("start_index"), int) for i in positions)
+        if spans:
+            positions = sorted(positions, key=lambda i: unique[i].metadata["start_index"])
+        else:
+            positions = sorted(positions, key=lambda i: unique[i].metadata.get("ordinal", i))
+        previous = None
+        for i in positions:
+            doc = result[i]
+            if previous is None:
+                previous = doc
+                continue
+            if spans:
+                prev_end = previous.metadata["start_index"] + len(previous.page_content)
+                start = doc.metadata["start_index"]
+                end = start + len(doc.page_content)
+                if end <= prev_end:
+                    result[i] = None
+                    continue
+                overlap = max(0, prev_end - start)
+            else:
+                if doc.page_content in previous.page_content:
+                    result[i] = None
+                    continue
+                overlap = _text_overlap(previous.page_content, doc.page_content)
+            if overlap:
+                doc = result[i] = _trimmed(doc, overlap)
+            previous = doc
+    return [doc for doc in result.values() if doc is not None]
+
+
+def _cosine(a: Counter, b: Counter) -> float:
+    if not a or not b:
+        return 0.0
+    if len(a) > len(b):
+        a, b = b, a
+    dot = sum(count * b[term] for term, count in a.items())
+    return dot / math.sqrt(sum(v * v for v in a.values()) * sum(v * v for v in b.values()))
+
+
+def mmr_order(query: str, docs: List[Document], lambda_mult: float = MMR_LAMBDA) -> List[Document]:
+    """
+    Maximal marginal relevance over stemmed term vectors. Relevance blends
+    the retriever's rank with query/term overlap; redundancy is the highest
+    similarity to an already selected chunk.
+    """
+    if len(docs) < 2:
+        return list(docs)
+    query_vec = Counter(tokenize(query))
+    vectors = [Counter(tokenize(doc.page_content)) for doc in docs]
+    n = len(docs)
+    relevance = [
+        0.5 * (n - rank) / n + 0.5 * _cosine(query_vec, vector)
+        for rank, vector in enumerate(vectors)
+    ]
+    selected: List[int] = []
+    remaining = list(range(n))
+    redundancy = [0.0] * n
+    while remaining:
+        best = max(
+            remaining,
+            key=lambda i: lambda_mult * relevance[i] - (1 - lambda_mult) * redundancy[i],
+        )
+        selected.append(best)
+        remaining.remove(best)
+        for i in remaining:
+            redundancy[i] = max(redundancy[i], _cosine(vectors[i], vectors[best]))
+    return [docs[i] for i in selected]
+
+
+class ContextPacker:
+    """
+    Turns retrieved chunks into the prompt context: de-duplicates and trims
+    overlap, orders by MMR, then fills `token_budget` greedily (a chunk that
+    does not fit is skipped in favour of smaller, lower-ranked ones). The top
+    chunk is always kept.
+    """
+
+    def __init__(self, token_budget: int = CONTEXT_TOKEN_BUDGET, lambda_mult: float = MMR_LAMBDA):
+        self.token_budget = token_budget
+        self.lambda_mult = lambda_mult
+
+    def pack(self, query: str, docs: List[Document]) -> List[Document]:
+        ordered = mmr_order(query, drop_overlaps(docs), self.lambda_mult)
+        packed = []
+        used = 0
+        for doc in ordered:
+            tokens = doc_tokens(doc)
+            if packed and used + tokens > self.token_budget:
+                continue
+            packed.append(doc)
+            used += tokens
+        return packed
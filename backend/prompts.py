@@ -0,0 +1,65 @@
+from langchain_core.prompts import (
+    ChatPromptTemplate,
+    MessagesPlaceholder,
+    PromptTemplate,
+    SystemMessagePromptTemplate,
+)
+
+# Vendored copies of the LangChain Hub prompts the chain used to pull on every
+# query ("langchain-ai/chat-langchain-rephrase" and
+# "langchain-ai/retrieval-qa-chat"), so building the chain needs no network.
+
+REPHRASE_TEMPLATE = """Given the following conversation and a follow up question, rephrase the follow up question to be a standalone question.
+
+Chat History:
+{chat_history}
+Follow Up Input: {input}
+Standalone Question:"""
+
+RETRIEVAL_QA_SYSTEM_TEMPLATE = """Answer any use questions based solely on the context below:
+
+<context>
+{context}
+</context>"""
+
+SYSTEM_GUIDELINES = """
+                    Guidelines:
+
+                    1. You are a senior real estate agent. Always give clear answer. You will return a list of estates which are result of search.
+
+                    2. Structure:
+                       - real estate 1, price, source url then new line
+                       - real estate 2, price, source url then new line
+                       - real estate 3, price, source url then new line
+
+                    """
+
+
+def rephrase_prompt() -> PromptTemplate:
+    return PromptTemplate.from_template(REPHRASE_TEMPLATE)
+
+
+def retrieval_qa_chat_prompt() -> ChatPromptTemplate:
+    return ChatPromptTemplate.from_messages(
+        [
+            SystemMessagePromptTemplate.from_template(SYSTEM_GUIDELINES),
+            ("system", RETRIEVAL_QA_SYSTEM_TEMPLATE),
+            MessagesPlaceholder(variable_name="chat_history", optional=True),
+            ("human", "{input}"),
+        ]
+    )
+
+
+SUMMARY_TEMPLATE = """Progressively summarize the conversation between a user and a real estate assistant, adding onto the previous summary and returning a new summary. Keep the user's requirements (property type, location, budget, size) and any listings or URLs already discussed. Answer in the language of the conversation, in at most {max_words} words.
+
+Previous summary:
+{summary}
+
+New lines of conversation:
+{new_lines}
+
+New summary:"""
+
+
+def summary_prompt() -> PromptTemplate:
+    return PromptTemplate.from_template(SUMMARY_TEMPLATE)
@@ -0,0 +1,201 @@
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+from backend.catalog import LAND_USES, PROPERTY_TYPES
+from backend.filters import Filter, combine
+from backend.locations import CITY_COUNTIES, find_city, find_counties
+from backend.text import normalize, parse_number
+
+DEFAULT_TOP_N = 5
+MAX_TOP_N = 50
+
+# Superlative stem (normalised HR/EN) -> (sort column, descending)
+_SUPERLATIVES = [
+    (re.compile(r"\bnajskupl\w*|\bmost expensive\b|\bpriciest\b"), ("price_eur", True)),
+    (re.compile(r"\bnajjeftin\w*|\bcheapest\b|\bleast expensive\b"), ("price_eur", False)),
+    (re.compile(r"\bnajvec\w*|\blargest\b|\bbiggest\b"), ("area_m2", True)),
+    (re.compile(r"\bnajmanj\w*|\bsmallest\b"), ("area_m2", False)),
+]
+# A sort term only makes a listing search when it qualifies one of these
+# nouns ("najjeftiniji trosobni stan", "cheapest building plots"), not for
+# "najveća prednost" or "cheapest way to finance".
+_GENERIC_LISTING_NOUNS = re.compile(r"\b(?:nekretnin\w*|oglas\w*|propert(?:y|ies)|listings?)\b")
+_SORT_NOUN_WINDOW = 3
+_PER_M2 = re.compile(r"\b(?:po|per|/)\s*(?:m2|m²|kvadrat\w*|square)")
+
+_COUNT = re.compile(r"\b(?:top\s+)?(\d{1,2})\s+(?:naj|most|cheapest|largest|biggest|smallest|priciest)")
+_AMOUNT = r"(\d[\d.,\s]*\d|\d)\s*(k|tis\w*|mil\w*)?\s*"
+_EUR = r"(?:€|eur\w*)"
+_M2 = r"(?:m2|m²|kvadrat\w*)"
+_UPPER = r"(?:do|ispod|manje od|max(?:imalno)?|najvise|under|below|up to|less than|at most)"
+_LOWER = r"(?:od|iznad|vise od|min(?:imalno)?|najmanje|over|above|more than|at least|from)"
+_BETWEEN = r"(?:izmedu|between)"
+
+# English plural/singular nouns in addition to the Croatian patterns shared with the catalog.
+_EN_PROPERTY_TYPES = {
+    "stan": re.compile(r"\b(?:flats?|apartments?)\b"),
+    "kuca": re.compile(r"\b(?:houses?|villas?)\b"),
+    "zemljiste": re.compile(r"\b(?:plots?|land|lots?)\b"),
+    "poslovni_prostor": re.compile(r"\b(?:offices?|commercial)\b"),
+}
+_EN_LAND_USES = {
+    "gradevinsko": re.compile(r"\bbuilding (?:plots?|land)\b"),
+    "poljoprivredno": re.compile(r"\bagricultural\b"),
+}
+
+# A capitalised word after a locative preposition names a place ("u Bolu",
+# "near Novalja"), on the original text since case is lost in normalisation.
+_PLACE = re.compile(r"\b(?:u|na|kod|blizu|pokraj|near|in|around)\s+([A-ZČĆŠĐŽ][\w-]*)")
+_NOT_A_PLACE = re.compile(r"^(?:hrvatsk\w*|croatia|eur\w*|kn|m2)$")
+
+
+@dataclass
+class ParsedQuery:
+    property_type: Optional[str] = None
+    land_use: Optional[str] = None
+    city: Optional[str] = None
+    counties: List[str] = field(default_factory=list)
+    price_min: Optional[float] = None
+    price_max: Optional[float] = None
+    area_min: Optional[float] = None
+    area_max: Optional[float] = None
+    sort_by: Optional[str] = None
+    descending: bool = False
+    limit: int = DEFAULT_TOP_N
+    # A place the query names that is neither a known city nor a region.
+    unresolved_location: Optional[str] = None
+
+    @property
+    def has_range(self) -> bool:
+        return any(
+            v is not None for v in (self.price_min, self.price_max, self.area_min, self.area_max)
+        )
+
+    @property
+    def is_structured(self) -> bool:
+        """
+        True when the catalog alone can answer: a sorted request for one
+        property type, in a place the catalog can filter on. Without a type
+        ("najjeftinije nekretnine") a top-N from one catalog would pass for
+        the whole market.
+        """
+        return (
+            self.sort_by is not None
+            and self.property_type is not None
+            and self.unresolved_location is None
+        )
+
+    def metadata_filter(self) -> Optional[Filter]:
+        """
+        Pinecone/Chroma metadata filter over the fields ingestion stores on
+        every chunk (see catalog.chunk_metadata), or None for an open query.
+        """
+        clauses = []
+        for key, value in (
+            ("property_type", self.property_type),
+            ("land_use", self.land_use),
+            ("city", self.city),
+        ):
+            if value is not None:
+                clauses.append({key: {"$eq": value}})
+        if self.counties and self.city is None:
+            clauses.append({"county": {"$in": list(self.counties)}})
+        for key, op, value in (
+            ("price_eur", "$gte", self.price_min),
+            ("price_eur", "$lte", self.price_max),
+            ("area_m2", "$gte", self.area_min),
+            ("area_m2", "$lte", self.area_max),
+        ):
+            if value is not None:
+                clauses.append({key: {op: value}})
+        return combine(clauses)
+
+
+def _amount(number: str, suffix: Optional[str]) -> Optional[float]:
+    value = parse_number(number)
+    if value is None:
+        return None
+    if suffix:
+        value *= 1_000_000 if suffix.startswith("mil") else 1_000
+    return value
+
+
+def _range(text: str, unit: str) -> Tuple[Optional[float], Optional[float]]:
+    between = re.search(
+        rf"(?:{_BETWEEN}|{_LOWER})\s+{_AMOUNT}{unit}?\s*(?:i|and|do|to|-|–)\s*{_AMOUNT}{unit}",
+        text,
+    ) or re.search(rf"{_AMOUNT}{unit}?\s*(?:-|–)\s*{_AMOUNT}{unit}", text)
+    if between:
+        return _amount(between.group(1), between.group(2)), _amount(
+            between.group(3), between.group(4)
+        )
+    lower = re.search(rf"\b{_LOWER}\s+{_AMOUNT}{unit}", text)
+    upper = re.search(rf"\b{_UPPER}\s+{_AMOUNT}{unit}", text)
+    return (
+        _amount(lower.group(1), lower.group(2)) if lower else None,
+        _amount(upper.group(1), upper.group(2)) if upper else None,
+    )
+
+
+def _sorts_listings(text: str, match: re.Match) -> bool:
+    """Whether the sort term `match` qualifies a listing noun right before or after it."""
+    window = " ".join(
+        text[: match.start()].split()[-1:] + text[match.end() :].split()[:_SORT_NOUN_WINDOW]
+    )
+    nouns = [*PROPERTY_TYPES.values(), *_EN_PROPERTY_TYPES.values(), _GENERIC_LISTING_NOUNS]
+    return any(noun.search(window) for noun in nouns)
+
+
+def _unresolved_place(query: str) -> Optional[str]:
+    for match in _PLACE.finditer(query):
+        if not _NOT_A_PLACE.match(normalize(match.group(1))):
+            return match.group(1)
+    return None
+
+
+def _match_first(text: str, *tables: dict) -> Optional[str]:
+    for table in tables:
+        for value, pattern in table.items():
+            if pattern.search(text):
+                return value
+    return None
+
+
+def parse_query(query: str) -> ParsedQuery:
+    """
+    Rule-based parse of a HR/EN search query into listing filters (type,
+    city/region, price and area ranges) and sort order.
+    """
+    text = normalize(query)
+    parsed = ParsedQuery(
+        property_type=_match_first(text, PROPERTY_TYPES, _EN_PROPERTY_TYPES),
+        land_use=_match_first(text, LAND_USES, _EN_LAND_USES),
+    )
+
+    # A city wins over a region that contains it ("Split, Dalmacija");
+    # "okolica Zagreba" names a region around the city, not the city.
+    city = find_city(text)
+    counties = find_counties(text)
+    if city is not None and (not counties or CITY_COUNTIES[city] in counties):
+        parsed.city = city
+    else:
+        parsed.counties = counties
+    if parsed.city is None and not parsed.counties:
+        parsed.unresolved_location = _unresolved_place(query)
+
+    for pattern, (column, descending) in _SUPERLATIVES:
+        match = pattern.search(text)
+        if match and _sorts_listings(text, match):
+            parsed.sort_by, parsed.descending = column, descending
+            break
+    if parsed.sort_by == "price_eur" and _PER_M2.search(text):
+        parsed.sort_by = "price_per_m2"
+
+    count = _COUNT.search(text)
+    if count:
+        parsed.limit = max(1, min(int(count.group(1)), MAX_TOP_N))
+
+    parsed.price_min, parsed.price_max = _range(text, _EUR)
+    parsed.area_min, parsed.area_max = _range(text, _M2)
+    return parsed
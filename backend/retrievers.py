@@ -0,0 +1,166 @@
+import asyncio
+import contextvars
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForRetrieverRun,
+    CallbackManagerForRetrieverRun,
+)
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
+
+from backend.cache import recall_query_embedding
+from backend.lexical import LexicalIndex
+from backend.filters import Filter
+from backend.packing import ContextPacker, doc_tokens
+from backend.query import parse_query
+from backend.tracing import span
+
+logger = logging.getLogger(__name__)
+
+_vector_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="vector-search")
+
+
+def _doc_key(doc: Document) -> str:
+    return f"{doc.metadata.get('source', '')}\x00{doc.page_content}"
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[Document]], k: int = 4, rrf_k: int = 60
+) -> List[Document]:
+    """Fuse ranked lists by summing 1 / (rrf_k + rank) for every list a document appears in."""
+    scores: Dict[str, float] = {}
+    docs: Dict[str, Document] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, 1):
+            key = _doc_key(doc)
+            docs.setdefault(key, doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank)
+    best = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [docs[key] for key in best]
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Dense + BM25 retriever fused by reciprocal rank. Falls back to the lexical
+    index alone when the vector store is missing, slow or failing. The query
+    embedding and the vector search are traced as separate spans; a query the
+    answer cache already embedded in this request is not embedded again. With a
+    `packer`, the `k` fused chunks are trimmed to the prompt's token budget.
+
+    With `use_filters`, property type, city/region and price/area ranges
+    parsed from the query restrict both searches to matching chunks; a search
+    that finds nothing under the filter is retried without it.
+    """
+
+    vectorstore: Optional[VectorStore] = None
+    lexical_index: Optional[LexicalIndex] = None
+    k: int = 4
+    candidates: int = 10
+    rrf_k: int = 60
+    vector_timeout: float = 3.0
+    packer: Optional[ContextPacker] = None
+    use_filters: bool = False
+
+    def _filter(self, query: str) -> Optional[Filter]:
+        return parse_query(query).metadata_filter() if self.use_filters else None
+
+    def _lexical(self, query: str, where: Optional[Filter] = None) -> List[Document]:
+        if self.lexical_index is None:
+            return []
+        with span("retrieve.lexical", filtered=where is not None) as current:
+            results = self.lexical_index.search(query, k=self.candidates, filter=where)
+            if where and not results:
+                results = self.lexical_index.search(query, k=self.candidates)
+            docs = [doc for doc, _ in results]
+            current.set(documents=len(docs))
+        return docs
+
+    def _vector(self, query: str, where: Optional[Filter] = None) -> List[Document]:
+        embedding = recall_query_embedding(query)
+        if embedding is None:
+            with span("retrieve.embed_query", bytes=len(query.encode("utf-8"))):
+                embedding = self.vectorstore.embeddings.embed_query(query)
+        with span("retrieve.vector_search", filtered=where is not None) as current:
+            docs = []
+            if where:
+                docs = self.vectorstore.similarity_search_by_vector(
+                    embedding, k=self.candidates, filter=where
+                )
+            if not docs:
+                docs = self.vectorstore.similarity_search_by_vector(embedding, k=self.candidates)
+            current.set(documents=len(docs))
+        return docs
+
+    async def _avector(self, query: str, where: Optional[Filter] = None) -> List[Document]:
+        embedding = recall_query_embedding(query)
+        if embedding is None:
+            with span("retrieve.embed_query", bytes=len(query.encode("utf-8"))):
+                embedding = await self.vectorstore.embeddings.aembed_query(query)
+        with span("retrieve.vector_search", filtered=where is not None) as current:
+            docs = []
+            if where:
+                docs = await self.vectorstore.asimilarity_search_by_vector(
+                    embedding, k=self.candidates, filter=where
+                )
+            if not docs:
+                docs = await self.vectorstore.asimilarity_search_by_vector(
+                    embedding, k=self.candidates
+                )
+            current.set(documents=len(docs))
+        return docs
+
+    def _fuse(
+        self, query: str, vector_docs: List[Document], lexical_docs: List[Document]
+    ) -> List[Document]:
+        rankings = [ranking for ranking in (vector_docs, lexical_docs) if ranking]
+        docs = reciprocal_rank_fusion(rankings, k=self.k, rrf_k=self.rrf_k)
+        if self.packer is None:
+            return docs
+        with span("context_packing", candidates=len(docs)) as current:
+            packed = self.packer.pack(query, docs)
+            current.set(
+                documents=len(packed),
+                tokens=sum(doc_tokens(doc) for doc in packed),
+                tokens_in=sum(doc_tokens(doc) for doc in docs),
+            )
+        return packed
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        vector_docs: List[Document] = []
+        where = self._filter(query)
+        future = None
+        if self.vectorstore is not None:
+            # copy_context keeps the vector spans inside the caller's trace.
+            future = _vector_pool.submit(
+                contextvars.copy_context().run, self._vector, query, where
+            )
+        # BM25 runs on this thread while the vector query is in flight.
+        lexical_docs = self._lexical(query, where)
+        if future is not None:
+            try:
+                vector_docs = future.result(timeout=self.vector_timeout)
+            except Exception as e:
+                logger.warning("Vector retrieval failed, using lexical results only: %r", e)
+        return self._fuse(query, vector_docs, lexical_docs)
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        vector_docs: List[Document] = []
+        where = self._filter(query)
+        task = None
+        if self.vectorstore is not None:
+            task = asyncio.ensure_future(self._avector(query, where))
+        lexical_docs = self._lexical(query, where)
+        if task is not None:
+            try:
+                vector_docs = await asyncio.wait_for(task, timeout=self.vector_timeout)
+            except Exception as e:
+                logger.warning("Vector retrieval failed, using lexical results only: %r", e)
+        return self._fuse(query, vector_docs, lexical_docs)
@@ -0,0 +1,89 @@
+import re
+from typing import Optional
+
+_DIACRITICS = str.maketrans(
+    {
+        "č": "c",
+        "ć": "c",
+        "š": "s",
+        "ž": "z",
+        "đ": "d",
+        "Č": "C",
+        "Ć": "C",
+        "Š": "S",
+        "Ž": "Z",
+        "Đ": "D",
+    }
+)
+
+
+def fold_diacritics(text: str) -> str:
+    """Map Croatian diacritics to ASCII (č/ć -> c, š -> s, ž -> z, đ -> d)."""
+    return text.translate(_DIACRITICS)
+
+
+def normalize(text: str) -> str:
+    """Lowercase, fold diacritics and collapse whitespace."""
+    text = fold_diacritics(text.lower())
+    # Users without a Croatian keyboard often write "dj" for "đ".
+    text = text.replace("dj", "d")
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def parse_number(raw: str) -> Optional[float]:
+    """
+    Parse a Croatian or English formatted number ("120.000,50", "120 000", "1,250.5").
+    """
+    raw = raw.strip().replace("\xa0", "").replace(" ", "")
+    if not raw or not any(ch.isdigit() for ch in raw):
+        return None
+    if "." in raw and "," in raw:
+        # Whichever separator comes last is the decimal one.
+        if raw.rfind(",") > raw.rfind("."):
+            raw = raw.replace(".", "").replace(",", ".")
+        else:
+            raw = raw.replace(",", "")
+    elif "," in raw:
+        head, _, tail = raw.rpartition(",")
+        raw = raw.replace(",", "") if len(tail) == 3 else head.replace(",", "") + "." + tail
+    elif "." in raw:
+        head, _, tail = raw.rpartition(".")
+        if len(tail) == 3:
+            raw = raw.replace(".", "")
+    try:
+        return float(raw)
+    except ValueError:
+        return None
+
+
+def format_eur(value: Optional[float]) -> str:
+    if value is None:
+        return "?"
+    return f"{value:,.0f}".replace(",", ".") + " €"
+
+
+_encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """Tokens as the OpenAI models count them (cl100k_base), ~4 chars/token without tiktoken."""
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoding = False
+    if _encoding is False:
+        return max(1, len(text) // 4)
+    return len(_encoding.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """The longest prefix of `text` that fits in `max_tokens` (as count_tokens counts)."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    if _encoding is False:
+        return text[: max(0, max_tokens) * 4]
+    return _encoding.decode(_encoding.encode(text, disallowed_special=())[: max(0, max_tokens)])
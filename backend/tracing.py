@@ -0,0 +1,219 @@
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+TRACE_PATH = os.getenv("MEDOM_TRACE_PATH")
+PROFILER = os.getenv("MEDOM_PROFILE")  # "cprofile" or "pyinstrument"
+PROFILE_DIR = os.getenv("MEDOM_PROFILE_DIR", "profiles")
+
+# Prometheus histogram buckets, in seconds.
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_trace_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("trace_id", default=None)
+_parent_span: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("parent_span", default=None)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class MetricsRegistry:
+    """Thread-safe span-duration histograms and counters with Prometheus text output."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: Dict[Tuple[str, Labels], list] = {}
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+
+    @staticmethod
+    def _labels(labels: Dict[str, Any]) -> Labels:
+        return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = (name, self._labels(labels))
+        with self._lock:
+            # [bucket counts..., count, sum]
+            hist = self._histograms.setdefault(key, [0] * len(BUCKETS) + [0, 0.0])
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    hist[i] += 1
+            hist[-2] += 1
+            hist[-1] += seconds
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, self._labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def render_prometheus(self) -> str:
+        def fmt(labels: Labels, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+            pairs = labels + extra
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+        lines = []
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+        typed = set()
+        for (name, labels), hist in histograms:
+            if name not in typed:
+                lines.append(f"# TYPE {name} histogram")
+                typed.add(name)
+            for bound, count in zip(BUCKETS, hist):
+                lines.append(f"{name}_bucket{fmt(labels, (('le', str(bound)),))} {count}")
+            lines.append(f"{name}_bucket{fmt(labels, (('le', '+Inf'),))} {hist[-2]}")
+            lines.append(f"{name}_count{fmt(labels)} {hist[-2]}")
+            lines.append(f"{name}_sum{fmt(labels)} {hist[-1]:.6f}")
+        for (name, labels), value in counters:
+            if name not in typed:
+                lines.append(f"# TYPE {name} counter")
+                typed.add(name)
+            lines.append(f"{name}{fmt(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+
+class _JsonLinesSink:
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+
+    def write(self, record: Dict[str, Any]):
+        if not self.path:
+            return
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, "a", encoding="utf-8", buffering=1)
+            self._file.write(line + "\n")
+
+
+sink = _JsonLinesSink(TRACE_PATH)
+
+
+def current_trace_id() -> Optional[str]:
+    return _trace_id.get()
+
+
+class Span:
+    def __init__(self, name: str, attributes: Dict[str, Any]):
+        self.name = name
+        self.attributes = attributes
+        self.span_id = uuid.uuid4().hex[:16]
+
+    def set(self, **attributes):
+        """Attach counts (tokens, bytes, documents, ...) discovered while the span runs."""
+        self.attributes.update(attributes)
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Span]:
+    """
+    Time a pipeline step. Emits a JSON-lines record to MEDOM_TRACE_PATH and
+    feeds the medom_span_duration_seconds histogram. Nested spans share the
+    trace ID of the outermost one.
+    """
+    current = Span(name, attributes)
+    trace_token = None
+    trace_id = _trace_id.get()
+    if trace_id is None:
+        trace_id = uuid.uuid4().hex
+        trace_token = _trace_id.set(trace_id)
+    parent = _parent_span.get()
+    parent_token = _parent_span.set(current.span_id)
+    status = "ok"
+    started = time.perf_counter()
+    try:
+        yield current
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        duration = time.perf_counter() - started
+        _parent_span.reset(parent_token)
+        if trace_token is not None:
+            _trace_id.reset(trace_token)
+        metrics.observe("medom_span_duration_seconds", duration, span=name, status=status)
+        for key in ("tokens", "bytes"):
+            if isinstance(current.attributes.get(key), (int, float)):
+                metrics.inc(f"medom_{key}_total", current.attributes[key], span=name)
+        sink.write(
+            {
+                "ts": time.time(),
+                "trace_id": trace_id,
+                "span_id": current.span_id,
+                "parent_id": parent,
+                "span": name,
+                "duration_ms": round(duration * 1000, 3),
+                "status": status,
+                **current.attributes,
+            }
+        )
+
+
+@contextmanager
+def profiled(name: str) -> Iterator[None]:
+    """Profile the block with cProfile or pyinstrument when MEDOM_PROFILE is set."""
+    if not PROFILER:
+        yield
+        return
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stem = os.path.join(PROFILE_DIR, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}")
+    if PROFILER == "pyinstrument":
+        from pyinstrument import Profiler
+
+        profiler = Profiler(async_mode="enabled")
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            with open(stem + ".html", "w", encoding="utf-8") as f:
+                f.write(profiler.output_html())
+        return
+    import cProfile
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(stem + ".prof")
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = metrics.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_metrics_server: Optional[ThreadingHTTPServer] = None
+
+
+def start_metrics_server(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Serve /metrics in Prometheus text format from a daemon thread (idempotent)."""
+    global _metrics_server
+    if _metrics_server is None:
+        _metrics_server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        threading.Thread(target=_metrics_server.serve_forever, daemon=True).start()
+    return _metrics_server
@@ -0,0 +1,258 @@
+import json
+import os
+import threading
+import uuid
+from typing import Any, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from backend.filters import matches
+
+INDEX_NAME = "langchain-doc-index"
+CHROMA_PATH = "chroma_db"
+LOCAL_INDEX_PATH = os.getenv("MEDOM_LOCAL_INDEX_PATH", "local_index")
+VECTOR_BACKEND = os.getenv("MEDOM_VECTOR_BACKEND", "pinecone")
+
+BACKENDS = ("pinecone", "chroma", "local")
+
+
+class LocalVectorStore(VectorStore):
+    """
+    Exact cosine-similarity search over an in-memory float32 matrix, persisted
+    as a NumPy snapshot (vectors.npy + documents.json). For a corpus of a few
+    thousand chunks a brute-force mat-vec beats any ANN structure and needs
+    no network round trip. Searches accept the same `filter` dicts as
+    Pinecone and Chroma.
+    """
+
+    def __init__(self, embedding: Embeddings, path: Optional[str] = None):
+        self.embedding = embedding
+        self.path = path
+        self._lock = threading.Lock()
+        self._vectors = np.empty((0, 0), dtype=np.float32)
+        self._ids: List[str] = []
+        self._documents: List[Document] = []
+        self._rows = {}
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    # -- persistence -------------------------------------------------------
+
+    @classmethod
+    def load(cls, embedding: Embeddings, path: str = LOCAL_INDEX_PATH) -> "LocalVectorStore":
+        store = cls(embedding, path)
+        vectors_path = os.path.join(path, "vectors.npy")
+        if os.path.exists(vectors_path):
+            # Memory-mapped: startup cost is independent of the index size.
+            store._vectors = np.load(vectors_path, mmap_mode="r")
+            with open(os.path.join(path, "documents.json"), encoding="utf-8") as f:
+                payload = json.load(f)
+            store._ids = payload["ids"]
+            store._documents = [Document(**d) for d in payload["documents"]]
+            store._rows = {doc_id: row for row, doc_id in enumerate(store._ids)}
+        return store
+
+    def save(self, path: Optional[str] = None):
+        path = path or self.path or LOCAL_INDEX_PATH
+        os.makedirs(path, exist_ok=True)
+        with self._lock:
+            vectors, ids, documents = self._vectors, list(self._ids), list(self._documents)
+        tmp_vectors = os.path.join(path, "vectors.tmp.npy")
+        np.save(tmp_vectors, np.ascontiguousarray(vectors))
+        tmp_documents = os.path.join(path, "documents.json.tmp")
+        with open(tmp_documents, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "ids": ids,
+                    "documents": [
+                        {"page_content": d.page_content, "metadata": d.metadata} for d in documents
+                    ],
+                },
+                f,
+                ensure_ascii=False,
+            )
+        os.replace(tmp_vectors, os.path.join(path, "vectors.npy"))
+        os.replace(tmp_documents, os.path.join(path, "documents.json"))
+
+    # -- writes ------------------------------------------------------------
+
+    def _upsert(self, vectors: List[List[float]], texts: List[str], metadatas, ids) -> List[str]:
+        matrix = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix = matrix / np.where(norms == 0, 1, norms)
+        with self._lock:
+            # Copy-on-write: searches running concurrently keep their snapshot.
+            current = np.array(self._vectors) if len(self._ids) else np.empty((0, matrix.shape[1]), np.float32)
+            ids_out, documents, rows = list(self._ids), list(self._documents), dict(self._rows)
+            appended = []
+            for i, (text, metadata, doc_id) in enumerate(zip(texts, metadatas, ids)):
+                document = Document(page_content=text, metadata=metadata or {})
+                if doc_id in rows:
+                    current[rows[doc_id]] = matrix[i]
+                    documents[rows[doc_id]] = document
+                else:
+                    rows[doc_id] = len(ids_out)
+                    ids_out.append(doc_id)
+                    documents.append(document)
+                    appended.append(matrix[i])
+            if appended:
+                current = np.vstack([current, np.stack(appended)])
+            self._vectors, self._ids, self._documents, self._rows = current, ids_out, documents, rows
+        return list(ids)
+
+    def _prepare(self, texts, metadatas, ids):
+        texts = list(texts)
+        metadatas = list(metadatas) if metadatas is not None else [{} for _ in texts]
+        ids = list(ids) if ids is not None else [str(uuid.uuid4()) for _ in texts]
+        return texts, metadatas, ids
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        texts, metadatas, ids = self._prepare(texts, metadatas, ids)
+        if not texts:
+            return []
+        return self._upsert(self.embedding.embed_documents(texts), texts, metadatas, ids)
+
+    async def aadd_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        texts, metadatas, ids = self._prepare(texts, metadatas, ids)
+        if not texts:
+            return []
+        vectors = await self.embedding.aembed_documents(texts)
+        return self._upsert(vectors, texts, metadatas, ids)
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        if not ids:
+            return False
+        with self._lock:
+            drop = {self._rows[i] for i in ids if i in self._rows}
+            if not drop:
+                return False
+            keep = [row for row in range(len(self._ids)) if row not in drop]
+            self._vectors = np.array(self._vectors[keep])
+            self._ids = [self._ids[row] for row in keep]
+            self._documents = [self._documents[row] for row in keep]
+            self._rows = {doc_id: row for row, doc_id in enumerate(self._ids)}
+        return True
+
+    async def adelete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        return self.delete(ids)
+
+    def clear(self):
+        with self._lock:
+            self._vectors = np.empty((0, 0), dtype=np.float32)
+            self._ids, self._documents, self._rows = [], [], {}
+
+    # -- search ------------------------------------------------------------
+
+    def similarity_search_with_score_by_vector(
+        self, embedding: List[float], k: int = 4, filter: Optional[dict] = None, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        with self._lock:
+            vectors, documents = self._vectors, self._documents
+        if not len(documents):
+            return []
+        rows = None
+        if filter:
+            rows = np.fromiter(
+                (i for i, doc in enumerate(documents) if matches(doc.metadata, filter)), dtype=np.intp
+            )
+            if not len(rows):
+                return []
+            vectors = vectors[rows]
+        query = np.asarray(embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        scores = vectors @ query
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        if rows is not None:
+            return [(documents[rows[i]], float(scores[i])) for i in top]
+        return [(documents[i], float(scores[i])) for i in top]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k, **kwargs)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(self.embedding.embed_query(query), k, **kwargs)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    async def asimilarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        embedding = await self.embedding.aembed_query(query)
+        return self.similarity_search_by_vector(embedding, k, **kwargs)
+
+    def _select_relevance_score_fn(self):
+        return lambda score: (score + 1) / 2
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        path: Optional[str] = None,
+        **kwargs: Any,
+    ) -> "LocalVectorStore":
+        store = cls(embedding, path)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
+
+
+def make_vectorstore(
+    embedding: Embeddings, backend: str = VECTOR_BACKEND, index_name: str = INDEX_NAME
+) -> VectorStore:
+    """Build the configured retrieval backend ("pinecone", "chroma" or "local")."""
+    if backend == "pinecone":
+        from langchain_pinecone import PineconeVectorStore
+
+        return PineconeVectorStore(index_name=index_name, embedding=embedding)
+    if backend == "chroma":
+        from langchain_chroma import Chroma
+
+        return Chroma(persist_directory=CHROMA_PATH, embedding_function=embedding)
+    if backend == "local":
+        return LocalVectorStore.load(embedding, LOCAL_INDEX_PATH)
+    raise ValueError(f"Unknown vector backend {backend!r}, expected one of {BACKENDS}")
+
+
+def reset_vectorstore(vectorstore: VectorStore):
+    """
+    Delete every stored vector, including those upserted under random IDs
+    before ingestion switched to deterministic chunk IDs, which no tombstone
+    can reach.
+    """
+    if isinstance(vectorstore, LocalVectorStore):
+        vectorstore.clear()
+    elif hasattr(vectorstore, "reset_collection"):
+        # Chroma
+        vectorstore.reset_collection()
+    else:
+        # Pinecone: the whole namespace.
+        vectorstore.delete(delete_all=True)
+
+
+def persist_vectorstore(vectorstore: VectorStore):
+    """Flush backends that keep state in-process (Chroma persists on its own)."""
+    if isinstance(vectorstore, LocalVectorStore):
+        vectorstore.save()
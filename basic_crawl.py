@@ -1,40 +1,223 @@
-import requests
+import asyncio
+import json
+import os
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urljoin, urlparse, urlunparse
+
+import httpx
 from bs4 import BeautifulSoup
-from urllib.parse import urljoin, urlparse
-from logger import Colors, log_error, log_header, log_info, log_success, log_warning
+from logger import Colors, log_debug, log_error, log_header, log_info, log_success, log_warning
 
+# Query parameters that change what a page lists; everything else (tracking,
+# sort/share variants) is dropped so variants of one page are fetched once.
+KEEP_QUERY_PARAMS = frozenset({"page", "paged"})
+SKIP_EXTENSIONS = (".jpg", ".jpeg", ".png", ".gif", ".webp", ".svg", ".pdf", ".zip", ".css", ".js")
 
-def crawl_site(start_url, max_depth=2):
-    visited = set()
-    to_visit = [(start_url, 0)]
-    domain = urlparse(start_url).netloc
-    all_urls = []
 
-    while to_visit:
-        url, depth = to_visit.pop()
-        if url in visited or depth > max_depth:
-            continue
+def canonicalize_url(url: str, keep_params: Iterable[str] = KEEP_QUERY_PARAMS) -> str:
+    """Lowercase scheme/host, drop default ports, fragments and non-content query params."""
+    parts = urlparse(url)
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and not (scheme, parts.port) in (("http", 80), ("https", 443)):
+        host = f"{host}:{parts.port}"
+    query = urlencode(sorted((k, v) for k, v in parse_qsl(parts.query) if k in keep_params))
+    return urlunparse((scheme, host, parts.path or "/", "", query, ""))
+
+
+@dataclass
+class CrawlResult:
+    url: str
+    depth: int
+    status: int
+    html: Optional[str] = None
+    headers: Dict[str, str] = field(default_factory=dict)
+    not_modified: bool = False
+    fetched_at: float = field(default_factory=time.time)
+
+
+class AsyncCrawler:
+    """
+    Breadth-first crawler over one pooled keep-alive HTTP client. URLs are
+    canonicalised and de-duplicated on enqueue, each host gets a concurrency
+    cap and a minimum delay between requests, and pages with a known
+    ETag/Last-Modified are revalidated with conditional GETs.
+    """
+
+    def __init__(
+        self,
+        max_depth: int = 2,
+        workers: int = 16,
+        per_host_concurrency: int = 4,
+        per_host_delay: float = 0.05,
+        timeout: float = 10.0,
+        max_pages: Optional[int] = None,
+        validator_path: Optional[str] = None,
+    ):
+        self.max_depth = max_depth
+        self.workers = workers
+        self.per_host_concurrency = per_host_concurrency
+        self.per_host_delay = per_host_delay
+        self.timeout = timeout
+        self.max_pages = max_pages
+        self.validator_path = validator_path
+        # url -> {"etag", "last_modified", "links"}; links let a 304 keep expanding the frontier.
+        self.validators: Dict[str, dict] = {}
+        if validator_path and os.path.exists(validator_path):
+            with open(validator_path, encoding="utf-8") as f:
+                self.validators = json.load(f)
+        self._host_slots: Dict[str, asyncio.Semaphore] = defaultdict(
+            lambda: asyncio.Semaphore(self.per_host_concurrency)
+        )
+        self._host_next: Dict[str, float] = defaultdict(float)
+
+    def save_validators(self):
+        if not self.validator_path:
+            return
+        tmp_path = self.validator_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.validators, f)
+        os.replace(tmp_path, self.validator_path)
+
+    async def _polite(self, host: str):
+        # Reserve the next send slot for this host before sleeping, so
+        # concurrent workers space their requests out instead of bunching.
+        now = time.monotonic()
+        start = max(now, self._host_next[host])
+        self._host_next[host] = start + self.per_host_delay
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    async def _fetch(self, client: httpx.AsyncClient, url: str, depth: int) -> Tuple[CrawlResult, List[str]]:
+        host = urlparse(url).netloc
+        cached = self.validators.get(url, {})
+        headers = {}
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
 
-        try:
-            response = requests.get(url, timeout=5)
-            visited.add(url)
-            all_urls.append(url)
+        async with self._host_slots[host]:
+            await self._polite(host)
+            response = await client.get(url, headers=headers)
 
-            soup = BeautifulSoup(response.text, 'html.parser')
-            for link in soup.find_all('a', href=True):
-                href = urljoin(url, link['href'])
-                if urlparse(href).netloc == domain:
-                    to_visit.append((href, depth + 1))
+        result = CrawlResult(
+            url=url, depth=depth, status=response.status_code, headers=dict(response.headers)
+        )
+        if response.status_code == 304:
+            result.not_modified = True
+            return result, cached.get("links", [])
+        if response.status_code != 200 or "html" not in response.headers.get("content-type", "html"):
+            return result, []
 
-        except requests.RequestException:
-            continue
+        result.html = response.text
+        soup = BeautifulSoup(result.html, "html.parser")
+        # Relative links resolve against where a redirect actually landed.
+        base = str(response.url)
+        links = []
+        for a in soup.find_all("a", href=True):
+            try:
+                links.append(urljoin(base, a["href"]))
+            except ValueError:
+                log_debug("Crawler: Skipping malformed link %r on %s", a["href"], url)
+        self.validators[url] = {
+            "etag": response.headers.get("etag"),
+            "last_modified": response.headers.get("last-modified"),
+            "links": links,
+        }
+        return result, links
+
+    async def crawl(self, start_url: str) -> AsyncIterator[CrawlResult]:
+        """Yield pages as they are fetched, breadth-first from `start_url`."""
+        start_url = canonicalize_url(start_url)
+        domain = urlparse(start_url).netloc
+        frontier: asyncio.Queue = asyncio.Queue()
+        results: asyncio.Queue = asyncio.Queue()
+        seen = {start_url}
+        frontier.put_nowait((start_url, 0))
+
+        def enqueue(links: List[str], depth: int):
+            if depth > self.max_depth:
+                return
+            for link in links:
+                try:
+                    link = canonicalize_url(link)
+                except ValueError:
+                    # A bad port or IPv6 literal ("http://host:abc/", "http://[broken").
+                    log_debug("Crawler: Skipping malformed link %r", link)
+                    continue
+                if (
+                    link in seen
+                    or urlparse(link).netloc != domain
+                    or link.lower().endswith(SKIP_EXTENSIONS)
+                    or (self.max_pages is not None and len(seen) >= self.max_pages)
+                ):
+                    continue
+                seen.add(link)
+                frontier.put_nowait((link, depth))
+
+        async def worker(client: httpx.AsyncClient):
+            while True:
+                url, depth = await frontier.get()
+                try:
+                    result, links = await self._fetch(client, url, depth)
+                    log_debug("Crawler: %s %d (depth %d)", url, result.status, depth)
+                    enqueue(links, depth + 1)
+                    await results.put(result)
+                except httpx.HTTPError as e:
+                    log_warning(f"Crawler: Failed to fetch {url} - {e!r}", sample="crawler.fetch")
+                except Exception as e:
+                    # A dead worker would leave its task undone and frontier.join() waiting forever.
+                    log_error(f"Crawler: Failed to process {url} - {e!r}")
+                finally:
+                    frontier.task_done()
+
+        limits = httpx.Limits(
+            max_connections=self.workers, max_keepalive_connections=self.workers
+        )
+        async with httpx.AsyncClient(
+            timeout=self.timeout, limits=limits, follow_redirects=True
+        ) as client:
+            tasks = [asyncio.create_task(worker(client)) for _ in range(self.workers)]
+            done = asyncio.create_task(frontier.join())
+            try:
+                while True:
+                    getter = asyncio.create_task(results.get())
+                    finished, _ = await asyncio.wait(
+                        {getter, done}, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    if getter in finished:
+                        yield getter.result()
+                        continue
+                    getter.cancel()
+                    while not results.empty():
+                        yield results.get_nowait()
+                    break
+            finally:
+                done.cancel()
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                self.save_validators()
+
+
+async def crawl_site_async(start_url: str, max_depth: int = 2, **kwargs) -> List[str]:
+    crawler = AsyncCrawler(max_depth=max_depth, **kwargs)
+    return sorted({result.url async for result in crawler.crawl(start_url) if result.status in (200, 304)})
+
+
+def crawl_site(start_url, max_depth=2):
+    return asyncio.run(crawl_site_async(start_url, max_depth=max_depth))
 
-    return sorted(set(all_urls))
 
 if __name__ == "__main__":
+    started = time.monotonic()
     site_urls = crawl_site("https://medom-nekretnine.com/stan/", max_depth=1)
     log_success(
-        f"Successfully crawled {len(site_urls)} URLs from site"
+        f"Successfully crawled {len(site_urls)} URLs from site in {time.monotonic() - started:.1f}s"
     )
     for url in site_urls:
-        print(url)
\ No newline at end of file
+        print(url)
@@ -0,0 +1,127 @@
+"""
+Deterministic, offline stand-ins for Tavily, OpenAI and Pinecone. Each one
+can inject a fixed latency per call so benchmarks model network cost
+without touching the network.
+"""
+
+import asyncio
+import copy
+import hashlib
+import json
+import re
+import time
+from typing import Any, Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from backend.lexical import tokenize
+from backend.vectorstores import LocalVectorStore
+
+FAKE_ANSWER = (
+    "1. Građevinsko zemljište, Podstrana, 410.000 €, https://medom-nekretnine.com/zemljiste/\n"
+    "2. Građevinsko zemljište, Trogir, 320.000 €, https://medom-nekretnine.com/zemljiste/"
+)
+
+
+def load_crawl_fixture(path: str, scale: int = 1) -> Dict[str, Any]:
+    """
+    Load a recorded TavilyCrawl response. `scale` > 1 replicates every page
+    under a new URL with shifted prices so the corpus grows without
+    producing byte-identical pages.
+    """
+    with open(path, encoding="utf-8") as f:
+        fixture = json.load(f)
+    results = []
+    for copy_num in range(scale):
+        for page in fixture["results"]:
+            page = copy.deepcopy(page)
+            if copy_num:
+                page["url"] = page["url"].rstrip("/") + f"-{copy_num}/"
+                page["raw_content"] = re.sub(
+                    r"(Cijena: )(\d+)",
+                    lambda m: f"{m.group(1)}{int(m.group(2)) + copy_num}",
+                    page["raw_content"],
+                )
+            results.append(page)
+    return {**fixture, "results": results}
+
+
+class FakeEmbeddings(Embeddings):
+    """Hashed bag-of-stems vectors: similar texts get similar vectors."""
+
+    def __init__(self, dim: int = 256, latency: float = 0.0):
+        self.dim = dim
+        self.latency = latency
+        self.calls = 0
+
+    def _vector(self, text: str) -> List[float]:
+        vector = [0.0] * self.dim
+        for token in tokenize(text):
+            bucket = int.from_bytes(hashlib.blake2b(token.encode(), digest_size=4).digest(), "little")
+            vector[bucket % self.dim] += 1.0
+        norm = sum(v * v for v in vector) ** 0.5 or 1.0
+        return [v / norm for v in vector]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        time.sleep(self.latency)
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return [self._vector(t) for t in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+
+class FakeChat(FakeListChatModel):
+    """Canned chat completions with a fixed per-call latency."""
+
+    responses: List[str] = [FAKE_ANSWER]
+    latency: float = 0.0
+
+    def _call(self, *args, **kwargs) -> str:
+        time.sleep(self.latency)
+        return super()._call(*args, **kwargs)
+
+
+class FakeVectorStore(LocalVectorStore):
+    """LocalVectorStore plus a per-request latency, standing in for Pinecone."""
+
+    def __init__(self, embedding: Embeddings, latency: float = 0.0):
+        super().__init__(embedding)
+        self.latency = latency
+
+    def similarity_search_with_score_by_vector(self, embedding, k: int = 4, **kwargs):
+        time.sleep(self.latency)
+        return super().similarity_search_with_score_by_vector(embedding, k, **kwargs)
+
+    async def aadd_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        return await super().aadd_texts(texts, metadatas=metadatas, ids=ids, **kwargs)
+
+    async def adelete(self, ids: Optional[List[str]] = None, **kwargs):
+        await asyncio.sleep(self.latency)
+        return self.delete(ids)
+
+
+class FakeTavilyCrawl:
+    """Replays a recorded crawl response."""
+
+    def __init__(self, response: Dict[str, Any], latency: float = 0.0):
+        self.response = response
+        self.latency = latency
+
+    def invoke(self, input: Dict[str, Any], **kwargs) -> Dict[str, Any]:
+        time.sleep(self.latency)
+        return copy.deepcopy(self.response)
+
+    async def ainvoke(self, input: Dict[str, Any], **kwargs) -> Dict[str, Any]:
+        await asyncio.sleep(self.latency)
+        return copy.deepcopy(self.response)
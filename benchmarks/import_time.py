@@ -0,0 +1,106 @@
+"""
+Import-time budget for the Streamlit entry point.
+
+Runs `python -X importtime -c "import backend.core"` in a fresh interpreter,
+reports the slowest modules and fails when the cumulative import time goes
+over budget or when a module that should only load on first query (LangChain
+chains, OpenAI/Pinecone clients, ...) is imported eagerly:
+
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --budget-ms 400 --runs 5
+"""
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Optional, Tuple
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_MODULE = "backend.core"
+DEFAULT_BUDGET_MS = float(os.getenv("MEDOM_IMPORT_BUDGET_MS", "500"))
+
+# Heavy packages that must stay behind ChainRegistry._build.
+DEFERRED_MODULES = (
+    "langchain.chains",
+    "langchain_openai",
+    "langchain_pinecone",
+    "langchain_chroma",
+    "langchain_community",
+    "langdetect",
+    "openai",
+    "pinecone",
+    "tiktoken",
+)
+
+_LINE_RE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def measure(module: str) -> Tuple[Dict[str, int], Dict[str, int]]:
+    """One cold import; returns (self_us, cumulative_us) per imported module."""
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise SystemExit(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    self_us: Dict[str, int] = {}
+    cumulative_us: Dict[str, int] = {}
+    for line in proc.stderr.splitlines():
+        match = _LINE_RE.match(line)
+        if match:
+            name = match.group(4)
+            self_us[name] = int(match.group(1))
+            cumulative_us[name] = int(match.group(2))
+    return self_us, cumulative_us
+
+
+def eager_deferred(modules: List[str]) -> List[str]:
+    return sorted(
+        name
+        for name in modules
+        if any(name == deferred or name.startswith(deferred + ".") for deferred in DEFERRED_MODULES)
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--module", default=DEFAULT_MODULE)
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--runs", type=int, default=3, help="report the median of N cold imports")
+    parser.add_argument("--top", type=int, default=15, help="show the N slowest modules")
+    args = parser.parse_args(argv)
+
+    totals = []
+    self_us: Dict[str, int] = {}
+    cumulative_us: Dict[str, int] = {}
+    for _ in range(args.runs):
+        self_us, cumulative_us = measure(args.module)
+        totals.append(cumulative_us.get(args.module, 0) / 1000)
+    total_ms = statistics.median(totals)
+
+    print(f"{'module':<50}{'self ms':>10}{'cumul ms':>10}")
+    for name, us in sorted(self_us.items(), key=lambda item: item[1], reverse=True)[: args.top]:
+        print(f"{name:<50}{us / 1000:>10.1f}{cumulative_us[name] / 1000:>10.1f}")
+    print(f"\nimport {args.module}: {total_ms:.1f} ms (median of {args.runs}), budget {args.budget_ms:.0f} ms")
+
+    failed = False
+    eager = eager_deferred(list(cumulative_us))
+    if eager:
+        print("Imported eagerly but should load on first query:", ", ".join(eager))
+        failed = True
+    if total_ms > args.budget_ms:
+        print("Import time over budget")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
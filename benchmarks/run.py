@@ -0,0 +1,282 @@
+"""
+Offline benchmarks for the ingestion and query pipelines.
+
+Runs against a recorded crawl fixture and the deterministic stand-ins in
+benchmarks/fakes.py, so no API key or network is needed. Every stage reports
+throughput and p50/p95/p99 latency; results are written as JSON and can be
+compared with a previous run:
+
+    python -m benchmarks.run --out bench.json
+    python -m benchmarks.run --baseline bench.json --latency embed=50,chat=400,store=30
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_FIXTURE = os.path.join(REPO_ROOT, "benchmarks", "fixtures", "crawl_zemljiste.json")
+
+OPEN_QUERIES = [
+    "Građevinsko zemljište s pogledom na more u blizini Splita",
+    "Ima li zemljišta s pristupom asfaltiranom cestom?",
+    "poljoprivredno zemljište Sinj",
+    "k.č. 1203/2 Podstrana",
+]
+CATALOG_QUERIES = [
+    "Trebao bih 5 najskupljih građevinskih zemljišta, sve opcije",
+    "najjeftinije zemljište po m2",
+    "zemljište do 100.000 €",
+]
+# Injected per-call latency in milliseconds for each stand-in.
+DEFAULT_LATENCY_MS = {"crawl": 0, "embed": 0, "chat": 0, "store": 0}
+
+
+def percentile(samples: List[float], q: float) -> float:
+    """Linear-interpolated percentile, q in [0, 100]."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    pos = (len(ordered) - 1) * q / 100
+    lower = int(pos)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (pos - lower)
+
+
+class StageTimer:
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.items: Dict[str, int] = defaultdict(int)
+
+    @contextlib.contextmanager
+    def measure(self, stage: str, items: int = 1):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.samples[stage].append(time.perf_counter() - started)
+            self.items[stage] += items
+
+    def summary(self) -> Dict[str, dict]:
+        report = {}
+        for stage, samples in self.samples.items():
+            total = sum(samples)
+            report[stage] = {
+                "calls": len(samples),
+                "items": self.items[stage],
+                "total_s": round(total, 6),
+                "throughput_per_s": round(self.items[stage] / total, 3) if total else None,
+                "p50_ms": round(percentile(samples, 50) * 1000, 3),
+                "p95_ms": round(percentile(samples, 95) * 1000, 3),
+                "p99_ms": round(percentile(samples, 99) * 1000, 3),
+            }
+        return report
+
+
+def _offline_environment(workdir: str):
+    """Dummy credentials, the local vector backend and a scratch working directory."""
+    for var in ("OPENAI_API_KEY", "TAVILY_API_KEY", "PINECONE_API_KEY"):
+        os.environ.setdefault(var, "offline-benchmark")
+    os.environ["MEDOM_VECTOR_BACKEND"] = "local"
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+    # Every artifact path in the pipeline is relative to the working directory.
+    os.chdir(workdir)
+
+
+def bench_transforms(timer: StageTimer, ingestion, pages: List[dict], iterations: int):
+    from langchain_core.documents import Document
+
+    docs = []
+    for _ in range(iterations):
+        docs = []
+        for page in pages:
+            with timer.measure("extract_lokacija_section"):
+                extracted = ingestion.extract_lokacija_section(page["raw_content"])
+            if extracted:
+                docs.append(Document(page_content=extracted, metadata={"source": page["url"]}))
+        for doc in docs:
+            with timer.measure("text_splitter.split_documents"):
+                ingestion.text_splitter.split_documents([doc])
+    # Whole-corpus throughput on the process pool (MEDOM_TRANSFORM_WORKERS).
+    from transforms import parallel_map, split_documents
+
+    for _ in range(iterations):
+        with timer.measure("transforms.parallel_map(extract)", items=len(pages)):
+            parallel_map(ingestion.extract_lokacija_section, [page["raw_content"] for page in pages])
+        with timer.measure("transforms.split_documents", items=len(docs)):
+            split_documents(ingestion.text_splitter, docs)
+    return docs
+
+
+def bench_ingestion(timer: StageTimer, ingestion, fixture: dict, latency: Dict[str, float]):
+    from backend.embeddings import CachedEmbeddings
+    from benchmarks.fakes import FakeEmbeddings, FakeTavilyCrawl, FakeVectorStore
+
+    fake_embeddings = FakeEmbeddings(latency=latency["embed"])
+    ingestion.embeddings = CachedEmbeddings(fake_embeddings, model="fake", path="bench_embeddings.sqlite3")
+    ingestion.vectorstore = FakeVectorStore(ingestion.embeddings, latency=latency["store"])
+    ingestion.tavily_crawl = FakeTavilyCrawl(fixture, latency=latency["crawl"])
+
+    pages = len(fixture["results"])
+    with timer.measure("ingestion.main (cold)", items=pages):
+        asyncio.run(ingestion.main(full=True))
+    with timer.measure("ingestion.main (unchanged site)", items=pages):
+        asyncio.run(ingestion.main())
+    # Same pipeline from the crawl snapshot the runs above recorded.
+    with timer.measure("ingestion.main (replay)", items=pages):
+        asyncio.run(ingestion.main(replay="latest"))
+    with timer.measure("ingestion.main_stream (replay)", items=pages):
+        asyncio.run(ingestion.main_stream(full=True, replay="latest"))
+    return fake_embeddings, ingestion.vectorstore
+
+
+def bench_indexing(timer: StageTimer, ingestion, docs, latency: Dict[str, float]):
+    from benchmarks.fakes import FakeEmbeddings, FakeVectorStore
+    from indexing import index_documents_async
+
+    embeddings = FakeEmbeddings(latency=latency["embed"])
+    store = FakeVectorStore(embeddings, latency=latency["store"])
+    chunks = ingestion.text_splitter.split_documents(docs)
+    with timer.measure("index_documents_async", items=len(chunks)):
+        asyncio.run(index_documents_async(store, chunks, embeddings=embeddings))
+
+
+def bench_queries(timer: StageTimer, embeddings, vectorstore, latency: Dict[str, float], iterations: int):
+    from backend import core
+    from backend.cache import SemanticCache
+    from benchmarks.fakes import FakeChat
+
+    core.registry = core.ChainRegistry(
+        embeddings=embeddings, vectorstore=vectorstore, chat=FakeChat(latency=latency["chat"])
+    )
+    with timer.measure("chain warm-up"):
+        core.warm_up()
+
+    core.answer_cache = SemanticCache(max_entries=0)
+    for _ in range(iterations):
+        for query in OPEN_QUERIES:
+            with timer.measure("run_llm (rag)"):
+                core.run_llm(query)
+        for query in CATALOG_QUERIES:
+            with timer.measure("run_llm (catalog fast path)"):
+                core.run_llm(query)
+
+    core.answer_cache = SemanticCache()
+    for query in OPEN_QUERIES:
+        core.run_llm(query)
+    for _ in range(iterations):
+        for query in OPEN_QUERIES:
+            with timer.measure("run_llm (answer cache)"):
+                core.run_llm(query)
+
+
+def compare(current: Dict[str, dict], baseline: Dict[str, dict], threshold: float) -> List[str]:
+    """Print a per-stage p50 comparison and return the stages that regressed."""
+    regressions = []
+    print(f"\n{'stage':<36}{'base p50':>12}{'p50':>12}{'delta':>10}")
+    for stage, stats in current.items():
+        base = baseline.get(stage)
+        if not base or not base["p50_ms"]:
+            print(f"{stage:<36}{'-':>12}{stats['p50_ms']:>12.3f}{'new':>10}")
+            continue
+        delta = (stats["p50_ms"] - base["p50_ms"]) / base["p50_ms"]
+        flag = ""
+        if delta > threshold:
+            regressions.append(stage)
+            flag = "  REGRESSION"
+        print(f"{stage:<36}{base['p50_ms']:>12.3f}{stats['p50_ms']:>12.3f}{delta:>+10.1%}{flag}")
+    return regressions
+
+
+def parse_latency(spec: Optional[str]) -> Dict[str, float]:
+    latency_ms = dict(DEFAULT_LATENCY_MS)
+    for item in filter(None, (spec or "").split(",")):
+        name, _, value = item.partition("=")
+        if name not in latency_ms:
+            raise SystemExit(f"Unknown latency target {name!r}, expected {sorted(latency_ms)}")
+        latency_ms[name] = float(value)
+    return {name: ms / 1000 for name, ms in latency_ms.items()}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--fixture", default=DEFAULT_FIXTURE, help="recorded TavilyCrawl response")
+    parser.add_argument("--scale", type=int, default=1, help="replicate fixture pages N times")
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--latency", help="injected latency in ms, e.g. embed=50,chat=400,store=30,crawl=1000")
+    parser.add_argument("--out", help="write results JSON here")
+    parser.add_argument("--baseline", help="results JSON from an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="p50 slowdown counted as regression")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args(argv)
+
+    latency = parse_latency(args.latency)
+    fixture_path = os.path.abspath(args.fixture)
+    out_path = os.path.abspath(args.out) if args.out else None
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+
+    with tempfile.TemporaryDirectory(prefix="medom-bench-") as workdir:
+        cwd = os.getcwd()
+        _offline_environment(workdir)
+        try:
+            from benchmarks.fakes import load_crawl_fixture
+            from logger import set_level
+            import ingestion
+
+            # Pipeline progress lines would drown the report.
+            set_level("WARNING")
+
+            fixture = load_crawl_fixture(fixture_path, scale=args.scale)
+            timer = StageTimer()
+            docs = bench_transforms(timer, ingestion, fixture["results"], args.iterations)
+            embeddings, vectorstore = bench_ingestion(timer, ingestion, fixture, latency)
+            bench_indexing(timer, ingestion, docs, latency)
+            bench_queries(timer, embeddings, vectorstore, latency, args.iterations)
+        finally:
+            os.chdir(cwd)
+
+    results = {
+        "meta": {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "fixture": os.path.relpath(fixture_path, REPO_ROOT),
+            "pages": len(fixture["results"]),
+            "scale": args.scale,
+            "iterations": args.iterations,
+            "latency_ms": {name: s * 1000 for name, s in latency.items()},
+        },
+        "stages": timer.summary(),
+    }
+
+    print(f"\n{'stage':<36}{'items/s':>12}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for stage, stats in results["stages"].items():
+        print(
+            f"{stage:<36}{stats['throughput_per_s'] or 0:>12.1f}"
+            f"{stats['p50_ms']:>10.3f}{stats['p95_ms']:>10.3f}{stats['p99_ms']:>10.3f}"
+        )
+
+    if out_path:
+        with open(out_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if baseline_path:
+        with open(baseline_path, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results["stages"], baseline["stages"], args.threshold)
+        if regressions and args.fail_on_regression:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""
+Listing-aware chunking sized in model tokens. Text is cut at listing
+boundaries first, then field/paragraph, line, sentence and word boundaries,
+only as far down as needed to fit `max_tokens`. Whole small listings are
+packed together; overlap is added only between chunks of a listing that
+had to be split.
+"""
+
+import os
+import re
+from dataclasses import dataclass
+from typing import Iterable, List, Tuple
+
+from langchain_core.documents import Document
+
+from backend.text import count_tokens
+
+CHUNK_TOKENS = int(os.getenv("MEDOM_CHUNK_TOKENS", "512"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("MEDOM_CHUNK_OVERLAP_TOKENS", "64"))
+
+# A listing starts at its "Lokacija:" line (see transforms.extract_lokacija_section).
+_LISTING_RE = re.compile(r"(?m)^(?=Lokacija:)")
+# Finer boundaries, tried in order: field/paragraph, line, sentence, word.
+_BOUNDARIES = [
+    re.compile(r"\n[ \t]*\n\s*"),
+    re.compile(r"\n\s*"),
+    re.compile(r"(?<=[.!?;])\s+"),
+    re.compile(r"\s+"),
+]
+
+
+@dataclass
+class _Unit:
+    start: int
+    end: int
+    tokens: int
+    listing: int
+
+
+def _pieces(text: str, start: int, end: int, pattern: re.Pattern) -> List[Tuple[int, int]]:
+    """Non-empty spans of text[start:end] between matches of `pattern`, whitespace-trimmed."""
+    spans = []
+    cursor = start
+    for match in pattern.finditer(text, start, end):
+        spans.append((cursor, match.start()))
+        cursor = match.end()
+    spans.append((cursor, end))
+    trimmed = []
+    for s, e in spans:
+        while s < e and text[s].isspace():
+            s += 1
+        while e > s and text[e - 1].isspace():
+            e -= 1
+        if s < e:
+            trimmed.append((s, e))
+    return trimmed
+
+
+class ListingChunker:
+    """
+    Drop-in for the LangChain text splitters used by ingestion
+    (split_text/split_documents). Chunks are contiguous slices of the input
+    and carry `start_index`, so query-time packing can trim the overlap.
+    """
+
+    def __init__(self, max_tokens: int = CHUNK_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS):
+        if overlap_tokens >= max_tokens:
+            raise ValueError("overlap_tokens must be smaller than max_tokens")
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+
+    def _units(self, text: str, start: int, end: int, level: int, listing: int) -> List[_Unit]:
+        tokens = count_tokens(text[start:end])
+        if tokens <= self.max_tokens or level == len(_BOUNDARIES):
+            # A single word over the limit is kept whole.
+            return [_Unit(start, end, tokens, listing)]
+        pieces = _pieces(text, start, end, _BOUNDARIES[level])
+        if len(pieces) == 1:
+            return self._units(text, start, end, level + 1, listing)
+        units = []
+        for s, e in pieces:
+            units.extend(self._units(text, s, e, level + 1, listing))
+        return units
+
+    def _spans(self, text: str) -> List[Tuple[int, int]]:
+        units: List[_Unit] = []
+        listing_ends: List[int] = []
+        for listing, (start, end) in enumerate(_pieces(text, 0, len(text), _LISTING_RE)):
+            units.extend(self._units(text, start, end, 0, listing))
+            listing_ends.append(end)
+
+        def tokens(first: _Unit, end: int) -> int:
+            # The slice as it will be emitted, separators between units included.
+            return count_tokens(text[first.start : end])
+
+        chunks = []
+        current: List[_Unit] = []
+        for unit in units:
+            starts_listing = not current or current[-1].listing != unit.listing
+            if current and starts_listing and tokens(current[0], listing_ends[unit.listing]) > self.max_tokens:
+                # Start a listing that doesn't fit in the rest of this chunk on a fresh one.
+                chunks.append((current[0].start, current[-1].end))
+                current = []
+            elif current and tokens(current[0], unit.end) > self.max_tokens:
+                chunks.append((current[0].start, current[-1].end))
+                tail: List[_Unit] = []
+                if current[-1].listing == unit.listing:
+                    # The listing continues in the next chunk: carry its last
+                    # fields/sentences over so the chunk reads on its own.
+                    for previous in reversed(current):
+                        if previous.listing != unit.listing or tokens(previous, current[-1].end) > self.overlap_tokens:
+                            break
+                        tail.insert(0, previous)
+                    while tail and tokens(tail[0], unit.end) > self.max_tokens:
+                        tail.pop(0)
+                current = tail
+            current.append(unit)
+        if current:
+            chunks.append((current[0].start, current[-1].end))
+        return chunks
+
+    def split_text(self, text: str) -> List[str]:
+        return [text[start:end] for start, end in self._spans(text)]
+
+    def split_documents(self, documents: Iterable[Document]) -> List[Document]:
+        chunks = []
+        for doc in documents:
+            for start, end in self._spans(doc.page_content):
+                chunks.append(
+                    Document(
+                        page_content=doc.page_content[start:end],
+                        metadata={**doc.metadata, "start_index": start},
+                    )
+                )
+        return chunks
@@ -0,0 +1,224 @@
+"""
+Duplicate listing detection for ingestion. The same property often appears
+under several URLs (pagination, category pages, re-posted ads); only one
+copy should be split, embedded and upserted.
+"""
+
+import hashlib
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from backend.catalog import parse_listing
+from backend.text import normalize
+from backend.tracing import metrics
+from logger import log_info
+
+# Largest SimHash Hamming distance (of 64 bits) still treated as the same text.
+SIMHASH_MAX_DISTANCE = int(os.getenv("MEDOM_DEDUP_MAX_DISTANCE", "3"))
+_SHINGLE = 3
+_BITS = 64
+_MASK = (1 << _BITS) - 1
+_WORD_RE = re.compile(r"\w+")
+_PAGINATION_RE = re.compile(r"/page/\d+|[?&](?:page|paged|p)=\d+")
+
+
+@dataclass(frozen=True)
+class Fingerprint:
+    exact: str
+    simhash: int
+    # Price and area as parsed for the catalog: near-identical ad templates
+    # for different properties differ only here and must never merge.
+    key: Tuple[Optional[float], Optional[float]]
+
+
+def _hash64(feature: str) -> int:
+    return int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def simhash(tokens: List[str]) -> int:
+    """64-bit SimHash over word 3-shingles (single words for very short texts)."""
+    if len(tokens) >= _SHINGLE:
+        features = [" ".join(tokens[i : i + _SHINGLE]) for i in range(len(tokens) - _SHINGLE + 1)]
+    else:
+        features = tokens
+    weights = [0] * _BITS
+    for feature in features:
+        h = _hash64(feature)
+        for bit in range(_BITS):
+            weights[bit] += 1 if h >> bit & 1 else -1
+    return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+
+def fingerprint(text: str, url: str, listing_text: Optional[str] = None) -> Fingerprint:
+    """
+    Fingerprint of a page's `text`. The (price, area) key is parsed from
+    `listing_text` when given, so a whole page keys on its listing section
+    rather than on prices in sidebars and footers.
+    """
+    normalized = normalize(text)
+    listing = parse_listing(text if listing_text is None else listing_text, url)
+    return Fingerprint(
+        exact=hashlib.sha1(normalized.encode("utf-8")).hexdigest(),
+        simhash=simhash(_WORD_RE.findall(normalized)),
+        key=(listing.price_eur, listing.area_m2),
+    )
+
+
+def canonical_key(url: str) -> tuple:
+    """Sort key: the smallest is the URL to keep (no query, not paginated, https, shortest path)."""
+    parts = urlsplit(url)
+    return (
+        bool(parts.query),
+        bool(_PAGINATION_RE.search(url)),
+        parts.scheme != "https",
+        parts.path.rstrip("/").count("/"),
+        len(url),
+        url,
+    )
+
+
+@dataclass
+class DedupStats:
+    pages: int = 0
+    exact_duplicates: int = 0
+    near_duplicates: int = 0
+    # Dropped URL -> the URL kept in its place.
+    duplicate_of: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def kept(self) -> int:
+        return self.pages - self.exact_duplicates - self.near_duplicates
+
+    def log(self):
+        log_info(
+            f"🧬 Deduplication: kept {self.kept} of {self.pages} pages "
+            f"({self.exact_duplicates} exact, {self.near_duplicates} near duplicates dropped)"
+        )
+
+
+class Deduplicator:
+    """
+    Duplicate check: exact duplicates by hash of the normalised text, near
+    duplicates by SimHash within `max_distance` bits. The SimHash is cut
+    into max_distance + 1 bands, so any two fingerprints that close share
+    at least one band and only those are compared. `check` keeps the first
+    copy seen; `offer` keeps the most canonical one (see canonical_key).
+    """
+
+    def __init__(self, max_distance: int = SIMHASH_MAX_DISTANCE):
+        self.max_distance = max_distance
+        self.bands = max_distance + 1
+        self.band_bits = _BITS // self.bands
+        self.stats = DedupStats()
+        self._exact: Dict[str, str] = {}
+        self._buckets: Dict[Tuple[int, int], List[Tuple[int, tuple, str]]] = {}
+        self._kept: Dict[str, Fingerprint] = {}
+
+    def _band_keys(self, value: int):
+        band_mask = (1 << self.band_bits) - 1
+        return [(band, value >> (band * self.band_bits) & band_mask) for band in range(self.bands)]
+
+    def _find(self, fp: Fingerprint) -> Tuple[Optional[str], Optional[str]]:
+        """(kept URL `fp` duplicates, "exact" or "near"), or (None, None)."""
+        original = self._exact.get(fp.exact)
+        if original is not None:
+            return original, "exact"
+        # Without both price and area nothing tells two near-identical ad
+        # templates for different properties apart.
+        if None in fp.key:
+            return None, None
+        for band_key in self._band_keys(fp.simhash):
+            for other_hash, other_key, other_url in self._buckets.get(band_key, ()):
+                if other_key == fp.key and bin((other_hash ^ fp.simhash) & _MASK).count("1") <= self.max_distance:
+                    return other_url, "near"
+        return None, None
+
+    def _drop(self, url: str, original: str, kind: str):
+        if kind == "exact":
+            self.stats.exact_duplicates += 1
+        else:
+            self.stats.near_duplicates += 1
+        metrics.inc("medom_dedup_dropped_total", kind=kind)
+        self.stats.duplicate_of[url] = original
+
+    def _register(self, url: str, fp: Fingerprint):
+        self._kept[url] = fp
+        self._exact[fp.exact] = url
+        for band_key in self._band_keys(fp.simhash):
+            self._buckets.setdefault(band_key, []).append((fp.simhash, fp.key, url))
+
+    def _unregister(self, url: str):
+        fp = self._kept.pop(url)
+        if self._exact.get(fp.exact) == url:
+            del self._exact[fp.exact]
+        for band_key in self._band_keys(fp.simhash):
+            self._buckets[band_key] = [entry for entry in self._buckets[band_key] if entry[2] != url]
+
+    def check(self, url: str, fp: Fingerprint) -> Optional[str]:
+        """The kept URL `url` duplicates, or None after registering `url` as kept."""
+        self.stats.pages += 1
+        original, kind = self._find(fp)
+        if original is not None:
+            self._drop(url, original, kind)
+            return original
+        self._register(url, fp)
+        metrics.inc("medom_dedup_kept_total")
+        return None
+
+    def offer(self, url: str, fp: Fingerprint) -> Tuple[bool, Optional[str]]:
+        """
+        (keep `url`, previously kept URL it replaces). A duplicate with a
+        more canonical URL than the kept copy takes its place, so the kept
+        URL doesn't depend on the order pages arrive in; the caller
+        tombstones the replaced one.
+        """
+        self.stats.pages += 1
+        original, kind = self._find(fp)
+        if original is None:
+            self._register(url, fp)
+            metrics.inc("medom_dedup_kept_total")
+            return True, None
+        if canonical_key(url) >= canonical_key(original):
+            self._drop(url, original, kind)
+            return False, None
+        self._unregister(original)
+        self._register(url, fp)
+        self._drop(original, url, kind)
+        for duplicate, kept in self.stats.duplicate_of.items():
+            if kept == original:
+                self.stats.duplicate_of[duplicate] = url
+        return True, original
+
+
+def deduplicate(
+    items: List[Dict[str, Any]],
+    text_key: str = "raw_content",
+    max_distance: int = SIMHASH_MAX_DISTANCE,
+    listing_key: Optional[str] = None,
+) -> Tuple[List[Dict[str, Any]], DedupStats]:
+    """
+    Drop exact and near-duplicate pages (dicts with "url" and `text_key`),
+    keeping the most canonical URL of each group. Also drops repeated
+    URLs. Kept items stay in their original order. With `listing_key`,
+    near-duplicate keys are parsed from that field instead of `text_key`.
+    """
+    unique: Dict[str, Dict[str, Any]] = {}
+    for item in items:
+        unique.setdefault(item["url"], item)
+    deduplicator = Deduplicator(max_distance)
+    deduplicator.stats.exact_duplicates = len(items) - len(unique)
+    deduplicator.stats.pages = len(items) - len(unique)
+    if len(items) > len(unique):
+        metrics.inc("medom_dedup_dropped_total", len(items) - len(unique), kind="exact")
+    # Offer the canonical URLs first so they are the ones kept.
+    dropped = set()
+    for url in sorted(unique, key=canonical_key):
+        item = unique[url]
+        fp = fingerprint(item[text_key], url, item[listing_key] if listing_key else None)
+        if deduplicator.check(url, fp) is not None:
+            dropped.add(url)
+    kept = [item for url, item in unique.items() if url not in dropped]
+    return kept, deduplicator.stats
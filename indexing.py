@@ -0,0 +1,531 @@
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from backend.text import count_tokens
+from backend.tracing import span
+from logger import Colors, log_debug, log_error, log_header, log_info, log_success, log_warning
+
+MANIFEST_PATH = os.getenv("MEDOM_INGEST_MANIFEST_PATH", "ingest_manifest.json")
+# Largest share of a scope's URLs one run may remove. A crawl that comes back
+# much smaller than the last one is more likely capped or broken than a site
+# that lost its listings; 1.0 turns the check off (--force-prune).
+MAX_PRUNE_FRACTION = float(os.getenv("MEDOM_MAX_PRUNE_FRACTION", "0.25"))
+
+
+def chunk_id(url: str, ordinal: int) -> str:
+    """Stable vector ID for the `ordinal`-th chunk of `url`."""
+    return f"{hashlib.sha256(url.encode('utf-8')).hexdigest()[:32]}-{ordinal}"
+
+
+def content_hash(chunks: List[Document]) -> str:
+    digest = hashlib.sha256()
+    for chunk in chunks:
+        digest.update(chunk.page_content.encode("utf-8"))
+        digest.update(json.dumps(chunk.metadata, sort_keys=True, default=str).encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+def annotate_chunks(chunks: List[Document]) -> List[Document]:
+    """
+    Store each chunk's position within its source (`ordinal`) and its token
+    count in the metadata, so context packing at query time needs no tokenizer
+    pass over retrieved chunks.
+    """
+    ordinals: Dict[str, int] = defaultdict(int)
+    for chunk in chunks:
+        source = chunk.metadata.get("source", "")
+        chunk.metadata["ordinal"] = ordinals[source]
+        ordinals[source] += 1
+        chunk.metadata["token_count"] = count_tokens(chunk.page_content)
+    return chunks
+
+
+@dataclass
+class IncrementalPlan:
+    upsert_docs: List[Document] = field(default_factory=list)
+    upsert_ids: List[str] = field(default_factory=list)
+    delete_ids: List[str] = field(default_factory=list)
+    entries: Dict[str, dict] = field(default_factory=dict)
+    changed_urls: List[str] = field(default_factory=list)
+    unchanged_urls: List[str] = field(default_factory=list)
+    removed_urls: List[str] = field(default_factory=list)
+    # Changed URLs with fewer chunks than before, i.e. with trailing chunks in delete_ids.
+    shrunk_urls: List[str] = field(default_factory=list)
+
+
+class IngestManifest:
+    """
+    Per-scope record of what is in the vector store: for every source URL the
+    content hash of its chunks and how many chunks were upserted. A scope is
+    one crawl root, so different ingestion scripts never tombstone each
+    other's URLs.
+    """
+
+    def __init__(self, path: str = MANIFEST_PATH, scopes: Optional[Dict[str, Dict[str, dict]]] = None):
+        self.path = path
+        self.scopes = scopes or {}
+
+    @classmethod
+    def load(cls, path: str = MANIFEST_PATH) -> "IngestManifest":
+        if not os.path.exists(path):
+            return cls(path)
+        with open(path, encoding="utf-8") as f:
+            return cls(path, json.load(f))
+
+    def drop_backend(self, backend: str):
+        """Forget every scope stored in `backend` (after the store itself was emptied)."""
+        self.scopes = {
+            scope: entries for scope, entries in self.scopes.items() if not scope.startswith(f"{backend}:")
+        }
+
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.scopes, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def plan(
+        self,
+        scope: str,
+        chunks: List[Document],
+        full: bool = False,
+        prune: bool = True,
+        skipped_urls: Set[str] = frozenset(),
+        max_prune_fraction: float = MAX_PRUNE_FRACTION,
+    ) -> IncrementalPlan:
+        """
+        Assign deterministic IDs to `chunks` and work out which ones need to
+        be upserted and which stored vectors have become stale. With
+        `prune=False` (a partial batch of a streamed crawl) URLs missing from
+        `chunks` are left alone; see plan_removals.
+        """
+        by_url: Dict[str, List[Document]] = defaultdict(list)
+        for chunk in chunks:
+            by_url[chunk.metadata["source"]].append(chunk)
+
+        previous = self.scopes.get(scope, {})
+        plan = IncrementalPlan()
+        for url, url_chunks in by_url.items():
+            entry = {"hash": content_hash(url_chunks), "chunks": len(url_chunks)}
+            plan.entries[url] = entry
+            old = previous.get(url)
+            if not full and old is not None and old["hash"] == entry["hash"]:
+                plan.unchanged_urls.append(url)
+                continue
+            plan.changed_urls.append(url)
+            for ordinal, chunk in enumerate(url_chunks):
+                plan.upsert_docs.append(chunk)
+                plan.upsert_ids.append(chunk_id(url, ordinal))
+            if old is not None and old["chunks"] > len(url_chunks):
+                # The listing shrank: drop the trailing chunks it no longer has.
+                plan.shrunk_urls.append(url)
+                plan.delete_ids.extend(
+                    chunk_id(url, ordinal) for ordinal in range(len(url_chunks), old["chunks"])
+                )
+
+        if prune:
+            removals = self.plan_removals(scope, set(by_url), skipped_urls, max_prune_fraction)
+            plan.removed_urls = removals.removed_urls
+            plan.delete_ids.extend(removals.delete_ids)
+        return plan
+
+    def plan_removals(
+        self,
+        scope: str,
+        seen_urls: Set[str],
+        skipped_urls: Set[str] = frozenset(),
+        max_fraction: float = MAX_PRUNE_FRACTION,
+    ) -> IncrementalPlan:
+        """
+        Tombstones for the URLs of `scope` that the crawl did not see.
+        `skipped_urls` were found but could not be fetched or extracted, so
+        they are kept. Nothing is removed when more than `max_fraction` of
+        the scope would go.
+        """
+        # An empty crawl is far more likely a failure than a site with no listings.
+        if not seen_urls:
+            return IncrementalPlan()
+        previous = self.scopes.get(scope, {})
+        missing = [url for url in previous if url not in seen_urls and url not in skipped_urls]
+        if len(missing) > max(1, max_fraction * len(previous)):
+            log_warning(
+                f"Incremental Sync: Not removing {len(missing)} of {len(previous)} URLs missing from "
+                f"the crawl of {scope} (limit {max_fraction:.0%}); re-run with --force-prune "
+                f"if they are really gone"
+            )
+            return IncrementalPlan()
+        return self.plan_drop(scope, missing)
+
+    def plan_drop(self, scope: str, urls: List[str]) -> IncrementalPlan:
+        """Tombstones for `urls` of `scope`, e.g. duplicates of a listing kept under another URL."""
+        plan = IncrementalPlan()
+        previous = self.scopes.get(scope, {})
+        for url in urls:
+            if url in previous:
+                plan.removed_urls.append(url)
+                plan.delete_ids.extend(chunk_id(url, o) for o in range(previous[url]["chunks"]))
+        return plan
+
+    def commit(
+        self,
+        scope: str,
+        plan: IncrementalPlan,
+        failed_ids: Set[str] = frozenset(),
+        deleted: bool = True,
+    ):
+        """
+        Record the plan as applied, except for URLs whose upsert failed. With
+        `deleted=False` (the tombstone delete failed) shrunk and removed URLs
+        keep their old entries, so the next run deletes their chunks again.
+        """
+        failed_urls = {
+            doc.metadata["source"]
+            for doc, doc_id in zip(plan.upsert_docs, plan.upsert_ids)
+            if doc_id in failed_ids
+        }
+        if not deleted:
+            failed_urls.update(plan.shrunk_urls)
+        current = self.scopes.setdefault(scope, {})
+        for url, entry in plan.entries.items():
+            if url not in failed_urls:
+                current[url] = entry
+        if deleted:
+            for url in plan.removed_urls:
+                current.pop(url, None)
+
+
+class TokenBucket:
+    """
+    Async token bucket. The refill rate backs off multiplicatively on rate-limit
+    errors and recovers additively on success (AIMD), so it settles near the
+    peak rate the provider actually sustains.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None, min_rate: Optional[float] = None):
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min_rate if min_rate is not None else rate / 32
+        self.capacity = capacity if capacity is not None else rate
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, amount: float = 1.0):
+        # A request larger than the bucket waits for a full bucket and then
+        # leaves it in debt, so the long-run rate still holds.
+        needed = min(amount, self.capacity)
+        async with self._lock:
+            self._refill()
+            while self.tokens < needed:
+                await asyncio.sleep((needed - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= amount
+
+    def penalize(self):
+        self.rate = max(self.min_rate, self.rate / 2)
+
+    def reward(self):
+        self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+
+def _status_code(exc: BaseException) -> Optional[int]:
+    for candidate in (exc, getattr(exc, "response", None)):
+        for attr in ("status_code", "status", "http_status"):
+            value = getattr(candidate, attr, None)
+            if isinstance(value, int):
+                return value
+    return None
+
+
+def is_rate_limited(exc: BaseException) -> bool:
+    return _status_code(exc) == 429 or "rate limit" in str(exc).lower()
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """429s, 5xx and transport errors are worth retrying; other 4xx are not."""
+    status = _status_code(exc)
+    if status is not None:
+        return status == 429 or status >= 500
+    if isinstance(exc, (asyncio.TimeoutError, ConnectionError, TimeoutError)):
+        return True
+    message = str(exc).lower()
+    return any(hint in message for hint in ("rate limit", "timeout", "timed out", "temporarily"))
+
+
+@dataclass
+class SchedulerConfig:
+    concurrency: int = 4
+    embed_batch_size: int = 50
+    upsert_batch_size: int = 100
+    embed_tokens_per_minute: float = 1_000_000
+    store_requests_per_second: float = 20
+    max_retries: int = 6
+    base_delay: float = 1.0
+    max_delay: float = 60.0
+
+    @classmethod
+    def from_env(cls, **overrides) -> "SchedulerConfig":
+        env = {
+            "concurrency": ("MEDOM_UPSERT_CONCURRENCY", int),
+            "embed_batch_size": ("MEDOM_EMBED_BATCH_SIZE", int),
+            "upsert_batch_size": ("MEDOM_UPSERT_BATCH_SIZE", int),
+            "embed_tokens_per_minute": ("MEDOM_EMBED_TPM", float),
+            "store_requests_per_second": ("MEDOM_STORE_RPS", float),
+            "max_retries": ("MEDOM_MAX_RETRIES", int),
+        }
+        values = {
+            name: cast(os.environ[var]) for name, (var, cast) in env.items() if var in os.environ
+        }
+        values.update(overrides)
+        return cls(**values)
+
+
+@dataclass
+class IndexingStats:
+    documents: int = 0
+    tokens: int = 0
+    retries: int = 0
+    failed_ids: Set[str] = field(default_factory=set)
+    failed_batches: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def docs_per_second(self) -> float:
+        return self.documents / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def tokens_per_second(self) -> float:
+        return self.tokens / self.elapsed if self.elapsed else 0.0
+
+
+class UpsertScheduler:
+    """
+    Embeds and upserts documents under a concurrency cap, token-bucket limits
+    for embedding tokens and vector-store requests, and jittered exponential
+    backoff on 429/5xx.
+
+    Embedding is done up front in `embed_batch_size` slices through
+    `embeddings`; when that is the CachedEmbeddings instance the vector store
+    was built with, the store's own embedding call during the
+    `upsert_batch_size` upsert is served entirely from the cache.
+    """
+
+    def __init__(self, config: Optional[SchedulerConfig] = None):
+        self.config = config or SchedulerConfig.from_env()
+        self._semaphore = asyncio.Semaphore(self.config.concurrency)
+        self.token_bucket = TokenBucket(self.config.embed_tokens_per_minute / 60)
+        self.request_bucket = TokenBucket(self.config.store_requests_per_second)
+        self.stats = IndexingStats()
+
+    async def _with_retry(self, bucket: TokenBucket, cost: float, call):
+        attempt = 0
+        while True:
+            await bucket.acquire(cost)
+            try:
+                async with self._semaphore:
+                    result = await call()
+                bucket.reward()
+                return result
+            except Exception as e:
+                if not is_retryable(e) or attempt >= self.config.max_retries:
+                    raise
+                if is_rate_limited(e):
+                    bucket.penalize()
+                # Full jitter: sleep uniformly in [0, min(max_delay, base * 2^attempt)].
+                delay = random.uniform(
+                    0, min(self.config.max_delay, self.config.base_delay * 2**attempt)
+                )
+                attempt += 1
+                self.stats.retries += 1
+                log_warning(
+                    f"VectorStore Indexing: retry {attempt}/{self.config.max_retries} in {delay:.1f}s - {e}",
+                    sample="indexing.retry",
+                )
+                await asyncio.sleep(delay)
+
+    async def _embed(self, embeddings: Embeddings, texts: List[str]):
+        step = self.config.embed_batch_size
+        for i in range(0, len(texts), step):
+            chunk = texts[i : i + step]
+            tokens = sum(count_tokens(t) for t in chunk)
+            with span(
+                "ingestion.embed",
+                texts=len(chunk),
+                tokens=tokens,
+                bytes=sum(len(t.encode("utf-8")) for t in chunk),
+            ):
+                await self._with_retry(
+                    self.token_bucket, tokens, lambda: embeddings.aembed_documents(chunk)
+                )
+            self.stats.tokens += tokens
+            log_debug("VectorStore Indexing: embedded %d texts (%d tokens)", len(chunk), tokens)
+
+    async def add_batch(
+        self,
+        vectorstore: VectorStore,
+        batch: List[Document],
+        batch_ids: Optional[List[str]],
+        embeddings: Optional[Embeddings] = None,
+    ):
+        if embeddings is not None:
+            await self._embed(embeddings, [doc.page_content for doc in batch])
+        with span("ingestion.upsert", documents=len(batch)):
+            await self._with_retry(
+                self.request_bucket, 1, lambda: vectorstore.aadd_documents(batch, ids=batch_ids)
+            )
+        self.stats.documents += len(batch)
+
+
+async def index_documents_async(
+    vectorstore: VectorStore,
+    documents: List[Document],
+    batch_size: Optional[int] = None,
+    ids: Optional[List[str]] = None,
+    embeddings: Optional[Embeddings] = None,
+    scheduler: Optional[UpsertScheduler] = None,
+) -> Set[str]:
+    """Process documents in batches asynchronously. Returns the IDs that failed to upsert."""
+    scheduler = scheduler or UpsertScheduler()
+    batch_size = batch_size or scheduler.config.upsert_batch_size
+    log_header("VECTOR STORAGE PHASE")
+    log_info(
+        f"📚 VectorStore Indexing: Preparing to add {len(documents)} documents to vector store",
+        Colors.DARKCYAN,
+    )
+
+    # Create batches
+    batches = [
+        (documents[i : i + batch_size], ids[i : i + batch_size] if ids else None)
+        for i in range(0, len(documents), batch_size)
+    ]
+
+    log_info(
+        f"📦 VectorStore Indexing: Split into {len(batches)} batches of {batch_size} documents each "
+        f"(embedding {scheduler.config.embed_batch_size} at a time, "
+        f"{scheduler.config.concurrency} requests in flight)"
+    )
+
+    stats = scheduler.stats
+    started = time.monotonic()
+
+    async def add_batch(batch: List[Document], batch_ids: Optional[List[str]], batch_num: int):
+        try:
+            await scheduler.add_batch(vectorstore, batch, batch_ids, embeddings)
+            log_success(
+                f"VectorStore Indexing: Successfully added batch {batch_num}/{len(batches)} ({len(batch)} documents)",
+                sample="indexing.batch",
+            )
+        except Exception as e:
+            log_error(f"VectorStore Indexing: Failed to add batch {batch_num} - {e}")
+            stats.failed_ids.update(batch_ids or ())
+            stats.failed_batches += 1
+            return False
+        return True
+
+    # The scheduler's semaphore and buckets bound how many of these actually run at once.
+    tasks = [add_batch(batch, batch_ids, i + 1) for i, (batch, batch_ids) in enumerate(batches)]
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    stats.elapsed = time.monotonic() - started
+
+    # Count successful batches
+    successful = sum(1 for result in results if result is True)
+
+    if successful == len(batches):
+        log_success(
+            f"VectorStore Indexing: All batches processed successfully! ({successful}/{len(batches)})"
+        )
+    else:
+        log_warning(
+            f"VectorStore Indexing: Processed {successful}/{len(batches)} batches successfully"
+        )
+    log_info(
+        f"⏱️  VectorStore Indexing: {stats.documents} docs in {stats.elapsed:.1f}s "
+        f"({stats.docs_per_second:.1f} docs/s, {stats.tokens_per_second:.0f} tokens/s, "
+        f"{stats.retries} retries)"
+    )
+    return stats.failed_ids
+
+
+async def delete_documents_async(vectorstore: VectorStore, ids: List[str], batch_size: int = 1000):
+    """Delete stale vectors (tombstones) in batches."""
+    if not ids:
+        return
+    for i in range(0, len(ids), batch_size):
+        await vectorstore.adelete(ids=ids[i : i + batch_size])
+    log_success(f"VectorStore Indexing: Deleted {len(ids)} stale vectors")
+
+
+async def sync_documents_async(
+    vectorstore: VectorStore,
+    scope: str,
+    documents: List[Document],
+    batch_size: Optional[int] = None,
+    full: bool = False,
+    manifest: Optional[IngestManifest] = None,
+    embeddings: Optional[Embeddings] = None,
+    scheduler: Optional[UpsertScheduler] = None,
+    skipped_urls: Set[str] = frozenset(),
+    max_prune_fraction: float = MAX_PRUNE_FRACTION,
+) -> IncrementalPlan:
+    """
+    Incrementally bring the vector store in line with `documents`: upsert
+    chunks of new or changed URLs under deterministic IDs and delete vectors
+    of chunks and URLs that disappeared. `full` re-upserts everything.
+    `skipped_urls` and `max_prune_fraction` guard removals against a partial
+    crawl; see IngestManifest.plan_removals.
+    """
+    manifest = manifest or IngestManifest.load()
+    plan = manifest.plan(
+        scope,
+        documents,
+        full=full,
+        skipped_urls=skipped_urls,
+        max_prune_fraction=max_prune_fraction,
+    )
+    log_info(
+        f"🧾 Incremental Sync: {len(plan.changed_urls)} new/changed, "
+        f"{len(plan.unchanged_urls)} unchanged, {len(plan.removed_urls)} removed URLs",
+        Colors.DARKCYAN,
+    )
+
+    failed_ids: Set[str] = set()
+    if plan.upsert_docs:
+        failed_ids = await index_documents_async(
+            vectorstore,
+            plan.upsert_docs,
+            batch_size=batch_size,
+            ids=plan.upsert_ids,
+            embeddings=embeddings,
+            scheduler=scheduler,
+        )
+    deleted = True
+    try:
+        await delete_documents_async(vectorstore, plan.delete_ids)
+    except Exception as e:
+        log_error(f"VectorStore Indexing: Failed to delete stale vectors - {e}")
+        deleted = False
+
+    # Without the delete the old entries stay, so the next run retries it.
+    manifest.commit(scope, plan, failed_ids, deleted=deleted)
+    manifest.save()
+    if not deleted:
+        # Callers drop removed URLs from the catalog; they are still in the index.
+        plan.removed_urls = []
+    return plan
@@ -1,21 +1,31 @@
+import argparse
 import asyncio
 import os
 import ssl
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
 import certifi
 from dotenv import load_dotenv
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_chroma import Chroma
 from langchain_core.documents import Document
 from langchain_openai import OpenAIEmbeddings
-from langchain_pinecone import PineconeVectorStore
 from langchain_tavily import TavilyCrawl, TavilyExtract, TavilyMap
 from sqlalchemy.testing.suite.test_reflection import metadata
-import re
 
 
 
+from backend.cache import bump_index_version
+from backend.embeddings import CachedEmbeddings
+from backend.vectorstores import VECTOR_BACKEND, make_vectorstore, persist_vectorstore, reset_vectorstore
+from backend.catalog import ListingCatalog, chunk_metadata, parse_listing
+from backend.lexical import LexicalIndex, lexical_index_path
+from backend.tracing import profiled, span
+from indexing import MAX_PRUNE_FRACTION, IngestManifest, annotate_chunks, sync_documents_async
+from chunking import ListingChunker
+from dedup import deduplicate
+from pipeline import run_streaming_pipeline, stream_pages
+from snapshot_store import SnapshotStore
+# Extraction lives in transforms so pool workers don't import this module.
+from transforms import aparallel_map, asplit_documents, extract_lokacija_section
 from logger import Colors, log_error, log_header, log_info, log_success, log_warning
 
 load_dotenv()
@@ -26,135 +36,265 @@ os.environ["SSL_CERT_FILE"] = certifi.where()
 os.environ["REQUESTS_CA_BUNDLE"] = certifi.where()
 
 
-embeddings = OpenAIEmbeddings(
+embeddings = CachedEmbeddings(
+    OpenAIEmbeddings(
+        model="text-embedding-3-small",
+        show_progress_bar=False,
+        chunk_size=50,
+        retry_min_seconds=10,
+    ),
     model="text-embedding-3-small",
-    show_progress_bar=False,
-    chunk_size=50,
-    retry_min_seconds=10,
-)
-chroma = Chroma(persist_directory="chroma_db", embedding_function=embeddings)
-vectorstore = PineconeVectorStore(
-    index_name="langchain-doc-index", embedding=embeddings
 )
+# Pinecone, the local chroma_db directory or the in-process NumPy snapshot (MEDOM_VECTOR_BACKEND)
+vectorstore = make_vectorstore(embeddings, backend=VECTOR_BACKEND)
 tavily_extract = TavilyExtract()
 tavily_map = TavilyMap(max_depth=5, max_breadth=20, max_pages=1000)
 tavily_crawl = TavilyCrawl()
+# Every crawl is recorded so --replay can re-run extraction offline.
+snapshots = SnapshotStore()
+# Chunks follow listing/field boundaries and are sized in tokens (MEDOM_CHUNK_TOKENS).
+text_splitter = ListingChunker()
+
+CRAWL_URL = "https://medom-nekretnine.com/zemljiste/"
 
-def extract_lokacija_section(text):
+
+def fetch_pages(url: str, replay: Optional[str] = None) -> List[Dict[str, Any]]:
     """
-    Extracts everything from 'Lokacija:' up to right before the first '[![Image'.
+    Crawl `url` and record the result in the snapshot store, or with `replay`
+    (a snapshot id or "latest") read a recorded crawl instead.
     """
-    pattern = re.compile(
-        r"(Lokacija:.*?)(?=\[!\[Image)",
-        re.DOTALL
-    )
-    match = pattern.search(text)
-    if match:
-        return match.group(1).strip()
-    return None
-
-async def index_documents_async(documents: List[Document], batch_size: int = 50):
-    """Process documents in batches asynchronously."""
-    log_header("VECTOR STORAGE PHASE")
-    log_info(
-        f"📚 VectorStore Indexing: Preparing to add {len(documents)} documents to vector store",
-        Colors.DARKCYAN,
-    )
-
-    # Create batches
-    batches = [
-        documents[i : i + batch_size] for i in range(0, len(documents), batch_size)
-    ]
+    if replay:
+        with span("ingestion.replay", url=url, snapshot=replay) as current:
+            results = snapshots.load(url, replay)
+            current.set(pages=len(results))
+        return results
 
     log_info(
-        f"📦 VectorStore Indexing: Split into {len(batches)} batches of {batch_size} documents each"
+        f"🔍 TavilyCrawl: Starting to crawl from {url}",
+        Colors.PURPLE,
     )
 
-    # Process all batches concurrently
-    async def add_batch(batch: List[Document], batch_num: int):
-        try:
-            await vectorstore.aadd_documents(batch)
-            log_success(
-                f"VectorStore Indexing: Successfully added batch {batch_num}/{len(batches)} ({len(batch)} documents)"
-            )
-        except Exception as e:
-            log_error(f"VectorStore Indexing: Failed to add batch {batch_num} - {e}")
-            return False
-        return True
-
-    # Process batches concurrently
-    tasks = [add_batch(batch, i + 1) for i, batch in enumerate(batches)]
-    results = await asyncio.gather(*tasks, return_exceptions=True)
-
-    # Count successful batches
-    successful = sum(1 for result in results if result is True)
-
-    if successful == len(batches):
-        log_success(
-            f"VectorStore Indexing: All batches processed successfully! ({successful}/{len(batches)})"
+    with span("ingestion.crawl", url=url) as current:
+        res = tavily_crawl.invoke(
+            input={
+                "url": url,
+                "extract_depth": "advanced",
+                "instructions": "Documentation relevant to zemljiste",
+                "max_depth": 2
+            }
         )
-    else:
-        log_warning(
-            f"VectorStore Indexing: Processed {successful}/{len(batches)} batches successfully"
+        current.set(
+            pages=len(res['results']),
+            bytes=sum(len((r.get('raw_content') or "").encode("utf-8")) for r in res['results']),
         )
+    snapshots.record(url, res['results'])
+    return res['results']
+
 
-async def main():
-    url = "https://medom-nekretnine.com/zemljiste/"
-    """Main async function to orchestrate the entire process."""
+async def main(full: bool = False, replay: Optional[str] = None, force_prune: bool = False):
+    """
+    Main async function to orchestrate the entire process. With `replay` (a
+    snapshot id or "latest") the pages come from the snapshot store instead
+    of a new crawl.
+    """
+    url = CRAWL_URL
     log_header("INGESTION PIPELINE")
 
-    log_info(
-        f"🔍 TavilyCrawl: Starting to crawl from {url}",
-        Colors.PURPLE,
-    )
+    res = {"results": fetch_pages(url, replay)}
+    # Crawled but not fetched: kept in the index rather than treated as removed.
+    skipped_urls = {result['url'] for result in res['results'] if result.get('raw_content') is None}
+
+    with span("ingestion.filter") as current:
+        # The regex runs on the process pool, off the event loop.
+        pages = [result for result in res['results'] if result.get('raw_content') is not None]
+        sections = await aparallel_map(
+            extract_lokacija_section, [page['raw_content'] for page in pages]
+        )
+        filtered_result = [
+            {"raw_content": extracted, "url": page['url']}
+            for page, extracted in zip(pages, sections)
+            if extracted
+        ]
+        current.set(
+            documents=len(filtered_result),
+            bytes=sum(len(item['raw_content'].encode("utf-8")) for item in filtered_result),
+        )
 
-    res = tavily_crawl.invoke(
-        input={
-            "url": url,
-            "extract_depth": "advanced",
-            "instructions": "Documentation relevant to zemljiste",
-            "max_depth": 2
-        }
-    )
 
-    filtered_result = []
-    for result in res['results']:
-        content = result.get('raw_content')
-        if content is not None:
-            extracted = extract_lokacija_section(content)
-            if extracted:
-                filtered_result.append({
-                    "raw_content": extracted,
-                    "url": result['url']
-                })
+    # Before cataloguing and splitting, so a listing posted under several
+    # URLs is embedded once.
+    with span("ingestion.dedup") as current:
+        filtered_result, dedup_stats = deduplicate(filtered_result)
+        current.set(kept=dedup_stats.kept, dropped=dedup_stats.pages - dedup_stats.kept)
+    dedup_stats.log()
 
+    with span("ingestion.catalog"):
+        listings = [parse_listing(item['raw_content'], item['url']) for item in filtered_result]
+        catalog_size = ListingCatalog().upsert(listings)
 
-    all_docs = [Document(page_content=item['raw_content'], metadata={"source": item['url']}) for item in filtered_result]
+    # Listing fields on every chunk let queries filter the vector search.
+    all_docs = [
+        Document(
+            page_content=item['raw_content'],
+            metadata={"source": item['url'], **chunk_metadata(listing, item['raw_content'])},
+        )
+        for item, listing in zip(filtered_result, listings)
+    ]
+    log_success(
+        f"Listing Catalog: Stored {catalog_size} listings "
+        f"({sum(1 for l in listings if l.price_eur is not None)} with price)"
+    )
     #site_map = tavily_map.invoke(url)
     log_success(
         f"TavilyCrawl: Successfully crawled {len(all_docs)} URLs from site"
     )
 
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=5000, chunk_overlap=500)
-    splitted_docs = text_splitter.split_documents(all_docs)
+    with span("ingestion.split") as current:
+        # start_index, ordinal and token_count let query-time packing trim overlap.
+        splitted_docs = annotate_chunks(await asplit_documents(text_splitter, all_docs))
+        current.set(chunks=len(splitted_docs))
 
     log_success(
         f"Text Splitter: Created {len(splitted_docs)} chunks from {len(all_docs)} documents"
     )
 
+    with span("ingestion.lexical_index"):
+        LexicalIndex.build(splitted_docs).save(lexical_index_path(url))
+    log_success(f"Lexical Index: Indexed {len(splitted_docs)} chunks for BM25 search")
+
     # Process documents asynchronously
-    await index_documents_async(splitted_docs, batch_size=500)
+    # The manifest tracks each backend separately so switching backends re-fills the new one.
+    # Embed and upsert batches are traced as ingestion.embed / ingestion.upsert spans.
+    with span("ingestion.index", backend=VECTOR_BACKEND):
+        plan = await sync_documents_async(
+            vectorstore,
+            scope=f"{VECTOR_BACKEND}:{url}",
+            documents=splitted_docs,
+            full=full,
+            embeddings=embeddings,
+            # TavilyCrawl stops at its page limit, so a short crawl can look like removals.
+            skipped_urls=skipped_urls,
+            max_prune_fraction=1.0 if force_prune else MAX_PRUNE_FRACTION,
+        )
+        persist_vectorstore(vectorstore)
+    ListingCatalog().delete(plan.removed_urls)
+    # Cached answers were computed against the previous index contents.
+    if plan.changed_urls or plan.removed_urls:
+        bump_index_version()
 
     log_header("PIPELINE COMPLETE")
     log_success("🎉 Documentation ingestion pipeline finished successfully!")
     log_info("📊 Summary:", Colors.BOLD)
     log_info(f"   • Documents extracted: {len(all_docs)}")
+    log_info(f"   • Duplicates dropped: {dedup_stats.pages - dedup_stats.kept}")
     log_info(f"   • Chunks created: {len(splitted_docs)}")
+    log_info(
+        f"   • Embeddings reused from cache: {embeddings.hits}, newly embedded: {embeddings.misses}"
+    )
+    log_info(f"   • Listings catalogued: {catalog_size}")
+    log_info(f"   • Chunks upserted: {len(plan.upsert_docs)}")
+    log_info(f"   • Listings removed from site: {len(plan.removed_urls)}")
+
+    log_success("Finish")
+
+
+async def main_stream(full: bool = False, replay: Optional[str] = None, force_prune: bool = False):
+    """
+    main() as a streaming pipeline: pages are extracted, split, embedded and
+    upserted as they come in instead of phase by phase.
+    """
+    url = CRAWL_URL
+    log_header("STREAMING INGESTION PIPELINE")
+
+    if replay:
+        # Read one page at a time from the snapshot store.
+        pages = stream_pages(snapshots.iter_pages(url, replay))
+    else:
+        # TavilyCrawl returns the whole crawl in one response; streaming starts after it.
+        pages = stream_pages(fetch_pages(url))
+
+    # The BM25 index is rebuilt from every chunk at the end.
+    lexical_chunks: List[Document] = []
+    stats = await run_streaming_pipeline(
+        pages,
+        text_splitter,
+        vectorstore,
+        scope=f"{VECTOR_BACKEND}:{url}",
+        full=full,
+        embeddings=embeddings,
+        catalog=ListingCatalog(),
+        on_chunks=lexical_chunks.extend,
+        max_prune_fraction=1.0 if force_prune else MAX_PRUNE_FRACTION,
+    )
+    persist_vectorstore(vectorstore)
+
+    with span("ingestion.lexical_index"):
+        # Pages indexed before a more canonical duplicate replaced them are gone again.
+        removed = set(stats.removed_urls)
+        lexical_chunks = [chunk for chunk in lexical_chunks if chunk.metadata["source"] not in removed]
+        LexicalIndex.build(lexical_chunks).save(lexical_index_path(url))
+    log_success(f"Lexical Index: Indexed {len(lexical_chunks)} chunks for BM25 search")
+
+    # Cached answers were computed against the previous index contents.
+    if stats.changed_urls or stats.removed_urls:
+        bump_index_version()
+
+    log_header("PIPELINE COMPLETE")
+    log_info("📊 Summary:", Colors.BOLD)
+    log_info(f"   • Pages crawled: {stats.pages}")
+    log_info(f"   • Documents extracted: {stats.documents}")
+    log_info(f"   • Duplicates dropped: {stats.duplicates}")
+    log_info(f"   • Chunks created: {stats.chunks}")
+    log_info(
+        f"   • Embeddings reused from cache: {embeddings.hits}, newly embedded: {embeddings.misses}"
+    )
+    log_info(f"   • Listings catalogued: {stats.listings}")
+    log_info(f"   • Chunks upserted: {stats.upserted}")
+    log_info(f"   • Listings removed from site: {len(stats.removed_urls)}")
 
     log_success("Finish")
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="re-upsert every chunk instead of only new or changed listings",
+    )
+    parser.add_argument(
+        "--replay",
+        nargs="?",
+        const="latest",
+        metavar="SNAPSHOT",
+        help="re-process a recorded crawl (default: the latest) instead of crawling the site",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="overlap extraction, splitting, embedding and upserts through bounded queues",
+    )
+    parser.add_argument(
+        "--force-prune",
+        action="store_true",
+        help="remove listings missing from the crawl even past MEDOM_MAX_PRUNE_FRACTION of the site",
+    )
+    parser.add_argument(
+        "--reset",
+        action="store_true",
+        help="empty the vector backend before indexing, purging vectors no manifest tracks "
+        "(e.g. ones upserted under random IDs); re-run the other ingestion script afterwards",
+    )
+    args = parser.parse_args()
+    if args.reset:
+        reset_vectorstore(vectorstore)
+        persist_vectorstore(vectorstore)
+        manifest = IngestManifest.load()
+        manifest.drop_backend(VECTOR_BACKEND)
+        manifest.save()
+        log_warning(f"Vector Store: Emptied the {VECTOR_BACKEND} backend, every listing will be re-indexed")
+    entry = main_stream if args.stream else main
+    with profiled("ingestion"), span("ingestion"):
+        asyncio.run(entry(full=args.full, replay=args.replay, force_prune=args.force_prune))
 
 
@@ -1,19 +1,29 @@
+import argparse
 import asyncio
 import os
 import ssl
-from typing import Any, Dict, List
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
 
 import certifi
 from dotenv import load_dotenv
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_chroma import Chroma
 from langchain_core.documents import Document
 from langchain_openai import OpenAIEmbeddings
-from langchain_pinecone import PineconeVectorStore
 from langchain_tavily import TavilyCrawl, TavilyExtract, TavilyMap
 from rich import Console
 from rich.panel import Panel
 from sqlalchemy.testing.suite.test_reflection import metadata
+from backend.cache import bump_index_version
+from backend.catalog import ListingCatalog, chunk_metadata, parse_listing
+from backend.embeddings import CachedEmbeddings
+from backend.lexical import LexicalIndex, lexical_index_path
+from backend.vectorstores import VECTOR_BACKEND, make_vectorstore, persist_vectorstore, reset_vectorstore
+from backend.tracing import profiled, span
+from indexing import MAX_PRUNE_FRACTION, IngestManifest, annotate_chunks, sync_documents_async
+from chunking import ListingChunker
+from dedup import deduplicate
+from pipeline import run_streaming_pipeline, stream_pages
+from snapshot_store import SnapshotStore
+from transforms import aparallel_map, asplit_documents, extract_lokacija_section
 from logger import Colors, log_error, log_header, log_info, log_success, log_warning
 
 console = Console()
@@ -25,19 +35,24 @@ os.environ["SSL_CERT_FILE"] = certifi.where()
 os.environ["REQUESTS_CA_BUNDLE"] = certifi.where()
 
 
-embeddings = OpenAIEmbeddings(
+embeddings = CachedEmbeddings(
+    OpenAIEmbeddings(
+        model="text-embedding-3-small",
+        show_progress_bar=False,
+        chunk_size=50,
+        retry_min_seconds=10,
+    ),
     model="text-embedding-3-small",
-    show_progress_bar=False,
-    chunk_size=50,
-    retry_min_seconds=10,
-)
-chroma = Chroma(persist_directory="chroma_db", embedding_function=embeddings)
-vectorstore = PineconeVectorStore(
-    index_name="langchain-doc-index", embedding=embeddings
 )
+# Pinecone, the local chroma_db directory or the in-process NumPy snapshot (MEDOM_VECTOR_BACKEND)
+vectorstore = make_vectorstore(embeddings, backend=VECTOR_BACKEND)
 tavily_extract = TavilyExtract()
 tavily_map = TavilyMap(max_depth=5, max_breadth=20, max_pages=1000)
 tavily_crawl = TavilyCrawl()
+# Every extraction run is recorded so --replay can re-run it offline.
+snapshots = SnapshotStore()
+# Chunks follow listing/field boundaries and are sized in tokens (MEDOM_CHUNK_TOKENS).
+text_splitter = ListingChunker()
 
 
 def chunk_urls(urls: List[str], chunk_size: int = 3) -> List[List[str]]:
@@ -48,159 +63,316 @@ def chunk_urls(urls: List[str], chunk_size: int = 3) -> List[List[str]]:
         chunks.append(chunk)
     return chunks
 
-async def extract_batch(urls: List[str], batch_num: int) -> List[Dict[str, Any]]:
-    """Extract documents from a batch of URLs."""
+async def extract_batch(
+    urls: List[str], batch_num: int, failed: Optional[Set[str]] = None
+) -> List[Dict[str, Any]]:
+    """Extract documents from a batch of URLs. URLs that could not be extracted are added to `failed`."""
+    failed = failed if failed is not None else set()
     try:
         console.print(f"🔄 Processing batch {batch_num} with {len(urls)} URLs", style="blue")
         docs = await tavily_extract.ainvoke(input={"urls": urls})
         results = docs.get('results', [])
+        failed.update(item['url'] for item in docs.get('failed_results', []) if item.get('url'))
         console.print(f"✅ Batch {batch_num} completed - extracted {len(results)} documents", style="green")
         return results
     except Exception as e:
         console.print(f"❌ Batch {batch_num} failed: {e}", style="red")
+        failed.update(urls)
         return []
 
 
-async def index_documents_async(documents: List[Document], batch_size: int = 50):
-    """Process documents in batches asynchronously."""
-    log_header("VECTOR STORAGE PHASE")
-    log_info(
-        f"📚 VectorStore Indexing: Preparing to add {len(documents)} documents to vector store",
-        Colors.DARKCYAN,
-    )
-
-    # Create batches
-    batches = [
-        documents[i : i + batch_size] for i in range(0, len(documents), batch_size)
-    ]
-
-    log_info(
-        f"📦 VectorStore Indexing: Split into {len(batches)} batches of {batch_size} documents each"
-    )
-
-    # Process all batches concurrently
-    async def add_batch(batch: List[Document], batch_num: int):
-        try:
-            await vectorstore.aadd_documents(batch)
-            log_success(
-                f"VectorStore Indexing: Successfully added batch {batch_num}/{len(batches)} ({len(batch)} documents)"
-            )
-        except Exception as e:
-            log_error(f"VectorStore Indexing: Failed to add batch {batch_num} - {e}")
-            return False
-        return True
-
-    # Process batches concurrently
-    tasks = [add_batch(batch, i + 1) for i, batch in enumerate(batches)]
-    results = await asyncio.gather(*tasks, return_exceptions=True)
+async def main(full: bool = False, replay: Optional[str] = None, force_prune: bool = False):
+    """Map, extract and index the site; `replay` re-processes a recorded crawl instead."""
 
-    # Count successful batches
-    successful = sum(1 for result in results if result is True)
+    # Example website to map
+    demo_url = "https://medom-nekretnine.com/stan/"
 
-    if successful == len(batches):
-        log_success(
-            f"VectorStore Indexing: All batches processed successfully! ({successful}/{len(batches)})"
-        )
+    # Mapped but not extracted: kept in the index rather than treated as removed.
+    skipped_urls: Set[str] = set()
+    if replay:
+        with span("ingestion.replay", url=demo_url, snapshot=replay) as current:
+            all_extracted = snapshots.load(demo_url, replay)
+            current.set(pages=len(all_extracted))
+        site_map = {"results": [page["url"] for page in all_extracted]}
     else:
-        log_warning(
-            f"VectorStore Indexing: Processed {successful}/{len(batches)} batches successfully"
+        # Initialize TavilyMap with custom settings
+        tavily_map = TavilyMap(
+            max_depth=3,        # Crawl up to 3 levels deep
+            max_breadth=15,     # Follow up to 15 links per page
+            max_pages=150        # Limit to 50 total pages for demo
         )
 
+        print("✅ TavilyMap initialized successfully!")
 
-async def main():
 
-    # Initialize TavilyMap with custom settings
-    tavily_map = TavilyMap(
-        max_depth=3,        # Crawl up to 3 levels deep
-        max_breadth=15,     # Follow up to 15 links per page
-        max_pages=150        # Limit to 50 total pages for demo
-    )
-
-    print("✅ TavilyMap initialized successfully!")
-
-
-    # Example website to map
-    demo_url = "https://medom-nekretnine.com/stan/"
-
-    console.print(f"🔍 Mapping website structure for: {demo_url}", style="bold blue")
-    console.print("This may take a moment...")
+        console.print(f"🔍 Mapping website structure for: {demo_url}", style="bold blue")
+        console.print("This may take a moment...")
 
-    # Map the website structure
-    site_map = tavily_map.invoke(demo_url)
+        # Map the website structure
+        with span("ingestion.crawl", url=demo_url) as current:
+            site_map = tavily_map.invoke(demo_url)
+            current.set(pages=len(site_map.get('results', [])))
 
-    # Display results
-    urls = site_map.get('results', [])
-    console.print(f"\n✅ Successfully mapped {len(urls)} URLs!", style="bold green")
+        # Display results
+        urls = site_map.get('results', [])
+        console.print(f"\n✅ Successfully mapped {len(urls)} URLs!", style="bold green")
 
-    # Show first 10 URLs as examples
-    console.print("\n📋 First 50 discovered URLs:", style="bold yellow")
-    for i, url in enumerate(urls[:50], 1):
-        console.print(f"  {i:2d}. {url}")
+        # Show first 10 URLs as examples
+        console.print("\n📋 First 50 discovered URLs:", style="bold yellow")
+        for i, url in enumerate(urls[:50], 1):
+            console.print(f"  {i:2d}. {url}")
 
-    if len(urls) > 10:
-        console.print(f"  ... and {len(urls) - 50} more URLs")
+        if len(urls) > 10:
+            console.print(f"  ... and {len(urls) - 50} more URLs")
 
-    # Select a few interesting URLs for extraction
-    console.print(f"📚 Extracting content from {len(urls)} URLs...", style="bold blue")
+        # Select a few interesting URLs for extraction
+        console.print(f"📚 Extracting content from {len(urls)} URLs...", style="bold blue")
 
-    # Extract content
-    extraction_result = await tavily_extract.ainvoke(input={"urls": urls})
+        # Extract content
+        with span("ingestion.extract", urls=len(urls)):
+            extraction_result = await tavily_extract.ainvoke(input={"urls": urls})
 
-    # Display results
-    extracted_docs = extraction_result.get('results', [])
-    console.print(f"\n✅ Successfully extracted {len(extracted_docs)} documents!", style="bold green")
+        # Display results
+        extracted_docs = extraction_result.get('results', [])
+        console.print(f"\n✅ Successfully extracted {len(extracted_docs)} documents!", style="bold green")
 
-    # Show summary of each extracted document
-    for i, doc in enumerate(extracted_docs, 1):
-        url = doc.get('url', 'Unknown')
-        content = doc.get('raw_content', '')
+        # Show summary of each extracted document
+        for i, doc in enumerate(extracted_docs, 1):
+            url = doc.get('url', 'Unknown')
+            content = doc.get('raw_content', '')
 
-        # Create a panel for each document
-        panel_content = f"""URL: {url}
+            # Create a panel for each document
+            panel_content = f"""URL: {url}
             Content Length: {len(content):,} characters
             Preview: {content}..."""
 
-        console.print(Panel(panel_content, title=f"Document {i}", border_style="blue"))
-        print()  # Add spacing
+            console.print(Panel(panel_content, title=f"Document {i}", border_style="blue"))
+            print()  # Add spacing
 
-    # Process a larger set of URLs in batches
-    url_batches = chunk_urls(urls[:100], chunk_size=10)
+        # Process a larger set of URLs in batches
+        url_batches = chunk_urls(urls[:100], chunk_size=10)
+        skipped_urls.update(urls[100:])
+
+        console.print(f"📦 Processing URLs in {len(url_batches)} batches", style="bold yellow")
 
-    console.print(f"📦 Processing URLs in {len(url_batches)} batches", style="bold yellow")
+        # Process batches concurrently
+        with span("ingestion.extract_batches", batches=len(url_batches)):
+            tasks = [extract_batch(batch, i + 1, skipped_urls) for i, batch in enumerate(url_batches)]
+            batch_results = await asyncio.gather(*tasks)
 
-    # Process batches concurrently
-    tasks = [extract_batch(batch, i + 1) for i, batch in enumerate(url_batches)]
-    batch_results = await asyncio.gather(*tasks)
+        # Flatten results
+        all_extracted = []
+        for batch_result in batch_results:
+            all_extracted.extend(batch_result)
 
-    # Flatten results
-    all_extracted = []
-    for batch_result in batch_results:
-        all_extracted.extend(batch_result)
+        snapshots.record(demo_url, [page for batch in batch_results for page in batch])
 
-    for result in batch_results:
-        all_extracted.extend(result)
+    skipped_urls.update(page['url'] for page in all_extracted if not page.get('raw_content'))
+    all_extracted = [page for page in all_extracted if page.get('raw_content')]
 
-    all_docs = [Document(page_content=item['raw_content'], metadata={"source": item['url']}) for item in all_extracted]
+    # The whole page is indexed, but price, area and location are read from the
+    # listing section only; sidebars and footers quote other listings.
+    with span("ingestion.extract_sections"):
+        sections = await aparallel_map(
+            extract_lokacija_section, [page['raw_content'] for page in all_extracted]
+        )
+        all_extracted = [
+            {**page, 'listing_text': section or ""} for page, section in zip(all_extracted, sections)
+        ]
+
+    # Before splitting, so a listing posted under several URLs is embedded once.
+    with span("ingestion.dedup") as current:
+        all_extracted, dedup_stats = deduplicate(all_extracted, listing_key='listing_text')
+        current.set(kept=dedup_stats.kept, dropped=dedup_stats.pages - dedup_stats.kept)
+    dedup_stats.log()
+
+    with span("ingestion.catalog"):
+        listings = [parse_listing(item['listing_text'], item['url']) for item in all_extracted]
+        catalog_size = ListingCatalog().upsert(listings)
+
+    with span("ingestion.filter") as current:
+        # Listing fields on every chunk let queries filter the vector search.
+        all_docs = [
+            Document(
+                page_content=item['raw_content'],
+                metadata={"source": item['url'], **chunk_metadata(listing, item['listing_text'])},
+            )
+            for item, listing in zip(all_extracted, listings)
+        ]
+        current.set(
+            documents=len(all_docs),
+            bytes=sum(len(doc.page_content.encode("utf-8")) for doc in all_docs),
+        )
     console.print(f"\n🎉 Batch processing complete! Total documents extracted: {len(all_extracted)}", style="bold green")
 
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=4000, chunk_overlap=200)
-    splitted_docs = text_splitter.split_documents(all_docs)
+    with span("ingestion.split") as current:
+        # start_index, ordinal and token_count let query-time packing trim overlap.
+        splitted_docs = annotate_chunks(await asplit_documents(text_splitter, all_docs))
+        current.set(chunks=len(splitted_docs))
 
     log_success(
         f"Text Splitter: Created {len(splitted_docs)} chunks from {len(all_docs)} documents"
     )
 
+    with span("ingestion.lexical_index"):
+        LexicalIndex.build(splitted_docs).save(lexical_index_path(demo_url))
+    log_success(f"Lexical Index: Indexed {len(splitted_docs)} chunks for BM25 search")
+
     # Process documents asynchronously
-    await index_documents_async(splitted_docs, batch_size=500)
+    # The manifest tracks each backend separately so switching backends re-fills the new one.
+    # Embed and upsert batches are traced as ingestion.embed / ingestion.upsert spans.
+    with span("ingestion.index", backend=VECTOR_BACKEND):
+        plan = await sync_documents_async(
+            vectorstore,
+            scope=f"{VECTOR_BACKEND}:{demo_url}",
+            documents=splitted_docs,
+            full=full,
+            embeddings=embeddings,
+            skipped_urls=skipped_urls,
+            max_prune_fraction=1.0 if force_prune else MAX_PRUNE_FRACTION,
+        )
+        persist_vectorstore(vectorstore)
+    ListingCatalog().delete(plan.removed_urls)
+    # Cached answers were computed against the previous index contents.
+    if plan.changed_urls or plan.removed_urls:
+        bump_index_version()
 
     log_header("PIPELINE COMPLETE")
     log_success("🎉 Documentation ingestion pipeline finished successfully!")
     log_info("📊 Summary:", Colors.BOLD)
     log_info(f"   • URLs mapped: {len(site_map['results'])}")
     log_info(f"   • Documents extracted: {len(all_docs)}")
+    log_info(f"   • Duplicates dropped: {dedup_stats.pages - dedup_stats.kept}")
     log_info(f"   • Chunks created: {len(splitted_docs)}")
+    log_info(f"   • Listings catalogued: {catalog_size}")
+    log_info(f"   • Chunks upserted: {len(plan.upsert_docs)}")
+    log_info(f"   • Listings removed from site: {len(plan.removed_urls)}")
+    log_info(
+        f"   • Embeddings reused from cache: {embeddings.hits}, newly embedded: {embeddings.misses}"
+    )
+
+    log_success("Finish")
+
+
+async def extracted_pages(url: str, skipped_urls: Set[str]) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Map `url`, then yield extracted pages as each batch finishes, recording
+    them in the snapshot store along the way. Mapped URLs that are not
+    extracted go to `skipped_urls`.
+    """
+    site_map = TavilyMap(max_depth=3, max_breadth=15, max_pages=150)
+    with span("ingestion.crawl", url=url) as current:
+        urls = site_map.invoke(url).get('results', [])
+        current.set(pages=len(urls))
+    console.print(f"✅ Mapped {len(urls)} URLs, extracting in batches", style="bold green")
+
+    url_batches = chunk_urls(urls[:100], chunk_size=10)
+    skipped_urls.update(urls[100:])
+    tasks = [
+        asyncio.create_task(extract_batch(batch, i + 1, skipped_urls))
+        for i, batch in enumerate(url_batches)
+    ]
+    with snapshots.writer(url) as writer:
+        for finished in asyncio.as_completed(tasks):
+            for page in await finished:
+                writer.add(page)
+                yield page
+
+
+async def main_stream(full: bool = False, replay: Optional[str] = None, force_prune: bool = False):
+    """
+    main() as a streaming pipeline: extraction batches are split, embedded
+    and upserted as they complete instead of after the whole site.
+    """
+    demo_url = "https://medom-nekretnine.com/stan/"
+    log_header("STREAMING INGESTION PIPELINE")
+
+    skipped_urls: Set[str] = set()
+    if replay:
+        pages = stream_pages(snapshots.iter_pages(demo_url, replay))
+    else:
+        pages = extracted_pages(demo_url, skipped_urls)
+
+    # The BM25 index is rebuilt from every chunk at the end.
+    lexical_chunks: List[Document] = []
+    stats = await run_streaming_pipeline(
+        pages,
+        text_splitter,
+        vectorstore,
+        scope=f"{VECTOR_BACKEND}:{demo_url}",
+        extract=False,
+        full=full,
+        embeddings=embeddings,
+        catalog=ListingCatalog(),
+        on_chunks=lexical_chunks.extend,
+        skipped_urls=skipped_urls,
+        max_prune_fraction=1.0 if force_prune else MAX_PRUNE_FRACTION,
+    )
+    persist_vectorstore(vectorstore)
+
+    with span("ingestion.lexical_index"):
+        # Pages indexed before a more canonical duplicate replaced them are gone again.
+        removed = set(stats.removed_urls)
+        lexical_chunks = [chunk for chunk in lexical_chunks if chunk.metadata["source"] not in removed]
+        LexicalIndex.build(lexical_chunks).save(lexical_index_path(demo_url))
+    log_success(f"Lexical Index: Indexed {len(lexical_chunks)} chunks for BM25 search")
+
+    # Cached answers were computed against the previous index contents.
+    if stats.changed_urls or stats.removed_urls:
+        bump_index_version()
+
+    log_header("PIPELINE COMPLETE")
+    log_info("📊 Summary:", Colors.BOLD)
+    log_info(f"   • Documents extracted: {stats.documents}")
+    log_info(f"   • Duplicates dropped: {stats.duplicates}")
+    log_info(f"   • Chunks created: {stats.chunks}")
+    log_info(f"   • Listings catalogued: {stats.listings}")
+    log_info(f"   • Chunks upserted: {stats.upserted}")
+    log_info(f"   • Listings removed from site: {len(stats.removed_urls)}")
+    log_info(
+        f"   • Embeddings reused from cache: {embeddings.hits}, newly embedded: {embeddings.misses}"
+    )
 
     log_success("Finish")
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="re-upsert every chunk instead of only new or changed listings",
+    )
+    parser.add_argument(
+        "--replay",
+        nargs="?",
+        const="latest",
+        metavar="SNAPSHOT",
+        help="re-process a recorded extraction (default: the latest) instead of fetching the site",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="overlap extraction, splitting, embedding and upserts through bounded queues",
+    )
+    parser.add_argument(
+        "--force-prune",
+        action="store_true",
+        help="remove listings missing from the crawl even past MEDOM_MAX_PRUNE_FRACTION of the site",
+    )
+    parser.add_argument(
+        "--reset",
+        action="store_true",
+        help="empty the vector backend before indexing, purging vectors no manifest tracks "
+        "(e.g. ones upserted under random IDs); re-run the other ingestion script afterwards",
+    )
+    args = parser.parse_args()
+    if args.reset:
+        reset_vectorstore(vectorstore)
+        persist_vectorstore(vectorstore)
+        manifest = IngestManifest.load()
+        manifest.drop_backend(VECTOR_BACKEND)
+        manifest.save()
+        log_warning(f"Vector Store: Emptied the {VECTOR_BACKEND} backend, every listing will be re-indexed")
+    entry = main_stream if args.stream else main
+    with profiled("ingestion_map_extract"), span("ingestion"):
+        asyncio.run(entry(full=args.full, replay=args.replay, force_prune=args.force_prune))
\ No newline at end of file
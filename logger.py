@@ -1,3 +1,26 @@
+"""
+Pipeline logging helpers.
+
+Records go onto an in-memory queue and are written by a background listener
+thread, so calls from event-loop code never block on stdout. Output is
+colored on a TTY and JSON lines otherwise (MEDOM_LOG_FORMAT=color|json forces
+one); MEDOM_LOG_JSON_PATH additionally appends JSON lines to a file.
+MEDOM_LOG_LEVEL sets the threshold, and per-batch messages passed with
+`sample=` are emitted only once every MEDOM_LOG_SAMPLE_EVERY calls.
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+from collections import defaultdict
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+
 # Color codes for better logging
 class Colors:
     PURPLE = "\033[95m"
@@ -12,28 +35,150 @@ class Colors:
     END = "\033[0m"
 
 
-def log_info(message: str, color: str = Colors.CYAN):
+SUCCESS = 25
+logging.addLevelName(SUCCESS, "SUCCESS")
+
+LOG_LEVEL = os.getenv("MEDOM_LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("MEDOM_LOG_FORMAT")  # "color" or "json"; default depends on the TTY
+LOG_JSON_PATH = os.getenv("MEDOM_LOG_JSON_PATH")
+SAMPLE_EVERY = int(os.getenv("MEDOM_LOG_SAMPLE_EVERY", "10"))
+
+# Attributes every LogRecord has; anything else came in through `extra`.
+_RECORD_FIELDS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "color", "header"}
+
+
+class ColorFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        message = record.getMessage()
+        if getattr(record, "header", False):
+            rule = f"{Colors.BOLD}{Colors.PURPLE}{'=' * 60}{Colors.END}"
+            return f"\n{rule}\n{Colors.BOLD}{Colors.PURPLE}🚀 {message}{Colors.END}\n{rule}\n"
+        if record.levelno >= logging.ERROR:
+            return f"{Colors.RED}❌ {message}{Colors.END}"
+        if record.levelno >= logging.WARNING:
+            return f"{Colors.YELLOW}⚠️  {message}{Colors.END}"
+        if record.levelno == SUCCESS:
+            return f"{Colors.GREEN}✅ {message}{Colors.END}"
+        if record.levelno <= logging.DEBUG:
+            return f"{Colors.DARKCYAN}· {message}{Colors.END}"
+        return f"{getattr(record, 'color', Colors.CYAN)}ℹ️  {message}{Colors.END}"
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": record.created,
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "header", False):
+            payload["header"] = True
+        payload.update({k: v for k, v in vars(record).items() if k not in _RECORD_FIELDS})
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class _StdoutHandler(logging.StreamHandler):
+    """Writes to whatever sys.stdout is at emit time (tests and notebooks swap it)."""
+
+    def __init__(self):
+        super().__init__(sys.stdout)
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+
+def _build_handlers():
+    console = _StdoutHandler()
+    use_json = LOG_FORMAT == "json" or (LOG_FORMAT != "color" and not sys.stdout.isatty())
+    console.setFormatter(JsonFormatter() if use_json else ColorFormatter())
+    handlers = [console]
+    if LOG_JSON_PATH:
+        json_file = logging.FileHandler(LOG_JSON_PATH, encoding="utf-8")
+        json_file.setFormatter(JsonFormatter())
+        handlers.append(json_file)
+    return handlers
+
+
+logger = logging.getLogger("medom")
+logger.setLevel(LOG_LEVEL)
+logger.propagate = False
+
+_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+logger.addHandler(QueueHandler(_queue))
+_listener = QueueListener(_queue, *_build_handlers(), respect_handler_level=True)
+_listener.start()
+
+
+def flush():
+    """Block until every queued record has been written (also runs at exit)."""
+    global _listener
+    _listener.stop()
+    _listener = QueueListener(_queue, *_listener.handlers, respect_handler_level=True)
+    _listener.start()
+
+
+atexit.register(lambda: _listener.stop())
+
+
+def set_level(level):
+    """Change the threshold at runtime, e.g. set_level("WARNING")."""
+    logger.setLevel(level.upper() if isinstance(level, str) else level)
+
+
+_sample_lock = threading.Lock()
+_sample_counts = defaultdict(int)
+
+
+def _sampled(key: Optional[str]) -> bool:
+    # First call for a key is always emitted, then every SAMPLE_EVERY-th.
+    if key is None or SAMPLE_EVERY <= 1:
+        return True
+    with _sample_lock:
+        count = _sample_counts[key]
+        _sample_counts[key] = count + 1
+    return count % SAMPLE_EVERY == 0
+
+
+def _log(level: int, message: str, sample: Optional[str], **extra):
+    # The level check comes first so disabled calls cost one comparison.
+    if logger.isEnabledFor(level) and _sampled(sample):
+        logger.log(level, message, extra=extra)
+
+
+def log_debug(message: str, *args):
+    """Log debug message; %-style args are only formatted when DEBUG is on"""
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(message, *args)
+
+
+def log_info(message: str, color: str = Colors.CYAN, sample: Optional[str] = None):
     """Log info message with color"""
-    print(f"{color}ℹ️  {message}{Colors.END}")
+    _log(logging.INFO, message, sample, color=color)
 
 
-def log_success(message: str):
+def log_success(message: str, sample: Optional[str] = None):
     """Log success message in green"""
-    print(f"{Colors.GREEN}✅ {message}{Colors.END}")
+    _log(SUCCESS, message, sample)
 
 
-def log_error(message: str):
+def log_error(message: str, sample: Optional[str] = None):
     """Log error message in red"""
-    print(f"{Colors.RED}❌ {message}{Colors.END}")
+    _log(logging.ERROR, message, sample)
 
 
-def log_warning(message: str):
+def log_warning(message: str, sample: Optional[str] = None):
     """Log warning message in yellow"""
-    print(f"{Colors.YELLOW}⚠️  {message}{Colors.END}")
+    _log(logging.WARNING, message, sample)
 
 
 def log_header(message: str):
     """Log header message with emphasis"""
-    print(f"\n{Colors.BOLD}{Colors.PURPLE}{'='*60}{Colors.END}")
-    print(f"{Colors.BOLD}{Colors.PURPLE}🚀 {message}{Colors.END}")
-    print(f"{Colors.BOLD}{Colors.PURPLE}{'='*60}{Colors.END}\n")
\ No newline at end of file
+    _log(logging.INFO, message, None, header=True)
@@ -1,8 +1,21 @@
-from typing import Set
+import os
+import uuid
+from typing import Dict, Optional, Set
 
-from backend.core import run_llm
 import streamlit as st
 
+# With MEDOM_API_URL set, answers come from the API service (api.py) and this
+# process never builds the chain itself.
+API_URL = os.getenv("MEDOM_API_URL")
+if API_URL:
+    from backend.client import stream_llm_remote as _stream_llm_remote
+
+    def stream_llm(**kwargs):
+        return _stream_llm_remote(API_URL, **kwargs)
+
+else:
+    from backend.core import stream_llm, warm_up
+
 # Set page config
 st.set_page_config(
     page_title="MeDom Nekretnine Asistent",
@@ -11,6 +24,16 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
+
+@st.cache_resource(show_spinner=False)
+def warm_up_chain():
+    # Runs once per server process; every session then reuses the same chain.
+    return warm_up()
+
+# Finished turns shown before the "load older" button; each click reveals
+# another page.
+CHAT_PAGE_TURNS = int(os.getenv("MEDOM_CHAT_PAGE_TURNS", "10"))
+
 # Initialize language in session state
 if "lang" not in st.session_state:
     st.session_state["lang"] = "hr"  # 'hr' or 'en'
@@ -23,6 +46,7 @@ TRANSLATIONS = {
         "send": "Pošalji",
         "thinking": "Razmišljam...",
         "sources": "Izvori",
+        "load_older": "Učitaj starije poruke ({n})",
     },
     "en": {
         "subtitle": "Your AI real estate assistant",
@@ -30,6 +54,7 @@ TRANSLATIONS = {
         "send": "Send",
         "thinking": "Thinking...",
         "sources": "Sources",
+        "load_older": "Load older messages ({n})",
     },
 }
 
@@ -293,16 +318,20 @@ header {visibility: hidden;}
 </style>
 """, unsafe_allow_html=True)
 
-# Initialize session state
-if (
-        "chat_answers_history" not in st.session_state
-        and "user_prompt_history" not in st.session_state
-        and "chat_history" not in st.session_state
-):
-    st.session_state["chat_answers_history"] = []
-    st.session_state["user_prompt_history"] = []
+# Initialize session state. `chat_turns` holds each finished turn's HTML,
+# rendered once per language when the turn completes; `chat_history` is what
+# the chain sees.
+if "chat_turns" not in st.session_state and "chat_history" not in st.session_state:
+    st.session_state["chat_turns"] = []
     st.session_state["chat_history"] = []
 
+if "visible_turns" not in st.session_state:
+    st.session_state["visible_turns"] = CHAT_PAGE_TURNS
+
+# Keys the rolling history summary cached in backend.core
+if "session_id" not in st.session_state:
+    st.session_state["session_id"] = uuid.uuid4().hex
+
 # Initialize input clearing flag
 if "clear_input" not in st.session_state:
     st.session_state["clear_input"] = False
@@ -321,10 +350,10 @@ def create_sources_string(source_urls: Set[str]) -> str:
     return sources_string
 
 
-def create_individual_sources_string(source_urls: Set[str]) -> str:
+def create_individual_sources_string(source_urls: Set[str], lang: Optional[str] = None) -> str:
     if not source_urls:
         return ""
-    lang = st.session_state.get("lang", "hr")
+    lang = lang or st.session_state.get("lang", "hr")
     label = TRANSLATIONS[lang]["sources"]
     sources_list = list(source_urls)
     sources_list.sort()
@@ -334,6 +363,41 @@ def create_individual_sources_string(source_urls: Set[str]) -> str:
     return sources_string
 
 
+def render_turn(user_query: str, answer: str, sources: Set[str]) -> Dict[str, str]:
+    """HTML of a finished turn in every UI language, so reruns and language switches only look it up."""
+    return {
+        lang: (
+            f'<div class="user-message">{user_query}</div>\n\n'
+            f'<div class="assistant-message">{answer}{create_individual_sources_string(sources, lang)}</div>'
+        )
+        for lang in TRANSLATIONS
+    }
+
+
+def history_html(lang: str) -> str:
+    """
+    The visible window of finished turns as one markdown block, cached until
+    a turn is added, the window grows or the language changes.
+    """
+    turns = st.session_state["chat_turns"]
+    visible = st.session_state["visible_turns"]
+    key = (lang, len(turns), visible)
+    cached = st.session_state.get("history_html")
+    if cached is None or cached[0] != key:
+        cached = (key, "\n\n".join(turn[lang] for turn in turns[-visible:]))
+        st.session_state["history_html"] = cached
+    return cached[1]
+
+
+def load_older():
+    st.session_state["visible_turns"] += CHAT_PAGE_TURNS
+
+
+def switch_language():
+    # Runs before the rerun the radio triggers, so the page renders once in the new language.
+    st.session_state["lang"] = "hr" if st.session_state["lang_switcher_radio"] == "HR" else "en"
+
+
 # Main container
 st.markdown('<div class="main-container">', unsafe_allow_html=True)
 
@@ -351,33 +415,30 @@ with header_left:
     )
 with header_right:
     # Radio language selector
-    selected_lang = st.radio(
+    st.radio(
         label="Language",
         options=["HR", "EN"],
         index=0 if st.session_state["lang"] == "hr" else 1,
         horizontal=True,
         label_visibility="collapsed",
         key="lang_switcher_radio",
+        on_change=switch_language,
     )
-    new_lang = "hr" if selected_lang == "HR" else "en"
-    if new_lang != st.session_state["lang"]:
-        st.session_state["lang"] = new_lang
-        st.rerun()
 st.markdown('</div>', unsafe_allow_html=True)
 
 # Chat container
 st.markdown('<div class="chat-container">', unsafe_allow_html=True)
 
-if st.session_state["chat_answers_history"]:
-    for generated_response, user_query in zip(
-            st.session_state["chat_answers_history"],
-            st.session_state["user_prompt_history"],
-    ):
-        # User message
-        st.markdown(f'<div class="user-message">{user_query}</div>', unsafe_allow_html=True)
-
-        # Assistant message
-        st.markdown(f'<div class="assistant-message">{generated_response}</div>', unsafe_allow_html=True)
+# Only the most recent window is sent to the browser; older turns load on demand.
+hidden_turns = len(st.session_state["chat_turns"]) - st.session_state["visible_turns"]
+if hidden_turns > 0:
+    st.button(
+        TRANSLATIONS[st.session_state["lang"]]["load_older"].format(n=hidden_turns),
+        key="load_older",
+        on_click=load_older,
+    )
+if st.session_state["chat_turns"]:
+    st.markdown(history_html(st.session_state["lang"]), unsafe_allow_html=True)
 
 st.markdown('</div>', unsafe_allow_html=True)
 st.markdown('</div>', unsafe_allow_html=True)
@@ -408,14 +469,22 @@ with col2:
 st.markdown('</div>', unsafe_allow_html=True)
 st.markdown('</div>', unsafe_allow_html=True)
 
+# Build the chain only after the page has been sent, so the first render
+# doesn't wait for LangChain/OpenAI imports and the vector store connection.
+if not API_URL:
+    warm_up_chain()
+
 # Handle prompt submission
 if (prompt and not st.session_state.get("clear_input", False)) or submit_button:
     # Get the prompt from the input field
     current_prompt = prompt if prompt else st.session_state.get("current_prompt", "")
 
     if current_prompt and not st.session_state.get("clear_input", False):
-        # Show custom loading indicator for mobile
-        st.markdown(f"""
+        st.markdown(f'<div class="user-message">{current_prompt}</div>', unsafe_allow_html=True)
+
+        # Show custom loading indicator for mobile until the first sources/tokens arrive
+        response_placeholder = st.empty()
+        response_placeholder.markdown(f"""
         <div style="
             display: flex;
             justify-content: center;
@@ -450,21 +519,27 @@ if (prompt and not st.session_state.get("clear_input", False)) or submit_button:
         </style>
         """, unsafe_allow_html=True)
 
-        generated_response = run_llm(
-            query=current_prompt, chat_history=st.session_state["chat_history"]
-        )
-        sources = set(
-            [doc.metadata["source"] for doc in generated_response["source_documents"]]
-        )
-
-        formatted_response = (
-            f"{generated_response['result']}{create_individual_sources_string(sources)}"
-        )
-
-        st.session_state["user_prompt_history"].append(current_prompt)
-        st.session_state["chat_answers_history"].append(formatted_response)
+        answer = ""
+        sources: Set[str] = set()
+        sources_string = ""
+        for event in stream_llm(
+            query=current_prompt,
+            chat_history=st.session_state["chat_history"],
+            session_id=st.session_state["session_id"],
+        ):
+            if event["type"] == "sources":
+                sources = set(doc.metadata["source"] for doc in event["source_documents"])
+                sources_string = create_individual_sources_string(sources)
+            else:
+                answer += event["content"]
+            response_placeholder.markdown(
+                f'<div class="assistant-message">{answer}{sources_string}</div>',
+                unsafe_allow_html=True,
+            )
+
+        st.session_state["chat_turns"].append(render_turn(current_prompt, answer, sources))
         st.session_state["chat_history"].append(("human", current_prompt))
-        st.session_state["chat_history"].append(("ai", generated_response["result"]))
+        st.session_state["chat_history"].append(("ai", answer))
 
     # Clear the input by incrementing the counter
     st.session_state["input_counter"] = st.session_state.get("input_counter", 0) + 1
@@ -0,0 +1,259 @@
+"""
+Streaming ingestion: pages flow crawl -> extract/split -> embed/upsert through
+bounded queues, so indexing starts with the first pages and memory stays
+flat however large the site is. A full queue stalls the stage feeding it.
+"""
+
+import asyncio
+import os
+import time
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Set
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from backend.catalog import Listing, ListingCatalog
+from backend.tracing import metrics, span
+from indexing import (
+    MAX_PRUNE_FRACTION,
+    IncrementalPlan,
+    IngestManifest,
+    UpsertScheduler,
+    delete_documents_async,
+)
+from logger import Colors, log_error, log_info, log_success
+from dedup import Deduplicator
+from transforms import TRANSFORM_WORKERS, arun, extract_page, page_chunks
+
+PIPELINE_QUEUE_SIZE = int(os.getenv("MEDOM_PIPELINE_QUEUE_SIZE", "32"))
+
+_DONE = object()
+
+
+@dataclass
+class PipelineStats:
+    pages: int = 0
+    documents: int = 0
+    chunks: int = 0
+    upserted: int = 0
+    listings: int = 0
+    changed_urls: int = 0
+    unchanged_urls: int = 0
+    removed_urls: List[str] = field(default_factory=list)
+    failed_ids: Set[str] = field(default_factory=set)
+    duplicates: int = 0
+    elapsed: float = 0.0
+
+
+def _merge(plans: List[IncrementalPlan]) -> IncrementalPlan:
+    merged = IncrementalPlan()
+    for plan in plans:
+        merged.upsert_docs.extend(plan.upsert_docs)
+        merged.upsert_ids.extend(plan.upsert_ids)
+        merged.delete_ids.extend(plan.delete_ids)
+        merged.entries.update(plan.entries)
+        merged.changed_urls.extend(plan.changed_urls)
+        merged.unchanged_urls.extend(plan.unchanged_urls)
+        merged.shrunk_urls.extend(plan.shrunk_urls)
+    return merged
+
+
+async def stream_pages(pages) -> AsyncIterator[Dict[str, Any]]:
+    """Adapts a plain iterable of pages (a crawl result, a snapshot) to a pipeline source."""
+    for page in pages:
+        yield page
+        # Let the downstream stages run between pages read from disk.
+        await asyncio.sleep(0)
+
+
+async def run_streaming_pipeline(
+    pages: AsyncIterator[Dict[str, Any]],
+    text_splitter,
+    vectorstore: VectorStore,
+    scope: str,
+    extract: bool = True,
+    full: bool = False,
+    embeddings: Optional[Embeddings] = None,
+    manifest: Optional[IngestManifest] = None,
+    scheduler: Optional[UpsertScheduler] = None,
+    catalog: Optional[ListingCatalog] = None,
+    on_chunks: Optional[Callable[[List[Document]], None]] = None,
+    queue_size: int = PIPELINE_QUEUE_SIZE,
+    workers: int = TRANSFORM_WORKERS,
+    skipped_urls: Optional[Set[str]] = None,
+    max_prune_fraction: float = MAX_PRUNE_FRACTION,
+) -> PipelineStats:
+    """
+    Index `pages` (Tavily result dicts) as they arrive.
+
+    `workers` transform tasks extract each page on the process pool, drop
+    duplicates of a page already seen (dedup.Deduplicator, keeping the most
+    canonical URL of each) and split the rest, also on the pool. The indexing stage diffs each page against the manifest, gathers
+    whole pages into upsert batches of about `upsert_batch_size` chunks and
+    keeps at most `concurrency` batches in flight (both from the
+    scheduler's config). Stale chunks are deleted as their page is indexed;
+    URLs the crawl no longer has are removed once the source is exhausted.
+    Parsed listings go to `catalog` when one is given. `on_chunks` sees
+    every page's chunks (e.g. to build the lexical index).
+
+    `skipped_urls` collects URLs that were crawled but not indexed (no
+    content, a failed transform); the source may add its own failures to
+    the same set while it runs. They are never removed, and neither is
+    anything when more than `max_prune_fraction` of the scope is missing.
+    """
+    manifest = manifest or IngestManifest.load()
+    scheduler = scheduler or UpsertScheduler()
+    batch_size = scheduler.config.upsert_batch_size
+    stats = PipelineStats()
+    started = time.monotonic()
+
+    raw_pages: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    transformed: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    in_flight = asyncio.Semaphore(scheduler.config.concurrency)
+    seen_urls: Set[str] = set()
+    replaced_urls: Set[str] = set()
+    skipped_urls = skipped_urls if skipped_urls is not None else set()
+    split = partial(page_chunks, text_splitter)
+    deduplicator = Deduplicator()
+
+    async def crawl():
+        try:
+            async for page in pages:
+                stats.pages += 1
+                await raw_pages.put(page)
+        finally:
+            for _ in range(workers):
+                await raw_pages.put(_DONE)
+
+    async def transform_worker():
+        try:
+            while (page := await raw_pages.get()) is not _DONE:
+                if page.get("raw_content") is None:
+                    # A failed fetch says nothing about whether the listing is still up.
+                    skipped_urls.add(page["url"])
+                    continue
+                try:
+                    extracted = await arun(extract_page, page, extract, workers=workers)
+                    if extracted is None:
+                        continue
+                    url, content, section, fp = extracted
+                    # Checked on the event loop, so concurrent workers see each other's pages.
+                    keep, replaced = deduplicator.offer(url, fp)
+                    if replaced is not None:
+                        # A more canonical copy arrived; its stand-in is tombstoned at the end.
+                        replaced_urls.add(replaced)
+                    if not keep:
+                        continue
+                    result = await arun(split, url, content, section, workers=workers)
+                except Exception as e:
+                    log_error(f"Streaming Pipeline: Failed to process {page.get('url')} - {e}")
+                    skipped_urls.add(page["url"])
+                    continue
+                await transformed.put(result)
+        finally:
+            await transformed.put(_DONE)
+
+    async def flush(plans: List[IncrementalPlan], listings: List[Listing]):
+        plan = _merge(plans)
+        try:
+            if catalog is not None and listings:
+                stats.listings += await asyncio.to_thread(catalog.upsert, listings)
+            failed_ids: Set[str] = set()
+            if plan.upsert_docs:
+                try:
+                    await scheduler.add_batch(vectorstore, plan.upsert_docs, plan.upsert_ids, embeddings)
+                    stats.upserted += len(plan.upsert_docs)
+                    metrics.inc("medom_pipeline_chunks_upserted_total", len(plan.upsert_docs))
+                except Exception as e:
+                    log_error(f"Streaming Pipeline: Failed to upsert {len(plan.upsert_docs)} chunks - {e}")
+                    failed_ids = set(plan.upsert_ids)
+                    stats.failed_ids.update(failed_ids)
+            deleted = True
+            if plan.delete_ids and not failed_ids:
+                try:
+                    await delete_documents_async(vectorstore, plan.delete_ids)
+                except Exception as e:
+                    log_error(f"Streaming Pipeline: Failed to delete {len(plan.delete_ids)} stale chunks - {e}")
+                    deleted = False
+            manifest.commit(scope, plan, failed_ids, deleted=deleted)
+        finally:
+            in_flight.release()
+
+    async def index():
+        finished_workers = 0
+        plans: List[IncrementalPlan] = []
+        listings: List[Listing] = []
+        pending = 0
+        tasks = set()
+
+        async def submit():
+            nonlocal plans, listings, pending
+            # Waiting here is the backpressure: the queues behind us fill up.
+            await in_flight.acquire()
+            task = asyncio.create_task(flush(plans, listings))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            plans, listings, pending = [], [], 0
+
+        while finished_workers < workers:
+            item = await transformed.get()
+            if item is _DONE:
+                finished_workers += 1
+                continue
+            listing, chunks = item
+            stats.documents += 1
+            stats.chunks += len(chunks)
+            seen_urls.add(listing.url)
+            if on_chunks is not None:
+                on_chunks(chunks)
+            plan = manifest.plan(scope, chunks, full=full, prune=False)
+            stats.changed_urls += len(plan.changed_urls)
+            stats.unchanged_urls += len(plan.unchanged_urls)
+            plans.append(plan)
+            listings.append(listing)
+            pending += len(plan.upsert_docs)
+            # Unchanged pages are flushed too, so their manifest entries don't pile up.
+            if pending >= batch_size or len(plans) >= batch_size:
+                await submit()
+        if plans:
+            await submit()
+        if tasks:
+            await asyncio.gather(*tasks)
+
+    log_info(
+        f"🚰 Streaming Pipeline: {workers} transform workers, queues of {queue_size}, "
+        f"{scheduler.config.concurrency} upsert batches of ~{batch_size} chunks in flight",
+        Colors.DARKCYAN,
+    )
+    with span("ingestion.stream", scope=scope) as current:
+        await asyncio.gather(crawl(), *(transform_worker() for _ in range(workers)), index())
+
+        removals = manifest.plan_removals(scope, seen_urls, skipped_urls, max_prune_fraction)
+        # Duplicates replaced by a more canonical URL go regardless of the prune limit.
+        dropped = manifest.plan_drop(scope, sorted(replaced_urls))
+        removals.removed_urls.extend(dropped.removed_urls)
+        removals.delete_ids.extend(dropped.delete_ids)
+        try:
+            await delete_documents_async(vectorstore, removals.delete_ids)
+            if catalog is not None:
+                catalog.delete(removals.removed_urls)
+            manifest.commit(scope, removals)
+            stats.removed_urls = removals.removed_urls
+        except Exception as e:
+            # Left in the manifest, so the next run retries the delete.
+            log_error(f"VectorStore Indexing: Failed to delete stale vectors - {e}")
+        manifest.save()
+        stats.duplicates = deduplicator.stats.pages - deduplicator.stats.kept
+        deduplicator.stats.log()
+        stats.elapsed = time.monotonic() - started
+        current.set(pages=stats.pages, chunks=stats.chunks, upserted=stats.upserted)
+
+    log_success(
+        f"Streaming Pipeline: {stats.pages} pages -> {stats.documents} listings -> {stats.chunks} chunks, "
+        f"{stats.upserted} upserted, {len(stats.removed_urls)} removed in {stats.elapsed:.1f}s"
+    )
+    return stats
+
@@ -0,0 +1,147 @@
+import gzip
+import hashlib
+import json
+import os
+import re
+import time
+import zlib
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional
+
+from logger import log_info, log_success
+
+SNAPSHOT_DIR = os.getenv("MEDOM_SNAPSHOT_DIR", "snapshots")
+
+# Result fields kept verbatim in the manifest; raw_content goes to the blob store.
+_PAGE_FIELDS = ("url", "fetched_at", "headers")
+
+
+def _scope_slug(scope: str) -> str:
+    readable = re.sub(r"[^a-z0-9]+", "-", scope.lower()).strip("-")[-60:]
+    return f"{readable}-{hashlib.sha1(scope.encode('utf-8')).hexdigest()[:8]}"
+
+
+class SnapshotStore:
+    """
+    Raw crawl results on disk, so extraction, filtering and splitting can be
+    re-run without crawling again.
+
+    Page content is stored once per distinct text as a zlib-compressed blob
+    named by its sha256 (objects/ab/abcd...), so repeated crawls of an
+    unchanged site add almost nothing. Each crawl writes a gzipped JSON
+    manifest (manifests/<scope>/<snapshot id>.json.gz) listing url, fetch
+    time, headers and content hash per page.
+    """
+
+    def __init__(self, root: str = SNAPSHOT_DIR):
+        self.root = root
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.root, "objects", digest[:2], digest)
+
+    def _manifest_dir(self, scope: str) -> str:
+        return os.path.join(self.root, "manifests", _scope_slug(scope))
+
+    def put_blob(self, content: str) -> str:
+        data = content.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._blob_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(zlib.compress(data, 6))
+            os.replace(tmp, path)
+        return digest
+
+    def get_blob(self, digest: str) -> str:
+        with open(self._blob_path(digest), "rb") as f:
+            return zlib.decompress(f.read()).decode("utf-8")
+
+    def writer(self, scope: str) -> "SnapshotWriter":
+        """Records pages one at a time; the snapshot exists once the writer is closed."""
+        return SnapshotWriter(self, scope)
+
+    def record(self, scope: str, results: List[Dict[str, Any]]) -> str:
+        """Store one crawl's results (Tavily result dicts); returns the snapshot id."""
+        with self.writer(scope) as writer:
+            for result in results:
+                writer.add(result)
+        return writer.snapshot_id
+
+    def snapshots(self, scope: str) -> List[str]:
+        """Snapshot ids recorded for `scope`, oldest first."""
+        directory = self._manifest_dir(scope)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(name[: -len(".json.gz")] for name in os.listdir(directory) if name.endswith(".json.gz"))
+
+    def iter_pages(self, scope: str, snapshot: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Pages of a recorded crawl in the Tavily result shape (url, raw_content,
+        fetched_at, headers), read one blob at a time. `snapshot` defaults to
+        the latest one.
+        """
+        if snapshot in (None, "latest"):
+            available = self.snapshots(scope)
+            if not available:
+                raise FileNotFoundError(f"No snapshot recorded for {scope} under {self.root}")
+            snapshot = available[-1]
+        path = os.path.join(self._manifest_dir(scope), f"{snapshot}.json.gz")
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            manifest = json.load(f)
+        log_info(f"Snapshot Store: Replaying {len(manifest['pages'])} pages of {scope} from snapshot {snapshot}")
+        for page in manifest["pages"]:
+            result = {field: page[field] for field in _PAGE_FIELDS}
+            result["raw_content"] = self.get_blob(page["sha256"]) if page["sha256"] else None
+            yield result
+
+    def load(self, scope: str, snapshot: Optional[str] = None) -> List[Dict[str, Any]]:
+        """All pages of a recorded crawl; see iter_pages."""
+        return list(self.iter_pages(scope, snapshot))
+
+
+class SnapshotWriter:
+    """Streams pages into the blob store, keeping only their manifest entries in memory."""
+
+    def __init__(self, store: SnapshotStore, scope: str):
+        self.store = store
+        self.scope = scope
+        self.fetched_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        self.snapshot_id = time.strftime("%Y%m%dT%H%M%S", time.gmtime())
+        self.pages: List[Dict[str, Any]] = []
+
+    def add(self, result: Dict[str, Any]):
+        content = result.get("raw_content")
+        self.pages.append(
+            {
+                "url": result["url"],
+                "fetched_at": result.get("fetched_at") or self.fetched_at,
+                "headers": result.get("headers") or {},
+                "sha256": self.store.put_blob(content) if content is not None else None,
+            }
+        )
+
+    def close(self) -> str:
+        directory = self.store._manifest_dir(self.scope)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{self.snapshot_id}.json.gz")
+        with gzip.open(f"{path}.tmp", "wt", encoding="utf-8") as f:
+            json.dump(
+                {"scope": self.scope, "snapshot": self.snapshot_id, "pages": self.pages},
+                f,
+                ensure_ascii=False,
+            )
+        os.replace(f"{path}.tmp", path)
+        log_success(
+            f"Snapshot Store: Recorded {len(self.pages)} pages of {self.scope} as snapshot {self.snapshot_id}"
+        )
+        return self.snapshot_id
+
+    def __enter__(self) -> "SnapshotWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # A crawl that failed part-way leaves its blobs but no snapshot.
+        if exc_type is None:
+            self.close()
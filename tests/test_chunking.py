@@ -0,0 +1,45 @@
+import pytest
+
+from backend.text import count_tokens
+from chunking import ListingChunker
+from langchain_core.documents import Document
+
+
+def _listing(n: int, paragraphs: int) -> str:
+    body = "\n\n".join(
+        f"Opis {i}: kuća s vrtom i pogledom na more, blizu škole i trgovine. "
+        f"Parcela je ravna, uz asfaltiranu cestu, s priključcima struje i vode."
+        for i in range(paragraphs)
+    )
+    return f"Lokacija: Split, Žnjan {n}\nCijena: {100 + n}.000 €\nPovršina: {50 + n} m2\n\n{body}".strip()
+
+
+@pytest.mark.parametrize("max_tokens, overlap", [(64, 8), (128, 16), (512, 64)])
+def test_chunks_stay_within_max_tokens(max_tokens, overlap):
+    text = "\n\n".join(_listing(n, paragraphs=n % 6 + 1) for n in range(12))
+    chunker = ListingChunker(max_tokens=max_tokens, overlap_tokens=overlap)
+    chunks = chunker.split_text(text)
+    assert chunks
+    assert all(count_tokens(chunk) <= max_tokens for chunk in chunks)
+
+
+def test_chunks_are_slices_with_start_index():
+    text = "\n\n".join(_listing(n, paragraphs=3) for n in range(5))
+    chunks = ListingChunker(max_tokens=64, overlap_tokens=8).split_documents(
+        [Document(page_content=text, metadata={"source": "https://example.com/a"})]
+    )
+    for chunk in chunks:
+        start = chunk.metadata["start_index"]
+        assert text[start : start + len(chunk.page_content)] == chunk.page_content
+        assert chunk.metadata["source"] == "https://example.com/a"
+
+
+def test_small_listings_are_packed_whole():
+    listings = [_listing(n, paragraphs=0) for n in range(3)]
+    chunks = ListingChunker(max_tokens=512, overlap_tokens=64).split_text("\n\n".join(listings))
+    assert chunks == ["\n\n".join(listings)]
+
+
+def test_overlap_must_be_smaller_than_chunk():
+    with pytest.raises(ValueError):
+        ListingChunker(max_tokens=64, overlap_tokens=64)
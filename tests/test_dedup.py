@@ -0,0 +1,60 @@
+from dedup import Deduplicator, deduplicate, fingerprint
+
+LISTING = (
+    "Lokacija: Split, Žnjan\nCijena: 250.000 €\nPovršina: 80 m2\n"
+    "Trosoban stan na drugom katu, s balkonom i pogledom na more. Blizu plaže, "
+    "škole i trgovine, parkirno mjesto u dvorištu, kompletno namješten i odmah useljiv."
+)
+
+
+def _page(url: str, text: str = LISTING):
+    return {"url": url, "raw_content": text}
+
+
+def test_exact_duplicate_keeps_canonical_url():
+    pages = [
+        _page("https://medom-nekretnine.com/stan/split-znjan/?ref=home"),
+        _page("https://medom-nekretnine.com/stan/split-znjan/"),
+    ]
+    kept, stats = deduplicate(pages)
+    assert [page["url"] for page in kept] == ["https://medom-nekretnine.com/stan/split-znjan/"]
+    assert stats.exact_duplicates == 1
+
+
+def test_repeated_url_is_dropped():
+    kept, _ = deduplicate([_page("https://a.hr/stan/1/"), _page("https://a.hr/stan/1/")])
+    assert len(kept) == 1
+
+
+def test_near_duplicate_with_same_price_and_area_is_dropped():
+    edited = LISTING.replace("odmah useljiv", "odmah useljiv!")
+    kept, stats = deduplicate([_page("https://a.hr/stan/1/"), _page("https://a.hr/stan/1-copy/", edited)])
+    assert len(kept) == 1
+    assert stats.near_duplicates == 1
+
+
+def test_same_template_with_different_price_is_kept():
+    other = LISTING.replace("250.000 €", "260.000 €")
+    kept, _ = deduplicate([_page("https://a.hr/stan/1/"), _page("https://a.hr/stan/2/", other)])
+    assert len(kept) == 2
+
+
+def test_near_match_needs_price_and_area():
+    text = LISTING.replace("Cijena: 250.000 €\n", "")
+    deduplicator = Deduplicator()
+    assert deduplicator.check("https://a.hr/stan/1/", fingerprint(text, "https://a.hr/stan/1/")) is None
+    edited = text.replace("odmah useljiv", "odmah useljiv!")
+    assert deduplicator.check("https://a.hr/stan/2/", fingerprint(edited, "https://a.hr/stan/2/")) is None
+
+
+def test_key_comes_from_listing_text():
+    page = "Izdvojeno: 999.000 € 500 m2\n" + LISTING
+    assert fingerprint(page, "https://a.hr/stan/1/", LISTING).key == (250000, 80)
+
+
+def test_offer_replaces_less_canonical_copy():
+    deduplicator = Deduplicator()
+    fp = fingerprint(LISTING, "x")
+    assert deduplicator.offer("https://a.hr/stan/1/?page=2", fp) == (True, None)
+    assert deduplicator.offer("https://a.hr/stan/1/", fp) == (True, "https://a.hr/stan/1/?page=2")
+    assert deduplicator.offer("https://a.hr/stan/1/?ref=x", fp) == (False, None)
@@ -0,0 +1,78 @@
+from langchain_core.documents import Document
+
+from indexing import IngestManifest, chunk_id
+
+SCOPE = "local:https://medom-nekretnine.com/zemljiste/"
+
+
+def _chunks(url: str, *texts: str):
+    return [Document(page_content=text, metadata={"source": url}) for text in texts]
+
+
+def _manifest(tmp_path, urls):
+    manifest = IngestManifest(str(tmp_path / "manifest.json"))
+    chunks = [chunk for url in urls for chunk in _chunks(url, f"{url} a", f"{url} b")]
+    manifest.commit(SCOPE, manifest.plan(SCOPE, chunks))
+    return manifest
+
+
+def test_unchanged_pages_are_not_upserted(tmp_path):
+    manifest = _manifest(tmp_path, ["u1", "u2"])
+    plan = manifest.plan(SCOPE, _chunks("u1", "u1 a", "u1 b") + _chunks("u2", "u2 a", "u2 changed"))
+    assert plan.unchanged_urls == ["u1"]
+    assert plan.changed_urls == ["u2"]
+    assert plan.upsert_ids == [chunk_id("u2", 0), chunk_id("u2", 1)]
+
+
+def test_shrunk_page_deletes_trailing_chunks(tmp_path):
+    manifest = _manifest(tmp_path, ["u1"])
+    plan = manifest.plan(SCOPE, _chunks("u1", "u1 only"))
+    assert plan.shrunk_urls == ["u1"]
+    assert plan.delete_ids == [chunk_id("u1", 1)]
+
+
+def test_missing_url_is_tombstoned(tmp_path):
+    urls = [f"u{i}" for i in range(8)]
+    manifest = _manifest(tmp_path, urls)
+    removals = manifest.plan_removals(SCOPE, set(urls[1:]))
+    assert removals.removed_urls == ["u0"]
+    assert removals.delete_ids == [chunk_id("u0", 0), chunk_id("u0", 1)]
+
+
+def test_skipped_urls_are_kept(tmp_path):
+    urls = [f"u{i}" for i in range(8)]
+    manifest = _manifest(tmp_path, urls)
+    assert manifest.plan_removals(SCOPE, set(urls[1:]), skipped_urls={"u0"}).removed_urls == []
+
+
+def test_prune_is_refused_above_max_fraction(tmp_path):
+    urls = [f"u{i}" for i in range(8)]
+    manifest = _manifest(tmp_path, urls)
+    assert manifest.plan_removals(SCOPE, set(urls[4:]), max_fraction=0.25).removed_urls == []
+    assert len(manifest.plan_removals(SCOPE, set(urls[4:]), max_fraction=1.0).removed_urls) == 4
+
+
+def test_empty_crawl_removes_nothing(tmp_path):
+    manifest = _manifest(tmp_path, ["u1", "u2"])
+    assert manifest.plan_removals(SCOPE, set(), max_fraction=1.0).removed_urls == []
+
+
+def test_failed_delete_keeps_entries_for_retry(tmp_path):
+    manifest = _manifest(tmp_path, ["u1", "u2"])
+    manifest.commit(SCOPE, manifest.plan_drop(SCOPE, ["u1"]), deleted=False)
+    assert "u1" in manifest.scopes[SCOPE]
+    manifest.commit(SCOPE, manifest.plan_drop(SCOPE, ["u1"]))
+    assert "u1" not in manifest.scopes[SCOPE]
+
+
+def test_failed_upsert_is_not_recorded(tmp_path):
+    manifest = IngestManifest(str(tmp_path / "manifest.json"))
+    plan = manifest.plan(SCOPE, _chunks("u1", "a") + _chunks("u2", "b"))
+    manifest.commit(SCOPE, plan, failed_ids={chunk_id("u1", 0)})
+    assert set(manifest.scopes[SCOPE]) == {"u2"}
+
+
+def test_drop_backend_forgets_its_scopes(tmp_path):
+    manifest = _manifest(tmp_path, ["u1"])
+    manifest.drop_backend("local")
+    assert manifest.scopes == {}
@@ -0,0 +1,58 @@
+import pytest
+
+from backend.query import parse_query
+
+
+@pytest.mark.parametrize(
+    "query, property_type, sort_by, descending",
+    [
+        ("5 najjeftinijih stanova u Zagrebu", "stan", "price_eur", False),
+        ("najveće građevinsko zemljište u Splitu", "zemljiste", "area_m2", True),
+        ("najjeftinije kuće do 200.000 €", "kuca", "price_eur", False),
+        ("cheapest apartments in Zagreb", "stan", "price_eur", False),
+        ("najjeftiniji stan po m2 u Splitu", "stan", "price_per_m2", False),
+    ],
+)
+def test_sorted_typed_queries_are_structured(query, property_type, sort_by, descending):
+    parsed = parse_query(query)
+    assert parsed.property_type == property_type
+    assert parsed.sort_by == sort_by
+    assert parsed.descending is descending
+    assert parsed.is_structured
+
+
+def test_limit_and_ranges():
+    parsed = parse_query("3 najskuplje kuće do 200.000 €")
+    assert parsed.limit == 3
+    assert parsed.price_max == 200000
+    assert parse_query("stanovi od 50 do 80 m2").area_min == 50
+    assert parse_query("stanovi od 50 do 80 m2").area_max == 80
+
+
+def test_city_is_resolved():
+    parsed = parse_query("5 najjeftinijih stanova u Zagrebu")
+    assert parsed.city == "zagreb"
+    assert parsed.unresolved_location is None
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        # Superlatives that don't sort listings.
+        "koja je najbolja lokacija za život",
+        "koji je najjeftiniji način financiranja",
+        # No property type: a top-N from the catalog would pass for the whole market.
+        "5 najjeftinijih nekretnina do 100.000 €",
+        "cheapest properties under 100k eur",
+        # A place the catalog can't filter on.
+        "najjeftiniji stan u Kninu",
+        # A range without a sort is a search, not a ranking.
+        "stanovi od 50 do 80 m2",
+    ],
+)
+def test_open_ended_queries_are_not_structured(query):
+    assert not parse_query(query).is_structured
+
+
+def test_unknown_place_is_kept_as_unresolved():
+    assert parse_query("najjeftiniji stan u Kninu").unresolved_location == "Kninu"
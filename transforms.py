@@ -0,0 +1,162 @@
+"""
+CPU-bound ingestion transforms (listing extraction, chunk splitting) and the
+process pool they run on. Worker processes import only this module, so it
+must stay free of the network clients the ingestion scripts build at import.
+"""
+
+import asyncio
+import atexit
+import math
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, TypeVar
+
+from langchain_core.documents import Document
+
+from backend.catalog import Listing, chunk_metadata, parse_listing
+from dedup import Fingerprint, fingerprint
+from indexing import annotate_chunks
+from logger import log_warning
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+TRANSFORM_WORKERS = int(os.getenv("MEDOM_TRANSFORM_WORKERS", str(os.cpu_count() or 1)))
+# Below this many items pickling to the pool costs more than it saves.
+MIN_PARALLEL_ITEMS = 32
+# Tasks per worker; more evens out pages of very different sizes.
+_CHUNKS_PER_WORKER = 4
+
+_LOKACIJA_RE = re.compile(r"(Lokacija:.*?)(?=\[!\[Image)", re.DOTALL)
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def extract_lokacija_section(text):
+    """
+    Extracts everything from 'Lokacija:' up to right before the first '[![Image'.
+    """
+    match = _LOKACIJA_RE.search(text)
+    if match:
+        return match.group(1).strip()
+    return None
+
+
+def extract_page(
+    page: Dict[str, Any], extract: bool = True
+) -> Optional[Tuple[str, str, str, Fingerprint]]:
+    """
+    (url, content to index, listing section, dedup fingerprint) of a crawled
+    page, or None when it has no content (or, with `extract`, no Lokacija
+    section). Without `extract` the whole page is indexed, but listing
+    fields still come from its Lokacija section only (empty if it has none).
+    """
+    content = page.get("raw_content")
+    if content is None:
+        return None
+    section = extract_lokacija_section(content)
+    if extract:
+        if not section:
+            return None
+        content = section
+    section = section or ""
+    return page["url"], content, section, fingerprint(content, page["url"], section)
+
+
+def page_chunks(
+    text_splitter, url: str, content: str, listing_text: Optional[str] = None
+) -> Tuple[Listing, List[Document]]:
+    """
+    The parsed listing and annotated chunks of one page. Listing fields are
+    parsed from `listing_text` when given, else from `content`.
+    """
+    listing_text = content if listing_text is None else listing_text
+    listing = parse_listing(listing_text, url)
+    doc = Document(
+        page_content=content,
+        metadata={"source": url, **chunk_metadata(listing, listing_text)},
+    )
+    return listing, annotate_chunks(text_splitter.split_documents([doc]))
+
+
+def _split_batch(text_splitter, docs: List[Document]) -> List[List[Document]]:
+    return [text_splitter.split_documents([doc]) for doc in docs]
+
+
+def _get_pool(workers: int) -> Optional[ProcessPoolExecutor]:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                try:
+                    _pool = ProcessPoolExecutor(max_workers=workers)
+                except (OSError, NotImplementedError) as e:
+                    log_warning(f"Transforms: Process pool unavailable, running serially - {e}")
+                    return None
+                atexit.register(_pool.shutdown, cancel_futures=True)
+    return _pool
+
+
+def parallel_map(
+    fn: Callable[[T], R],
+    items: Sequence[T],
+    workers: int = TRANSFORM_WORKERS,
+    chunksize: Optional[int] = None,
+) -> List[R]:
+    """
+    `[fn(item) for item in items]` on the shared process pool. Items are sent
+    in chunks of `chunksize` (by default a few chunks per worker) and results
+    come back in input order. Small inputs and workers <= 1 run in-process.
+    `fn` must be picklable (a module-level function or a partial of one).
+    """
+    if workers <= 1 or len(items) < MIN_PARALLEL_ITEMS:
+        return [fn(item) for item in items]
+    pool = _get_pool(workers)
+    if pool is None:
+        return [fn(item) for item in items]
+    if chunksize is None:
+        chunksize = max(1, math.ceil(len(items) / (workers * _CHUNKS_PER_WORKER)))
+    return list(pool.map(fn, items, chunksize=chunksize))
+
+
+async def arun(fn: Callable[..., R], *args, workers: int = TRANSFORM_WORKERS) -> R:
+    """Await one `fn(*args)` call on the process pool (a worker thread if there is none)."""
+    pool = _get_pool(workers) if workers > 1 else None
+    if pool is None:
+        return await asyncio.to_thread(fn, *args)
+    return await asyncio.get_running_loop().run_in_executor(pool, partial(fn, *args))
+
+
+async def aparallel_map(
+    fn: Callable[[T], R],
+    items: Sequence[T],
+    workers: int = TRANSFORM_WORKERS,
+    chunksize: Optional[int] = None,
+) -> List[R]:
+    """parallel_map without blocking the event loop while the pool works."""
+    return await asyncio.to_thread(parallel_map, fn, items, workers, chunksize)
+
+
+def split_documents(text_splitter, docs: List[Document], workers: int = TRANSFORM_WORKERS) -> List[Document]:
+    """
+    `text_splitter.split_documents(docs)` spread over the process pool; chunks
+    keep the order they would have had in a serial split.
+    """
+    if workers <= 1 or len(docs) < MIN_PARALLEL_ITEMS:
+        return text_splitter.split_documents(docs)
+    # One task per batch of documents, so the splitter is pickled once per batch.
+    batch = max(1, math.ceil(len(docs) / (workers * _CHUNKS_PER_WORKER)))
+    batches = [docs[i : i + batch] for i in range(0, len(docs), batch)]
+    pool = _get_pool(workers)
+    if pool is None:
+        return text_splitter.split_documents(docs)
+    results = pool.map(partial(_split_batch, text_splitter), batches)
+    return [chunk for per_batch in results for per_doc in per_batch for chunk in per_doc]
+
+
+async def asplit_documents(text_splitter, docs: List[Document], workers: int = TRANSFORM_WORKERS) -> List[Document]:
+    return await asyncio.to_thread(split_documents, text_splitter, docs, workers)